@@ -7,10 +7,24 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
+import gc
 import os
 
-from django.core.asgi import get_asgi_application
+# جمع‌آوری زباله در حین import فقط زمان می‌گیرد؛ preload آن را دوباره روشن می‌کند
+gc.disable()
+
+from django.core.asgi import get_asgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# جریان رویدادهای زنده مستقیم در ASGI سرو می‌شود؛ بقیه درخواست‌ها به جنگو می‌روند
+# و با قطع اتصال کلاینت کوئری‌هایشان لغو می‌شود
+from stories.events import route_events  # noqa: E402
+from stories.timeouts import cancel_on_disconnect  # noqa: E402
+from stories.startup import preload  # noqa: E402
+
+preload()
+
+application = route_events(cancel_on_disconnect(django_application))
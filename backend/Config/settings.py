@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 import os
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'stories.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,10 +60,160 @@ MIDDLEWARE = [
 
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['stories.renderers.FastJSONRenderer',
+                                 'rest_framework.renderers.BrowsableAPIRenderer'],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend',
-                                'rest_framework.filters.SearchFilter']
+                                'rest_framework.filters.SearchFilter'],
+    'DEFAULT_AUTHENTICATION_CLASSES': ['stories.auth.ClaimsJWTAuthentication',
+                                       'rest_framework.authentication.SessionAuthentication'],
+    'DEFAULT_PERMISSION_CLASSES': ['stories.permissions.EditorOrReadOnly'],
+    'DEFAULT_THROTTLE_CLASSES': ['stories.throttling.CostThrottle'],
 }
 
+# محدودیت نرخ وزن‌دار هر کلاینت (stories.throttling)
+THROTTLE = {
+    'STORE': os.environ.get('THROTTLE_STORE', 'local'),  # local | cache
+    'RATE': 20,  # واحد در ثانیه
+    'BURST': 600,  # ظرفیت سطل هر کلاینت
+    'MAX_DAYS': 3650,  # سقف بازه در محاسبه هزینه درخواست
+    'HEAVY_CONCURRENCY': 4,  # محاسبات سنگین همزمان در هر پروسه
+    'QUEUE_SIZE': 16,  # درخواست‌های سنگین منتظر
+    'QUEUE_TIMEOUT': 5,  # ثانیه انتظار برای نوبت
+}
+
+# بارگذاری کامل برنامه هنگام import شدن wsgi/asgi (برای gunicorn --preload)؛ stories.startup
+STARTUP = {
+    'PRELOAD': os.environ.get('STARTUP_PRELOAD', '1') == '1',
+}
+
+# سقف زمان کوئری‌های هر اندپوینت (ثانیه)؛ بیشتر از آن خطای «محدودتر کنید» برمی‌گردد (stories.timeouts)
+QUERY_TIMEOUTS = {
+    'stats': 15,
+    'aggregate': 15,
+    'segments': 10,
+    'search': 5,
+}
+
+# توکن‌های JWT نقش و محدوده کاربر را دارند و کاربر برای هر درخواست از دیتابیس خوانده نمی‌شود (stories.auth)
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_USER_CLASS': 'stories.auth.ClaimsUser',
+    'UPDATE_LAST_LOGIN': False,
+}
+
+# لیست توکن‌های باطل شده در حافظه هر پروسه؛ حداکثر هر چند ثانیه یک بار تغییرش بررسی می‌شود
+AUTH = {
+    'REVOCATION_REFRESH': 5,
+}
+
+# بازه‌ای که ETag اندپوینت‌های دارای فیلتر days حداکثر به این مدت معتبر می‌ماند
+CONDITIONAL_WINDOW_SECONDS = 60
+
+# ردیف‌های شمارنده تغییرات هر مدل (stories.conditional)؛ ذخیره‌های هم‌زمان کمتر منتظر قفل یک ردیف می‌مانند
+CHANGE_COUNTER_SHARDS = 8
+
+# صف کارهای پس‌زمینه (stories.jobs / manage.py run_jobs)
+JOBS = {
+    'WORKERS': int(os.environ.get('JOBS_WORKERS', '4')),
+    'POOL': os.environ.get('JOBS_POOL', 'thread'),  # thread | process
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 10,  # ثانیه، دو برابر در هر تلاش
+    'LOCK_TIMEOUT': 3600,
+}
+
+# محدودیت‌های /api/stats/aggregate/
+AGGREGATE_LIMITS = {
+    'MAX_DIMENSIONS': 4,
+    'MAX_DAYS': 3650,
+    'MAX_GROUPS': 100000,  # تخمین تعداد گروه‌ها (حاصل‌ضرب کاردینالیتی ابعاد)
+    'MAX_ROWS': 5000,
+}
+
+# موتور محاسبه تفکیک‌های stats؛ 'columnar' آرایه‌های NumPy در حافظه (stories.columnar)، numpy اختیاری است
+STATS_ENGINE = {
+    'BACKEND': os.environ.get('STATS_ENGINE', 'sql'),  # sql | columnar
+    'TAIL': 1000,  # ردیف‌های آخر که در هر به‌روزرسانی دوباره خوانده می‌شوند (علامت تکراری‌ها)
+}
+
+# فشرده‌سازی پاسخ‌های JSON زیر /api/ (stories.compression)؛ zstd و br به zstandard و brotli اختیاری نیاز دارند
+COMPRESSION = {
+    'PATH_PREFIX': '/api/',
+    'EXCLUDE': ('/api/token/',),  # پاسخ‌های حاوی توکن فشرده نمی‌شوند (BREACH)
+    'ENCODINGS': ['zstd', 'br', 'gzip'],  # ترتیب ترجیح وقتی q برابر است
+    'MIN_SIZE': 1024,  # بایت
+    'LEVELS': {'zstd': 3, 'br': 4, 'gzip': 6},
+    # ورودی‌های کش یک بار برای هر نسخه فشرده می‌شوند؛ سطح بالاتر می‌ارزد
+    'CACHE_LEVELS': {'zstd': 19, 'br': 11, 'gzip': 9},
+    'CACHE_TIMEOUT': 300,
+}
+
+# کش نتایج /api/stats/segments/ (ثانیه)؛ با هر تغییر استوری/صفحه کلید عوض می‌شود
+SEGMENTS_CACHE_TIMEOUT = 300
+
+# صفحه‌بندی ادمین: جدول بدون فیلتر بزرگ‌تر از این، تعدادش از آمار پایگاه داده تخمین زده می‌شود
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100_000
+
+# خلاصه‌های تقریبی (stats?approximate=true)؛ stories.sketches
+# خطای Count-Min حداکثر e/WIDTH از کل شمارش با احتمال 1 - e^-DEPTH،
+# خطای استاندارد HyperLogLog برابر 1.04/sqrt(2^HLL_PRECISION).
+SKETCHES = {
+    'WIDTH': 2048,
+    'DEPTH': 4,
+    'HLL_PRECISION': 12,
+    'CANDIDATES': 200,  # تعداد نامزدهای top-K که برای هر روز نگه داشته می‌شود
+}
+
+# تشخیص استوری تکراری (stories.dedup): حداکثر فاصله همینگ بین هش‌ها.
+# با ۴ باند ۱۶ بیتی، فاصله تا ۳ بیت همیشه پیدا می‌شود.
+DEDUP = {
+    'IMAGE_DISTANCE': 3,
+    'TEXT_DISTANCE': 3,
+    'MIN_TEXT_TOKENS': 5,
+}
+
+# محدودیت فایل استوری‌ها؛ stories.media
+MEDIA_LIMITS = {
+    'IMAGE_MAX_SIZE': 10 * 1024 * 1024,
+    'IMAGE_MAX_PIXELS': 40_000_000,
+    'VIDEO_MAX_SIZE': 200 * 1024 * 1024,
+    'VIDEO_MAX_DURATION': 600,  # ثانیه
+}
+
+# آپلود تکه‌ای و ادامه‌پذیر ویدئوها؛ stories.uploads
+UPLOADS = {
+    'CHUNK_SIZE': 5 * 1024 * 1024,
+    'SESSION_TTL': 24 * 60 * 60,  # ثانیه؛ آپلودهای رها شده با purge_uploads پاک می‌شوند
+}
+
+# تشخیص روندهای ناگهانی تگ‌ها و موضوع‌ها؛ stories.trends
+TRENDS = {
+    'BUCKET': 'hour',  # 'hour' یا 'day'
+    'HALF_LIFE': 24,  # نیمه‌عمر میانگین پایه بر حسب تعداد بازه
+    'MIN_COUNT': 3,  # کمترین تعداد در بازه جاری برای نمایش
+    'MIN_STD': 1.0,  # کف انحراف معیار تا عبارت‌های تازه امتیاز بی‌نهایت نگیرند
+}
+
+# رویدادهای زنده استوری‌های جدید (SSE) برای داشبورد؛ stories.events و Config/asgi.py
+EVENTS = {
+    'PATH': '/api/storymodel/events/',
+    # استوری‌های ذخیره شده در WSGI و کارگرهای صف هم باید به استریم‌ها برسند؛
+    # stories.events.InProcessBroker فقط برای یک پروسه ASGI تنها
+    'BROKER': os.environ.get('EVENTS_BROKER', 'stories.events.UnixSocketBroker'),
+    'SOCKET_DIR': os.environ.get('EVENTS_SOCKET_DIR', '/tmp/stories-events'),
+    'FLUSH_INTERVAL': 0.5,  # ثانیه؛ دلتاهای این بازه در یک پیام ادغام می‌شوند
+    'HEARTBEAT': 15,  # ثانیه
+    'QUEUE_SIZE': 64,  # پیام‌های عقب‌افتاده هر کلاینت قبل از reset
+}
+
+FILE_UPLOAD_HANDLERS = [
+    'stories.media.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 
 ROOT_URLCONF = 'Config.urls'
 
@@ -87,23 +239,75 @@ WSGI_APPLICATION = 'Config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# تنظیمات دیتابیس از متغیرهای محیطی خوانده می‌شود؛ پیش‌فرض SQLite است.
+# DB_ENGINE=postgresql DB_NAME=... DB_USER=... DB_PASSWORD=... DB_HOST=... DB_PORT=...
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+
+if DB_ENGINE in ('postgresql', 'postgres'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'starg'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # اتصال‌های پایدار به جای باز کردن اتصال جدید در هر درخواست
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+            'OPTIONS': {},
+        }
+    }
+    # Django >= 5.1 ships a psycopg 3 connection pool; it replaces persistent connections.
+    if os.environ.get('DB_POOL') == '1':
+        import django
+
+        if django.VERSION >= (5, 1):
+            DATABASES['default']['OPTIONS']['pool'] = {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            }
+            DATABASES['default']['CONN_MAX_AGE'] = 0
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+            'OPTIONS': {
+                # busy timeout (ثانیه) قبل از خطای database is locked
+                'timeout': int(os.environ.get('SQLITE_TIMEOUT', '20')),
+            },
+        }
     }
-}
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': '',      # اسم دیتابیسی که ساختی
-#         'USER': '',    # اسم کاربری که ساختی
-#         'PASSWORD': '', # رمز کاربری
-#         'HOST': '',        # معمولاً localhost
-#         'PORT': '',             # پورت پیش‌فرض PostgreSQL
-#     }
-# }
+# Read replicas: DB_REPLICAS=path1.sqlite3,path2.sqlite3 for SQLite,
+# DB_REPLICAS=host[:port][/name],... for PostgreSQL.
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    alias = 'replica_%d' % index
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['NAME'] = replica
+    else:
+        host, _, name = replica.partition('/')
+        host, _, port = host.partition(':')
+        DATABASES[alias].update(HOST=host or DATABASES['default']['HOST'],
+                                PORT=port or DATABASES['default']['PORT'],
+                                NAME=name or DATABASES['default']['NAME'])
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['stories.routers.ReplicaRouter']
+
+# PRAGMAs applied to every new SQLite connection (see stories.signals)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_TIMEOUT', '20')) * 1000,
+    'cache_size': -64000,  # 64 MB
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
 
 
 # Password validation
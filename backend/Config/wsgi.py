@@ -7,10 +7,19 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
+import gc
 import os
 
-from django.core.wsgi import get_wsgi_application
+# جمع‌آوری زباله در حین import فقط زمان می‌گیرد؛ preload آن را دوباره روشن می‌کند
+gc.disable()
+
+from django.core.wsgi import get_wsgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Config.settings')
 
 application = get_wsgi_application()
+
+# با gunicorn --preload یک بار در پروسه اصلی انجام می‌شود و workerها حافظه را به اشتراک می‌گذارند
+from stories.startup import preload  # noqa: E402
+
+preload()
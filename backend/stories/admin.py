@@ -1,48 +1,183 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.db.models import BLANK_CHOICE_DASH
+from django.http import HttpRequest, QueryDict
+from django.template.response import TemplateResponse
+from django.utils import timezone
 # from django_jalali.admin import JalaliDateFieldListFilter
-from .models import StoryModel, Topic, SubTopic, InstagramPage, Category, DayAnalysis
+from .conditional import bump_versions
+from .jobs import enqueue, requeue
+from .models import StoryModel, Topic, SubTopic, InstagramPage, Category, DayAnalysis, Job, Feeling, Tone, \
+    AccessProfile, RevokedToken
+from .paginators import EstimatedCountPaginator
+from .tasks import reclassify_stories, reassign_pages
+
+
+class RecentCreatedFilter(admin.SimpleListFilter):
+    """Fixed recent ranges on created_at: a single index range scan each."""
+    title = 'تاریخ ایجاد'
+    parameter_name = 'created'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('1', 'امروز'),
+            ('7', '۷ روز گذشته'),
+            ('30', '۳۰ روز گذشته'),
+            ('365', 'یک سال گذشته'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() in ('1', '7', '30', '365'):
+            return queryset.filter(created_at__gte=timezone.now() - timedelta(days=int(self.value())))
+        return queryset
+
+
+class StoryReclassifyForm(forms.Form):
+    category = forms.ModelChoiceField(Category.objects.all(), required=False, label='دسته')
+    feeling = forms.ChoiceField(choices=BLANK_CHOICE_DASH + Feeling.choices, required=False, label='احساس')
+    tone = forms.ChoiceField(choices=BLANK_CHOICE_DASH + Tone.choices, required=False, label='لحن')
+
+    def clean(self):
+        if not self.changes():
+            raise forms.ValidationError('حداقل یکی از مقادیر را انتخاب کنید')
+        return self.cleaned_data
+
+    def changes(self):
+        data, changes = self.cleaned_data, {}
+        if data.get('category') is not None:
+            changes['category_id'] = data['category'].pk
+        for field in ('feeling', 'tone'):
+            if data.get(field):
+                changes[field] = data[field]
+        return changes
+
+
+class PageTopicForm(forms.Form):
+    topic = forms.ModelChoiceField(Topic.objects.all(), label='موضوع')
+    sub_topic = forms.ModelChoiceField(SubTopic.objects.all(), required=False, label='زیرموضوع')
+
+    def clean(self):
+        topic, sub_topic = self.cleaned_data.get('topic'), self.cleaned_data.get('sub_topic')
+        if topic is not None and sub_topic is not None and not topic.sub_topics.filter(pk=sub_topic.pk).exists():
+            raise forms.ValidationError('این زیرموضوع متعلق به موضوع انتخاب شده نیست')
+        return self.cleaned_data
+
+
+def bulk_form(model_admin, request, queryset, form_class, title):
+    """
+    Intermediate page of a bulk action. Returns ``(form, None)`` once a valid
+    form is submitted, otherwise ``(None, response)`` with the page.
+    """
+    if 'apply' in request.POST:
+        form = form_class(request.POST)
+        if form.is_valid():
+            return form, None
+    else:
+        form = form_class()
+    context = {
+        **model_admin.admin_site.each_context(request),
+        'title': title,
+        'opts': model_admin.model._meta,
+        'form': form,
+        'count': queryset.count(),
+        'action': request.POST.get('action', ''),
+        'select_across': request.POST.get('select_across', '0'),
+        'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+    }
+    return None, TemplateResponse(request, 'admin/stories/bulk_action.html', context)
+
+
+def selection(request, queryset):
+    """
+    Job kwargs naming the rows of a bulk action without listing all of them:
+    the ticked ids of one changelist page, or, for "select all", the
+    changelist query string (filters and search) that the job applies again.
+    """
+    if request.POST.get('select_across', '0') == '1':
+        return {'changelist': request.GET.urlencode(), 'user_id': request.user.pk}
+    return {'ids': list(queryset.values_list('id', flat=True))}
+
+
+def changelist_queryset(model, query, user_id):
+    """Rows of ``model``'s changelist for the query string ``query``, as the user ``user_id`` sees them."""
+    request = HttpRequest()
+    request.GET = QueryDict(query)
+    request.user = get_user_model().objects.get(pk=user_id)
+    return admin.site._registry[model].get_changelist_instance(request).queryset
+
+
+def queued_message(model_admin, request, count, job_row):
+    model_admin.message_user(
+        request, '%d مورد در صف تغییر قرار گرفت (کار شماره %d)' % (count, job_row.pk), messages.SUCCESS)
 
 
 @admin.register(StoryModel)
 class StoryModelAdmin(admin.ModelAdmin):
     list_display = ('page', 'created_at', 'feeling', 'tone','category',)
+    list_select_related = ('page', 'category')
     list_filter = (
-        'created_at',  # فیلتر تاریخ جلالی
+        RecentCreatedFilter,
         'feeling',
         'tone',
         'ironic',
         'category',
     )
-    search_fields = ('description', 'user__username')
+    # پیشوندی روی ستون‌های ایندکس‌دار (story_title_prefix_idx و نام کاربری یکتای صفحه)،
+    # زیررشته‌ای روی توضیحات (story_description_trgm_idx در PostgreSQL)
+    search_fields = ('title__startswith', 'description', 'page__username__startswith')
+    autocomplete_fields = ('page', 'category')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['reclassify']
+
+    def reclassify(self, request, queryset):
+        form, response = bulk_form(self, request, queryset, StoryReclassifyForm, 'تغییر دسته، احساس یا لحن')
+        if response is not None:
+            return response
+        queued_message(self, request, queryset.count(), enqueue(
+            reclassify_stories, changes=form.changes(), **selection(request, queryset)))
+    reclassify.short_description = "تغییر دسته، احساس یا لحن استوری‌های انتخاب شده"
 
 
 @admin.register(Topic)
 class TopicAdmin(admin.ModelAdmin):
     list_display = ('name',)
     filter_horizontal = ('sub_topics',)
+    search_fields = ('name',)
 
 
 @admin.register(Category)
-class TopicAdmin(admin.ModelAdmin):
+class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
     # filter_horizontal = ('name',)
+    search_fields = ('name',)
 
 
 @admin.register(SubTopic)
 class SubTopicAdmin(admin.ModelAdmin):
     list_display = ('name',)
+    search_fields = ('name',)
 
 
 @admin.register(InstagramPage)
 class InstagramPageAdmin(admin.ModelAdmin):
     list_display = ('page', 'username', 'followers_count', 'is_verified', 'is_active', 'topic', 'sub_topic',
                     'gender', 'political_orientation', 'orientation', 'location', 'category')
+    list_select_related = ('topic', 'sub_topic', 'category')
     list_filter = (
         'is_verified',
         'is_active',
-        'created_at',
+        RecentCreatedFilter,
     )
-    search_fields = ('page', 'username', 'bio')
+    # پیشوندی روی نام و نام کاربری، زیررشته‌ای روی بیوگرافی (page_bio_trgm_idx در PostgreSQL)
+    search_fields = ('page__startswith', 'username__startswith', 'bio')
+    autocomplete_fields = ('topic', 'sub_topic', 'category')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ('created_at',)
     fieldsets = (
         ('اطلاعات پایه', {
@@ -65,16 +200,28 @@ class InstagramPageAdmin(admin.ModelAdmin):
         # }),
     )
     # inlines = [PageStatisticInline]
-    actions = ['mark_as_verified', 'mark_as_unverified']
+    actions = ['mark_as_verified', 'mark_as_unverified', 'reassign_topic']
 
     def mark_as_verified(self, request, queryset):
         queryset.update(is_verified=True)
+        bump_versions(InstagramPage)
     mark_as_verified.short_description = "تایید صفحات انتخاب شده"
 
     def mark_as_unverified(self, request, queryset):
         queryset.update(is_verified=False)
+        bump_versions(InstagramPage)
     mark_as_unverified.short_description = "لغو تایید صفحات انتخاب شده"
 
+    def reassign_topic(self, request, queryset):
+        form, response = bulk_form(self, request, queryset, PageTopicForm, 'تغییر موضوع صفحات')
+        if response is not None:
+            return response
+        sub_topic = form.cleaned_data['sub_topic']
+        queued_message(self, request, queryset.count(), enqueue(
+            reassign_pages, topic_id=form.cleaned_data['topic'].pk, sub_topic_id=sub_topic.pk if sub_topic else None,
+            **selection(request, queryset)))
+    reassign_topic.short_description = "تغییر موضوع صفحات انتخاب شده"
+
 
 @admin.register(DayAnalysis)
 class DayAnalysisAdmin(admin.ModelAdmin):
@@ -84,4 +231,33 @@ class DayAnalysisAdmin(admin.ModelAdmin):
     def get_jalali_date_display(self, obj):
         return obj.get_jalali_date()
 
-    get_jalali_date_display.short_description = 'تاریخ جلالی'
\ No newline at end of file
+    get_jalali_date_display.short_description = 'تاریخ جلالی'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'progress', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('dedup_key', 'locked_at', 'locked_by', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        # یکی‌یکی: کاری که نسخه یکسانش در صف است بسته می‌شود (job_pending_dedup)
+        for job_id in queryset.exclude(status=Job.RUNNING).values_list('id', flat=True):
+            requeue(Job.objects.filter(id=job_id), attempts=0, run_at=timezone.now())
+    retry_jobs.short_description = "اجرای دوباره کارهای انتخاب شده"
+
+
+@admin.register(AccessProfile)
+class AccessProfileAdmin(admin.ModelAdmin):
+    list_display = ('user', 'role')
+    list_filter = ('role',)
+    search_fields = ('user__username',)
+    autocomplete_fields = ('user',)
+    filter_horizontal = ('topics', 'categories')
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ('jti', 'user_id', 'revoked_at', 'expires_at')
+    search_fields = ('jti',)
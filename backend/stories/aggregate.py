@@ -0,0 +1,166 @@
+"""
+Generic multi-dimensional aggregation over stories (``/api/stats/aggregate/``).
+
+``group_by`` and filter dimensions come from a whitelist and compile into a
+single ``GROUP BY`` query; ``dedup=true`` skips near-duplicate stories. A
+cost estimate (product of dimension cardinalities) rejects requests that
+would produce too many groups.
+"""
+from datetime import timedelta
+
+import jdatetime
+from django.conf import settings
+from django.db import models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
+from django.utils import timezone
+
+from . import reference
+from .models import StoryModel, InstagramPage, Topic, SubTopic, Category
+
+
+class AggregateError(ValueError):
+    pass
+
+
+def _choices(model, field):
+    return len(model._meta.get_field(field).choices) + 1
+
+
+# name -> (values() expression or lookup, cardinality estimate(days), name model)
+DIMENSIONS = {
+    'date': (TruncDate('created_at'), lambda days: days + 1, None),
+    'week': (TruncWeek('created_at', output_field=models.DateField()), lambda days: days // 7 + 2, None),
+    'month': (TruncMonth('created_at', output_field=models.DateField()), lambda days: days // 28 + 2, None),
+    'topic': ('topic_id', lambda days: len(reference.names('topic')) + 1, Topic),
+    'sub_topic': ('sub_topic_id', lambda days: len(reference.names('sub_topic')) + 1, SubTopic),
+    'page': ('page_id', lambda days: InstagramPage.objects.count() + 1, InstagramPage),
+    'category': ('category_id', lambda days: len(reference.names('category')) + 1, Category),
+    'feeling': ('feeling', lambda days: _choices(StoryModel, 'feeling'), None),
+    'tone': ('tone', lambda days: _choices(StoryModel, 'tone'), None),
+    'ironic': ('ironic', lambda days: _choices(StoryModel, 'ironic'), None),
+    'story_type': ('story_type', lambda days: _choices(StoryModel, 'story_type'), None),
+    'gender': ('page__gender', lambda days: _choices(InstagramPage, 'gender'), None),
+    'political_orientation': ('page__political_orientation',
+                              lambda days: _choices(InstagramPage, 'political_orientation'), None),
+    'orientation': ('page__orientation', lambda days: _choices(InstagramPage, 'orientation'), None),
+    'location': ('page__location', lambda days: _choices(InstagramPage, 'location'), None),
+}
+
+# ابعادی که می‌توان روی آن‌ها فیلتر گذاشت (?feeling=شاد,غمگین)
+FILTERS = {name: spec[0] for name, spec in DIMENSIONS.items() if isinstance(spec[0], str)}
+# فیلترهای شناسه (کلید خارجی عددی)
+ID_FILTERS = {name for name, spec in DIMENSIONS.items() if spec[2] is not None}
+
+METRICS = {
+    'count': lambda: Count('id'),
+    'distinct_pages': lambda: Count('page_id', distinct=True),
+    'distinct_topics': lambda: Count('topic_id', distinct=True),
+    'distinct_categories': lambda: Count('category_id', distinct=True),
+}
+
+# بازه‌ها (هفته/ماه میلادی) با تاریخ جلالی شروع بازه برگردانده می‌شوند
+DATE_DIMENSIONS = ('date', 'week', 'month')
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def aggregate(params):
+    """
+    Run the aggregation described by query ``params`` and return
+    ``{'group_by': [...], 'metrics': [...], 'rows': [...]}``.
+    Raises AggregateError for invalid or too expensive requests.
+    """
+    limits = settings.AGGREGATE_LIMITS
+
+    group_by = _split(params.get('group_by', ''))
+    unknown = [name for name in group_by if name not in DIMENSIONS]
+    if unknown:
+        raise AggregateError('بعد نامعتبر: %s (مجاز: %s)' % (', '.join(unknown), ', '.join(DIMENSIONS)))
+    if len(group_by) > limits['MAX_DIMENSIONS']:
+        raise AggregateError('حداکثر %d بعد برای group_by مجاز است' % limits['MAX_DIMENSIONS'])
+    if len(set(group_by)) != len(group_by):
+        raise AggregateError('بعد تکراری در group_by')
+
+    metrics = _split(params.get('metrics', 'count'))
+    unknown = [name for name in metrics if name not in METRICS]
+    if unknown or not metrics:
+        raise AggregateError('متریک نامعتبر: %s (مجاز: %s)' % (', '.join(unknown), ', '.join(METRICS)))
+
+    days = params.get('days', '30')
+    if not days.isdigit():
+        raise AggregateError('پارامتر days باید یک عدد صحیح باشد')
+    days = int(days)
+    if days > limits['MAX_DAYS']:
+        raise AggregateError('حداکثر بازه %d روز است' % limits['MAX_DAYS'])
+
+    limit = params.get('limit', str(limits['MAX_ROWS']))
+    if not limit.isdigit():
+        raise AggregateError('پارامتر limit باید یک عدد صحیح باشد')
+    limit = min(int(limit), limits['MAX_ROWS'])
+
+    cost = 1
+    for name in group_by:
+        cost *= DIMENSIONS[name][1](days)
+    if cost > limits['MAX_GROUPS']:
+        raise AggregateError(
+            'درخواست بیش از حد سنگین است (حدود %d گروه)؛ ابعاد یا بازه را محدودتر کنید' % cost)
+
+    queryset = StoryModel.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    for name, lookup in FILTERS.items():
+        if name in params:
+            values = _split(params[name])
+            if name in ID_FILTERS and not all(value.isdigit() for value in values):
+                raise AggregateError('فیلتر %s باید شناسه‌های عددی باشد' % name)
+            queryset = queryset.filter(**{'%s__in' % lookup: values})
+    if params.get('dedup') in ('1', 'true'):
+        queryset = queryset.filter(duplicate_of__isnull=True)
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(Q(title__icontains=search) | Q(story_text__icontains=search))
+
+    if not group_by:
+        totals = queryset.aggregate(**{metric: METRICS[metric]() for metric in metrics})
+        return {'group_by': [], 'metrics': metrics, 'rows': [totals]}
+
+    aliases = {name: '_%s' % name for name in group_by}
+    rows = (queryset
+            .annotate(**{aliases[name]: _expression(name) for name in group_by})
+            .values(*aliases.values())
+            .annotate(**{metric: METRICS[metric]() for metric in metrics})
+            .order_by(*(['-' + metrics[0]] + list(aliases.values())))[:limit])
+
+    data = [
+        dict([(name, row[aliases[name]]) for name in group_by] + [(metric, row[metric]) for metric in metrics])
+        for row in rows
+    ]
+    _format(data, group_by)
+    return {'group_by': group_by, 'metrics': metrics, 'rows': data}
+
+
+def _expression(name):
+    expression = DIMENSIONS[name][0]
+    return models.F(expression) if isinstance(expression, str) else expression
+
+
+def _format(data, group_by):
+    """Jalali dates and id -> name for model dimensions."""
+    for name in group_by:
+        if name in DATE_DIMENSIONS:
+            for row in data:
+                if row[name] is not None:
+                    row[name] = jdatetime.date.fromgregorian(date=row[name]).strftime('%Y-%m-%d')
+            continue
+
+        model = DIMENSIONS[name][2]
+        if model is None:
+            continue
+        if model in reference.MODELS:
+            names = reference.names(name)
+        else:
+            ids = {row[name] for row in data if row[name] is not None}
+            names = dict(model.objects.filter(id__in=ids).values_list('id', 'page')) if ids else {}
+        for row in data:
+            row['%s_name' % name] = names.get(row[name])
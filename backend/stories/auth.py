@@ -0,0 +1,154 @@
+"""
+Stateless JWT authentication for the API.
+
+Tokens carry the user's role and the topics/categories they may edit
+(``null`` = all), so authenticating a request is a signature check and a
+set lookup: the user is a ClaimsUser built from the token, never loaded
+from the database. Revoked tokens (logout) and revoked users (role,
+scope or account changes) are held in a per-process RevocationList that
+reloads only when the RevokedToken change counter moves, checked at most
+every AUTH['REVOCATION_REFRESH'] seconds. Refreshing a token re-reads the
+claims from the database.
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .conditional import bump_versions, get_versions
+from .models import AccessProfile, RevokedToken
+
+
+def claims_for(user):
+    """Role and scope claims of ``user`` (superusers are admins of everything)."""
+    if user.is_superuser:
+        return {'role': AccessProfile.ADMIN, 'topics': None, 'categories': None}
+    profile = AccessProfile.objects.filter(user=user).first()
+    if profile is None:
+        return {'role': AccessProfile.VIEWER, 'topics': None, 'categories': None}
+    topics = sorted(profile.topics.values_list('id', flat=True))
+    categories = sorted(profile.categories.values_list('id', flat=True))
+    return {'role': profile.role, 'topics': topics or None, 'categories': categories or None}
+
+
+class ClaimsUser(TokenUser):
+    """Request user backed by the token claims."""
+
+    @property
+    def role(self):
+        return self.token.get('role', AccessProfile.VIEWER)
+
+    @property
+    def topics(self):
+        return self.token.get('topics')
+
+    @property
+    def categories(self):
+        return self.token.get('categories')
+
+
+class RevocationList:
+    def __init__(self):
+        self.jtis = set()
+        self.users = {}
+        self.version = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        if time.monotonic() - self.checked_at < settings.AUTH['REVOCATION_REFRESH']:
+            return
+        with self.lock:
+            if time.monotonic() - self.checked_at < settings.AUTH['REVOCATION_REFRESH']:
+                return
+            (_, version), = get_versions([RevokedToken])
+            if version != self.version:
+                jtis, users = set(), {}
+                rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+                for jti, user_id, revoked_at in rows.values_list('jti', 'user_id', 'revoked_at'):
+                    if jti:
+                        jtis.add(jti)
+                    else:
+                        users[user_id] = max(users.get(user_id, 0), revoked_at.timestamp())
+                self.jtis, self.users, self.version = jtis, users, version
+            self.checked_at = time.monotonic()
+
+    def is_revoked(self, payload):
+        self.refresh()
+        if payload.get(api_settings.JTI_CLAIM) in self.jtis:
+            return True
+        cutoff = self.users.get(payload.get(api_settings.USER_ID_CLAIM))
+        # iat ثانیه کامل است؛ توکنی که در همان ثانیه بعد از ابطال صادر شده باطل حساب نشود
+        issued = payload.get('issued_at', payload.get('iat', 0))
+        return cutoff is not None and issued <= cutoff
+
+
+revocations = RevocationList()
+
+
+def _purge():
+    RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+
+
+def revoke(token):
+    """Revoke one token (access or refresh) until it expires."""
+    _purge()
+    RevokedToken.objects.create(jti=token[api_settings.JTI_CLAIM],
+                                expires_at=datetime.fromtimestamp(token['exp'], dt_timezone.utc))
+    bump_versions(RevokedToken)
+
+
+def revoke_user(user_id):
+    """Revoke every token issued to ``user_id`` so far."""
+    _purge()
+    RevokedToken.objects.create(user_id=user_id, expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME)
+    bump_versions(RevokedToken)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocations.is_revoked(token.payload):
+            raise InvalidToken('توکن باطل شده است')
+        return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.get_username()
+        # زمان صدور با کسر ثانیه، برای مقایسه با زمان revoke_user؛ توکن دسترسی آن را از refresh می‌گیرد
+        token['issued_at'] = time.time()
+        for claim, value in claims_for(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsTokenRefreshSerializer(serializers.Serializer):
+    """New access token with the user's current claims."""
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        if revocations.is_revoked(refresh.payload):
+            raise InvalidToken('توکن باطل شده است')
+        user = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise InvalidToken('کاربر فعال نیست')
+        access = refresh.access_token
+        for claim, value in claims_for(user).items():
+            access[claim] = value
+        return {'access': str(access)}
@@ -0,0 +1,80 @@
+"""
+Bulk reclassification of stories and pages as batched set-based UPDATEs.
+
+``queryset.update()`` sends no signals, so everything the signals would
+keep in step is done here, in the same transaction as each batch: the
+StoryDailyCount counters of the batch are moved with ``rollups.shift``, page
+topics are copied onto the page's stories and the change counters are
+bumped. A failed batch rolls back whole; the batches before it stay applied
+and a retried job simply applies the same values again.
+"""
+from django.db import transaction
+
+from . import rollups, denormalize
+from .conditional import bump_versions
+from .models import StoryModel, InstagramPage
+
+BATCH_SIZE = 2000
+PAGE_BATCH_SIZE = 100
+
+# فیلدهایی که از ادمین به صورت گروهی عوض می‌شوند
+STORY_FIELDS = ('category_id', 'feeling', 'tone')
+
+
+def _batches(queryset, size):
+    """
+    Ids of ``queryset`` in id order, ``size`` at a time. Each batch is the
+    next ``id > last_id`` range of the query, so the selection is never held
+    in memory and rows an earlier batch changed don't shift the next one.
+    """
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def reclassify_stories(queryset, changes, batch_size=BATCH_SIZE, progress=None):
+    """
+    Set ``changes`` (a subset of STORY_FIELDS) on the stories of
+    ``queryset``. Returns the number of updated rows.
+    """
+    unknown = set(changes) - set(STORY_FIELDS)
+    if unknown:
+        raise ValueError('unknown fields: %s' % ', '.join(sorted(unknown)))
+    # فقط دسته در شمارنده‌های روزانه هست
+    counted = 'category_id' in changes
+    total, updated = queryset.count(), 0
+    for batch in _batches(queryset, batch_size):
+        stories = StoryModel.objects.filter(id__in=batch)
+        with transaction.atomic():
+            if counted:
+                rollups.shift(stories, -1)
+            updated += stories.update(**changes)
+            if counted:
+                rollups.shift(stories, 1)
+            bump_versions(StoryModel)
+        if progress is not None:
+            progress(updated, total)
+    return updated
+
+
+def reassign_pages(queryset, topic_id, sub_topic_id=None, batch_size=PAGE_BATCH_SIZE, progress=None):
+    """
+    Move the pages of ``queryset`` to ``topic_id``/``sub_topic_id`` and copy
+    the new topic onto their stories. Returns the number of updated pages.
+    """
+    total, updated = queryset.count(), 0
+    for batch in _batches(queryset, batch_size):
+        stories = StoryModel.objects.filter(page_id__in=batch)
+        with transaction.atomic():
+            rollups.shift(stories, -1)
+            updated += InstagramPage.objects.filter(id__in=batch).update(topic_id=topic_id, sub_topic_id=sub_topic_id)
+            denormalize.sync(stories)
+            rollups.shift(stories, 1)
+            bump_versions(InstagramPage, StoryModel)
+        if progress is not None:
+            progress(updated, total)
+    return updated
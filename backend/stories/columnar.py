@@ -0,0 +1,438 @@
+"""
+In-memory columnar engine for the ``stats`` breakdowns (optional, needs NumPy).
+
+The dimensions of every story are kept in NumPy arrays ordered by id.
+feeling/tone/ironic/story_type and topic/sub-topic/page ids are
+dictionary-encoded into small integer codes, and days and months are
+stored as integers. Title tags and text words are dictionary-encoded too,
+every story's codes back to back. A request is a boolean mask over the
+filters plus one ``bincount`` per breakdown (the tags and words of the
+masked stories included), so its cost no longer depends on SQL. The page
+bubble ignores the filters and is computed once per snapshot version.
+
+Every request compares the change counters (one query) with the versions
+the snapshot was read at, so its answer is never older than the ETag the
+counters gave. When they differ it appends the stories past its id
+high-water mark and re-reads the last TAIL rows, which catches late
+duplicate marks from the dedup job; counters and rows come from one
+transaction snapshot of the primary.
+Every save bumps the StoryModel change counter once and every duplicate
+link the dedup job sets or changes once more, so the bumps a refresh can
+explain are: one per appended row, one more per appended row already
+marked as a duplicate, and one per re-read row whose mark changed. Any
+other change is a full reload: a counter that moved further (edits,
+deletes, bulk updates, marks older than the tail), or a change to pages.
+A full reload runs in a background thread into new dictionaries and is
+published in one step; until then ``stats`` returns None and the view
+answers from SQL.
+Topic and sub-topic names come from stories.reference at request time,
+so renaming them needs no reload.
+
+Enable with STATS_ENGINE['BACKEND'] = 'columnar'; NumPy is imported on the
+first ``enabled()`` check, so the SQL setup never loads it. Without NumPy,
+or with ``search``, ``stats`` uses SQL.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import jdatetime
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import DateTimeField
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+from . import reference
+from .tokenizer import tokenize
+from .conditional import get_versions
+from .models import StoryModel, InstagramPage, Topic, SubTopic
+
+# numpy اختیاری و سنگین است؛ فقط وقتی موتور columnar فعال است بارگذاری می‌شود
+np = None
+_numpy_missing = False
+
+CHOICES = ('feeling', 'tone', 'ironic', 'story_type')
+# تگ‌های عنوان و واژه‌های متن هر استوری، برای top_tag و text_tag
+TERMS = ('tag', 'word')
+RELATIONS = {'topic': Topic, 'sub_topic': SubTopic, 'page': InstagramPage}
+# تغییر صفحه‌ها نام آن‌ها یا موضوع استوری‌ها را عوض می‌کند و کل snapshot دوباره خوانده می‌شود
+RELATED_MODELS = (InstagramPage,)
+
+
+def _load_numpy():
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+        except ImportError:
+            _numpy_missing = True
+        else:
+            np = numpy
+    return np is not None
+
+
+def enabled():
+    return settings.STATS_ENGINE['BACKEND'] == 'columnar' and _load_numpy()
+
+
+class _Dictionary:
+    """Value <-> dense code; code 0 is None."""
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _Columns:
+    """
+    One immutable version of the arrays; a refresh builds a new one. It
+    carries the dictionaries its codes refer to (they only grow until the
+    next full reload replaces them). ``terms`` holds, per TERMS name, the
+    number of terms of each story and their codes back to back.
+    """
+    dictionaries = pages = None
+
+    def __init__(self, ids, created, day, month, duplicate_of, codes, terms):
+        self.ids, self.created, self.day, self.month = ids, created, day, month
+        # شناسه اصلِ استوری‌های تکراری، صفر برای استوری‌های اصلی
+        self.duplicate_of = duplicate_of
+        self.codes, self.terms = codes, terms
+        self.bubble = None
+
+    def head(self, size):
+        return _Columns(self.ids[:size], self.created[:size], self.day[:size], self.month[:size],
+                        self.duplicate_of[:size], {name: codes[:size] for name, codes in self.codes.items()},
+                        {name: (lengths[:size], codes[:int(lengths[:size].sum())])
+                         for name, (lengths, codes) in self.terms.items()})
+
+    def concat(self, other):
+        return _Columns(
+            np.concatenate([self.ids, other.ids]), np.concatenate([self.created, other.created]),
+            np.concatenate([self.day, other.day]), np.concatenate([self.month, other.month]),
+            np.concatenate([self.duplicate_of, other.duplicate_of]),
+            {name: np.concatenate([codes, other.codes[name]]) for name, codes in self.codes.items()},
+            {name: (np.concatenate([lengths, other.terms[name][0]]), np.concatenate([codes, other.terms[name][1]]))
+             for name, (lengths, codes) in self.terms.items()})
+
+
+def _dtype(name):
+    return np.uint16 if name in CHOICES else np.int32
+
+
+def _dictionaries():
+    return {name: _Dictionary() for name in CHOICES + tuple(RELATIONS) + TERMS}
+
+
+def _versions():
+    """(StoryModel version, {related label: version}), one query on the primary."""
+    versions = dict(get_versions((StoryModel,) + RELATED_MODELS, using=DEFAULT_DB_ALIAS))
+    return versions.pop(StoryModel._meta.label_lower), versions
+
+
+@contextmanager
+def _consistent_read():
+    """
+    Counters and rows read inside it come from one snapshot of the primary
+    (REPEATABLE READ on PostgreSQL, a read transaction on SQLite/WAL).
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+class Snapshot:
+    def __init__(self, background=True):
+        self.columns = None
+        self.dictionaries = _dictionaries()
+        self.pages = {}
+        self.story_version = 0
+        self.related_versions = None
+        self.loading = False
+        # بارگذاری کامل بیرون از درخواست، در یک نخ جداگانه
+        self.background = background
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Columns at least as new as the change counters are now, or None while
+        a full reload runs (the caller then answers from SQL).
+        """
+        versions = _versions()
+        columns = self.columns
+        if columns is not None and versions == (self.story_version, self.related_versions):
+            return columns
+        with self.lock:
+            if self.loading:
+                return None
+            if self.columns is not None and self.append():
+                return self.columns
+            self.loading = True
+        if not self.background:
+            self.reload()
+            return self.columns
+        threading.Thread(target=self.reload, name='columnar-reload', daemon=True).start()
+        return None
+
+    def append(self):
+        """
+        Brings the columns up to date with the stories past the id high-water
+        mark and the re-read tail; False when that cannot explain the change.
+        """
+        with _consistent_read():
+            story_version, related_versions = _versions()
+            if related_versions != self.related_versions or story_version < self.story_version:
+                return False
+            if story_version == self.story_version:
+                return True
+
+            columns = self.columns
+            tail = settings.STATS_ENGINE['TAIL']
+            keep = max(len(columns.ids) - tail, 0)
+            after = int(columns.ids[keep - 1]) if keep else 0
+            rows = _read(StoryModel.objects.using(DEFAULT_DB_ALIAS).filter(id__gt=after),
+                         self.dictionaries, self.pages)
+        reread = len(columns.ids) - keep
+        if not np.array_equal(rows.ids[:reread], columns.ids[keep:]):
+            # یکی از ردیف‌های آخر حذف شده
+            return False
+        # هر ذخیره یک واحد و هر علامت تکراری که کار dedup می‌گذارد یا عوض می‌کند یک واحد دیگر؛
+        # تغییر بیشتر یعنی ویرایش، حذف یا به‌روزرسانی گروهی
+        changed_marks = int((rows.duplicate_of[:reread] != columns.duplicate_of[keep:]).sum())
+        appended = rows.duplicate_of[reread:]
+        explained = len(appended) + int((appended != 0).sum()) + changed_marks
+        if story_version - self.story_version > explained:
+            return False
+        self._publish(columns.head(keep).concat(rows), self.dictionaries, self.pages)
+        self.story_version = story_version
+        return True
+
+    def reload(self):
+        """Reads every story into new dictionaries and publishes them at once."""
+        try:
+            dictionaries, pages = _dictionaries(), {}
+            with _consistent_read():
+                story_version, related_versions = _versions()
+                columns = _read(StoryModel.objects.using(DEFAULT_DB_ALIAS).all(), dictionaries, pages)
+            with self.lock:
+                self._publish(columns, dictionaries, pages)
+                self.story_version, self.related_versions = story_version, related_versions
+        finally:
+            self.loading = False
+            if self.background:
+                # اتصال‌های این نخ
+                connections.close_all()
+
+    def _publish(self, columns, dictionaries, pages):
+        columns.dictionaries, columns.pages = dictionaries, pages
+        self.dictionaries, self.pages = dictionaries, pages
+        self.columns = columns
+
+
+def _read(queryset, dictionaries, pages):
+    """Columns of ``queryset``, ordered by id; adds new values to ``dictionaries`` and ``pages``."""
+    rows = (queryset
+            .annotate(moment=Cast('created_at', DateTimeField()), date=TruncDate('created_at'))
+            .order_by('id')
+            .values_list('id', 'moment', 'date', 'duplicate_of_id', 'title', 'story_text', *CHOICES,
+                         *('%s_id' % name for name in RELATIONS)))
+    ids, created, day, month, duplicate_of = [], [], [], [], []
+    codes = {name: [] for name in CHOICES + tuple(RELATIONS)}
+    encoders = [(codes[name].append, dictionaries[name].encode) for name in CHOICES + tuple(RELATIONS)]
+    terms = {name: ([], []) for name in TERMS}
+    tag_encode, word_encode = dictionaries['tag'].encode, dictionaries['word'].encode
+    for row in rows.iterator(chunk_size=5000):
+        ids.append(row[0])
+        created.append(row[1].timestamp())
+        day.append(row[2].toordinal())
+        month.append(row[2].year * 12 + row[2].month - 1)
+        duplicate_of.append(row[3] or 0)
+        # همان تگ‌ها و واژه‌های get_top_tags_from_queryset و get_text_from_queryset
+        for name, encode, items in (('tag', tag_encode, StoryModel.get_tags(row[4])),
+                                    ('word', word_encode, tokenize(row[5]))):
+            lengths, flat = terms[name]
+            size = len(flat)
+            flat.extend(encode(item) for item in items)
+            lengths.append(len(flat) - size)
+        for (append, encode), value in zip(encoders, row[6:]):
+            append(encode(value))
+
+    # صفحه‌ها اینجا (تغییرشان snapshot را از نو می‌خواند)، نام موضوع‌ها هنگام درخواست از stories.reference
+    missing = [pk for pk in dictionaries['page'].values[1:] if pk not in pages]
+    if missing:
+        pages.update(
+            (pk, (name, topic_id, followers)) for pk, name, topic_id, followers in
+            InstagramPage.objects.using(queryset.db).filter(id__in=missing)
+            .values_list('id', 'page', 'topic_id', 'followers_count'))
+    return _Columns(
+        np.array(ids, np.int64), np.array(created, np.float64), np.array(day, np.int32),
+        np.array(month, np.int32), np.array(duplicate_of, np.int64),
+        {name: np.array(values, _dtype(name)) for name, values in codes.items()},
+        {name: (np.array(lengths, np.int32), np.array(flat, np.int32)) for name, (lengths, flat) in terms.items()})
+
+
+snapshot = Snapshot()
+
+
+def _ranked(counts, labels):
+    """(label, count) pairs with a non-zero count, by count descending."""
+    order = np.argsort(-counts, kind='stable')
+    return [(labels[code], int(counts[code])) for code in order if counts[code]]
+
+
+def _jalali(day):
+    return jdatetime.date.fromgregorian(date=day).strftime('%Y-%m-%d')
+
+
+def _top_terms(columns, name, mask, limit=20):
+    """
+    Like ``Counter.most_common`` over the terms of the stories in ``mask``
+    taken in id order: by count, ties by first occurrence.
+    """
+    lengths, codes = columns.terms[name]
+    selected = codes[np.repeat(mask, lengths)]
+    if not len(selected):
+        return []
+    present, first = np.unique(selected, return_index=True)
+    counts = np.bincount(selected)[present]
+    values = columns.dictionaries[name].values
+    return [{'name': values[present[index]], 'weight': int(counts[index])}
+            for index in np.lexsort((first, -counts))[:limit]]
+
+
+def _page_bubble(columns):
+    """
+    ``by_page_bubble`` of the SQL path (one entry per story, grouped by page
+    topic, followers normalised to the largest). It ignores the filters, so
+    each version of the columns computes it once per version of the topic names.
+    """
+    topic_names = reference.names('topic')
+    if columns.bubble is not None and columns.bubble[0] is topic_names:
+        return columns.bubble[1]
+
+    page_codes = columns.codes['page']
+    present = np.unique(page_codes)
+    pages = [columns.pages.get(pk, (None, None, 0)) if pk is not None else (None, None, 0)
+             for pk in columns.dictionaries['page'].values]
+    max_value = max((pages[code][2] or 0 for code in present), default=1) or 1
+    groups = sorted({topic_names.get(pages[code][1]) or 'بدون موضوع' for code in present})
+    group_of = np.zeros(len(pages), np.int32)
+    entries = [None] * len(pages)
+    for code in present:
+        name, topic_id, followers = pages[code]
+        group_of[code] = groups.index(topic_names.get(topic_id) or 'بدون موضوع')
+        entries[code] = {'name': name, 'value': int(((followers or 0) / max_value) * 1000)}
+
+    # استوری‌ها به ترتیب شناسه، گروه‌بندی شده بر اساس موضوع صفحه
+    ordered = page_codes[np.argsort(group_of[page_codes], kind='stable')]
+    bounds = np.searchsorted(group_of[ordered], np.arange(len(groups) + 1))
+    bubble = [{'name': group, 'data': [entries[code] for code in ordered[bounds[index]:bounds[index + 1]]]}
+              for index, group in enumerate(groups)]
+    columns.bubble = (topic_names, bubble)
+    return bubble
+
+
+def stats(days=None, topic_id=None, page_id=None, dedup=False, tags=True):
+    """
+    The breakdowns of ``stats`` (same shapes as the SQL path) for stories
+    matching the filters, with ``top_tag``/``text_tag`` unless ``tags`` is
+    false. None while the snapshot loads.
+    """
+    columns = snapshot.get()
+    if columns is None:
+        return None
+    dictionaries = columns.dictionaries
+
+    mask = np.ones(len(columns.ids), np.bool_)
+    if days is not None:
+        mask &= columns.created >= (timezone.now() - timedelta(days=days)).timestamp()
+    for name, value in (('topic', topic_id), ('page', page_id)):
+        if value:
+            code = dictionaries[name].codes.get(int(value))
+            mask &= columns.codes[name] == code if code is not None else False
+    if dedup:
+        mask &= columns.duplicate_of == 0
+
+    # بدون فیلتر مؤثر کپی ستون‌ها لازم نیست
+    select = (lambda array: array) if mask.all() else (lambda array: array[mask])
+
+    def counts(name):
+        return np.bincount(select(columns.codes[name]), minlength=len(dictionaries[name].values))
+
+    def pie(name):
+        return [{'name': value, 'y': count} for value, count in _ranked(counts(name), dictionaries[name].values)]
+
+    def chart(name):
+        labels = {pk: page[0] for pk, page in columns.pages.items()} if name == 'page' else reference.names(name)
+        ranked = _ranked(counts(name)[1:], [labels.get(pk) for pk in dictionaries[name].values[1:]])
+        return [{'categories': [label for label, _ in ranked], 'data': [count for _, count in ranked]}]
+
+    by_feeling, by_tone = pie('feeling'), pie('tone')
+    feelings = [item['name'] for item in by_feeling]
+    feeling_codes = [dictionaries['feeling'].codes[feeling] for feeling in feelings]
+    tone_codes = [dictionaries['tone'].codes[item['name']] for item in by_tone]
+
+    # جدول روز × feeling با یک bincount روی کد ترکیبی (روزها نسبت به اولین روز، بدون مرتب‌سازی)
+    first_day, last_day = (int(columns.day.min()), int(columns.day.max())) if len(columns.day) else (0, -1)
+    feeling_values = select(columns.codes['feeling']).astype(np.int64)
+    width = len(dictionaries['feeling'].values)
+    per_day = np.bincount((select(columns.day) - first_day).astype(np.int64) * width + feeling_values,
+                          minlength=(last_day - first_day + 1) * width).reshape(-1, width)
+    day_counts = per_day.sum(axis=1)
+    # روزهای دارای استوری به ترتیب، مثل order_by('date')[:days]
+    present = np.flatnonzero(day_counts)
+    if days is not None:
+        present = present[:days]
+    dates = [date.fromordinal(first_day + int(offset)) for offset in present]
+
+    first_month = int(columns.month.min()) if len(columns.month) else 0
+    month_counts = np.bincount(select(columns.month) - first_month)
+    monthly_trend = [
+        {'month': jdatetime.date.fromgregorian(year=(first_month + int(offset)) // 12,
+                                               month=(first_month + int(offset)) % 12 + 1, day=1)
+            .strftime('%Y-%m'), 'count': int(month_counts[offset])}
+        for offset in np.flatnonzero(month_counts)[::-1][:6]
+    ]
+
+    tone_values = select(columns.codes['tone']).astype(np.int64)
+    per_tone = np.bincount(tone_values * width + feeling_values,
+                           minlength=len(dictionaries['tone'].values) * width).reshape(-1, width)
+    feeling_tone = [[int(per_tone[tone, code]) for tone in tone_codes] for code in feeling_codes]
+
+    data = {
+        'total_count': int(mask.sum()),
+        'daily_trend': [{'categories': dates, 'data': [int(day_counts[offset]) for offset in present]}],
+        'monthly_trend': monthly_trend,
+        'by_topic': chart('topic'),
+        'by_sub_topic': chart('sub_topic'),
+        'by_page': chart('page'),
+        'by_type': pie('story_type'),
+        'by_feeling': by_feeling,
+        'by_tone': by_tone,
+        'by_ironic': pie('ironic'),
+        'by_feeling_streamgraph': {
+            'categories': [_jalali(day) for day in dates],
+            'series': [{'name': feeling, 'data': [int(count) for count in per_day[present, code]]}
+                       for feeling, code in zip(feelings, feeling_codes)],
+        },
+        'by_feeling_tone': {
+            'categories': [item['name'] for item in by_tone],
+            'series': [{'name': feeling, 'data': data} for feeling, data in zip(feelings, feeling_tone)],
+            'max_value': max((count for data in feeling_tone for count in data), default=0),
+        },
+    }
+    if tags:
+        data['top_tag'], data['text_tag'] = _top_terms(columns, 'tag', mask), _top_terms(columns, 'word', mask)
+    data['by_page_bubble'] = _page_bubble(columns)
+    return data
@@ -0,0 +1,211 @@
+"""
+Compressed API responses: zstd, brotli or gzip, by Accept-Encoding.
+
+``CompressionMiddleware`` compresses JSON responses under /api/ with the
+client's preferred encoding (q-values first, then the order of
+COMPRESSION['ENCODINGS']). zstd and brotli need the optional ``zstandard``
+and ``brotli`` packages; gzip is always there.
+
+``@precompressed`` caches a view's rendered JSON already compressed in
+every available encoding, under the change counters of its models (like
+``@conditional``). A hit sends the stored bytes as they are: no view, no
+rendering, no compression. The entries are compressed once per version,
+so they use the higher COMPRESSION['CACHE_LEVELS'].
+
+Every compressed response is counted per endpoint (route) in ``report``
+for ``manage.py compression_report``.
+"""
+import gzip
+import re
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .conditional import version_key
+
+try:
+    import brotli
+except ImportError:  # brotli اختیاری است
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard اختیاری است
+    zstandard = None
+
+IDENTITY = 'identity'
+ACCEPT_ENCODING_RE = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def _gzip(data, level):
+    # mtime=0: خروجی ثابت برای بایت‌های یکسان
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level, mode=brotli.MODE_TEXT)
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+CODECS = {'gzip': _gzip}
+if brotli is not None:
+    CODECS['br'] = _brotli
+if zstandard is not None:
+    CODECS['zstd'] = _zstd
+
+
+def available():
+    """Configured encodings this process can produce, in preference order."""
+    return [encoding for encoding in settings.COMPRESSION['ENCODINGS'] if encoding in CODECS]
+
+
+def compress(data, encoding, cached=False):
+    levels = settings.COMPRESSION['CACHE_LEVELS' if cached else 'LEVELS']
+    return CODECS[encoding](data, levels[encoding])
+
+
+def negotiate(accept_encoding):
+    """Encoding to use for an Accept-Encoding header, or IDENTITY."""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        match = ACCEPT_ENCODING_RE.match(item)
+        if match:
+            try:
+                accepted[match[1].lower()] = float(match[2]) if match[2] else 1.0
+            except ValueError:
+                continue
+    best, best_q = IDENTITY, 0
+    for encoding in available():
+        q = accepted.get(encoding, accepted.get('*', 0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class Report:
+    """Per-endpoint totals of the compressed responses of this process."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, encoding, raw, sent, seconds, hit):
+        with self.lock:
+            row = self.endpoints.setdefault((endpoint, encoding), [0, 0, 0, 0.0, 0])
+            row[0] += 1
+            row[1] += raw
+            row[2] += sent
+            row[3] += seconds
+            row[4] += hit
+
+    def rows(self):
+        """[(endpoint, encoding, responses, raw bytes, sent bytes, compress seconds, cache hits)]"""
+        with self.lock:
+            return [key + tuple(row) for key, row in sorted(self.endpoints.items())]
+
+
+report = Report()
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route.lstrip('^').rstrip('$') if match is not None else request.path
+
+
+def _weaken_etag(response):
+    # بدنه فشرده بایت‌به‌بایت با بدنه اصلی یکی نیست
+    etag = response.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response['ETag'] = 'W/' + etag
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        options = settings.COMPRESSION
+        if (not request.path.startswith(options['PATH_PREFIX'])
+                or request.path.startswith(options['EXCLUDE'])
+                or response.streaming
+                or not response.get('Content-Type', '').startswith('application/json')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.has_header('Content-Encoding'):
+            # از @precompressed، از قبل فشرده
+            _weaken_etag(response)
+            return response
+        if len(response.content) < options['MIN_SIZE']:
+            return response
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding == IDENTITY:
+            return response
+
+        started = time.perf_counter()
+        content = compress(response.content, encoding)
+        report.add(_endpoint(request), encoding, len(response.content), len(content),
+                   time.perf_counter() - started, 0)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        _weaken_etag(response)
+        return response
+
+
+def precompressed(*models, window=False):
+    """
+    View method decorator: serve the JSON of GET requests from the cache,
+    stored compressed in every available encoding. Put it under
+    ``@conditional`` (same models) and above ``@admission``.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or request.accepted_renderer.format != 'json':
+                return view_method(self, request, *args, **kwargs)
+
+            key = 'stories:response:%s' % version_key(models, request.get_full_path(), window=window)
+            encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            entry = cache.get(key)
+            hit = entry is not None
+            if not hit:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = self.get_renderer_context()
+                raw = response.render().content
+                entry = {IDENTITY: raw}
+                for name in available():
+                    started = time.perf_counter()
+                    entry[name] = compress(raw, name, cached=True)
+                    report.add(_endpoint(request), name, len(raw), len(entry[name]),
+                               time.perf_counter() - started, 0)
+                cache.set(key, entry, settings.COMPRESSION['CACHE_TIMEOUT'])
+
+            if encoding not in entry or len(entry[encoding]) >= len(entry[IDENTITY]):
+                encoding = IDENTITY
+            response = HttpResponse(entry[encoding], content_type=request.accepted_media_type)
+            if encoding != IDENTITY:
+                response['Content-Encoding'] = encoding
+                if hit:
+                    report.add(_endpoint(request), encoding, len(entry[IDENTITY]), len(entry[encoding]), 0, 1)
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,144 @@
+"""
+Near-duplicate stories.
+
+Image stories get a 64-bit difference hash (dHash) of the picture and every
+story with text a 64-bit SimHash of ``story_text``. Both are split into four
+16-bit LSH bands (StoryHashBand): two hashes within ``BANDS - 1`` bits of
+each other always share a band, so candidates come from an index lookup and
+only those are compared bit by bit.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .conditional import bump_versions
+from .models import StoryModel, StoryHashBand, StoryType
+from .tokenizer import tokenize
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+MASK = (1 << BITS) - 1
+
+
+def to_signed(value):
+    """64-bit unsigned hash -> value storable in a BigIntegerField."""
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+def distance(a, b):
+    return bin((a ^ b) & MASK).count('1')
+
+
+def bands(value):
+    value &= MASK
+    return [(value >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1) for band in range(BANDS)]
+
+
+def image_dhash(fileobj, size=8):
+    """dHash: compare neighbouring pixels of a (size+1) x size grayscale thumbnail."""
+    from PIL import Image
+
+    with Image.open(fileobj) as image:
+        # برای JPEG فقط نسخه کوچک شده دیکد می‌شود
+        image.draft('L', (size * 8, size * 8))
+        pixels = list(image.convert('L').resize((size + 1, size), Image.Resampling.BILINEAR).getdata())
+
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def tokens(text):
+    # ریشه‌یابی سبک تا «کتاب» و «کتاب‌ها» یکی حساب شوند
+    return list(tokenize(text, stem=True))
+
+
+def text_simhash(text):
+    """SimHash of the word tokens of ``text``; None for too short texts."""
+    words = tokens(text or '')
+    if len(words) < settings.DEDUP['MIN_TEXT_TOKENS']:
+        return None
+
+    weights = [0] * BITS
+    for word in words:
+        digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'big')
+        for bit in range(BITS):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+
+    value = 0
+    for bit in range(BITS):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def candidates(kind, value, exclude_id=None):
+    """Story ids sharing at least one LSH band with ``value``."""
+    condition = Q()
+    for band, band_value in enumerate(bands(value)):
+        condition |= Q(band=band, value=band_value)
+    queryset = StoryHashBand.objects.filter(condition, kind=kind)
+    if exclude_id is not None:
+        queryset = queryset.exclude(story_id=exclude_id)
+    return set(queryset.values_list('story_id', flat=True))
+
+
+def near_duplicates(story):
+    """Ids of stories whose image or text hash is within the configured distance."""
+    found = set()
+    for kind, field, max_distance in (
+        (StoryHashBand.IMAGE, 'image_hash', settings.DEDUP['IMAGE_DISTANCE']),
+        (StoryHashBand.TEXT, 'text_hash', settings.DEDUP['TEXT_DISTANCE']),
+    ):
+        value = getattr(story, field)
+        if value is None:
+            continue
+        ids = candidates(kind, value, exclude_id=story.pk)
+        for story_id, other in StoryModel.objects.filter(id__in=ids).values_list('id', field):
+            if other is not None and distance(value, other) <= max_distance:
+                found.add(story_id)
+    return found
+
+
+def index_story(story):
+    """Compute the hashes of ``story``, store its bands and link it to an earlier duplicate."""
+    image_hash = None
+    if story.story_type == StoryType.Image and story.story:
+        try:
+            with story.story.open('rb') as fileobj:
+                image_hash = image_dhash(fileobj)
+        except (OSError, ValueError):
+            # فایل موجود نیست یا تصویر معتبر نیست
+            image_hash = None
+    text_hash = text_simhash(story.story_text)
+
+    story.image_hash = None if image_hash is None else to_signed(image_hash)
+    story.text_hash = None if text_hash is None else to_signed(text_hash)
+
+    with transaction.atomic():
+        StoryHashBand.objects.filter(story=story).delete()
+        StoryHashBand.objects.bulk_create(
+            StoryHashBand(story=story, kind=kind, band=band, value=band_value)
+            for kind, value in ((StoryHashBand.IMAGE, image_hash), (StoryHashBand.TEXT, text_hash))
+            if value is not None
+            for band, band_value in enumerate(bands(value))
+        )
+        earlier = sorted(story_id for story_id in near_duplicates(story) if story_id < story.pk)
+        original = None
+        if earlier:
+            # همیشه به ریشه زنجیره اشاره می‌کنیم
+            original = StoryModel.objects.filter(id=earlier[0]).values_list('duplicate_of_id', flat=True).first()
+            original = original or earlier[0]
+        StoryModel.objects.filter(pk=story.pk).update(
+            image_hash=story.image_hash, text_hash=story.text_hash, duplicate_of_id=original)
+        if original != story.duplicate_of_id:
+            # update() سیگنال نمی‌فرستد؛ پاسخ‌های dedup=true باید تازه شوند
+            bump_versions(StoryModel)
+        story.duplicate_of_id = original
@@ -0,0 +1,46 @@
+"""
+Keeps StoryModel.topic / sub_topic equal to the topic and sub-topic of the
+story's page.
+"""
+from django.db.models import F, Q, OuterRef, Subquery
+
+from .models import StoryModel, InstagramPage
+
+BATCH_SIZE = 5000
+
+
+def page_topics(page_id):
+    if page_id is None:
+        return None, None
+    return (InstagramPage.objects.filter(id=page_id)
+            .values_list('topic_id', 'sub_topic_id').first() or (None, None))
+
+
+def drifted():
+    """Stories whose topic/sub-topic no longer match their page."""
+    topic_ok = Q(topic_id=F('page__topic_id')) | Q(topic__isnull=True, page__topic__isnull=True)
+    sub_topic_ok = Q(sub_topic_id=F('page__sub_topic_id')) | Q(sub_topic__isnull=True, page__sub_topic__isnull=True)
+    return StoryModel.objects.filter(~(topic_ok & sub_topic_ok))
+
+
+def sync(queryset=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Copy page topics onto ``queryset`` (default: all stories) with set-based
+    UPDATEs of at most ``batch_size`` rows each. Returns the number of rows.
+    """
+    queryset = StoryModel.objects.all() if queryset is None else queryset
+    pages = InstagramPage.objects.filter(id=OuterRef('page_id'))
+    total = queryset.count() if progress is not None else 0
+    updated, last_id = 0, 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            break
+        updated += StoryModel.objects.filter(id__in=batch).update(
+            topic_id=Subquery(pages.values('topic_id')[:1]),
+            sub_topic_id=Subquery(pages.values('sub_topic_id')[:1]),
+        )
+        last_id = batch[-1]
+        if progress is not None:
+            progress(updated, total)
+    return updated
@@ -0,0 +1,237 @@
+"""
+Live story deltas for dashboards, as server-sent events (SSE).
+
+Every new story is published, after its transaction commits, as a small
+delta: +1 for its day, feeling, tone and topic. A broker fans the deltas
+out to the open streams. Deltas published within EVENTS['FLUSH_INTERVAL']
+are merged into one message that is encoded once and shared by every
+stream, and one timer sends the heartbeats of all of them, so an idle
+connection costs a coroutine and a queue, not a thread.
+
+``UnixSocketBroker`` (the default) stands in for an external broker on
+one host: each process publishes datagrams to the sockets of the
+processes that have streams, so stories saved by WSGI or job workers
+reach them too. ``InProcessBroker`` only sees the stories saved by its
+own ASGI process; it suits a single-process setup.
+
+A client that falls EVENTS['QUEUE_SIZE'] messages behind gets a ``reset``
+event instead of the lost deltas and should refetch ``stats``.
+"""
+import asyncio
+import glob
+import json
+import os
+import socket
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .rollups import story_day
+
+PING = b': ping\n\n'
+RESET = b'event: reset\ndata: {}\n\n'
+CLOSE = None
+
+
+def story_delta(story):
+    delta = {
+        'day': story_day(story.created_at).isoformat(),
+        'feeling': story.feeling,
+        'tone': story.tone,
+    }
+    if story.topic_id:
+        delta['topic'] = str(story.topic_id)
+    return delta
+
+
+class _Pending:
+    """Deltas merged since the last flush."""
+
+    def __init__(self):
+        self.stories = 0
+        self.counts = {key: Counter() for key in ('day', 'feeling', 'tone', 'topic')}
+
+    def add(self, delta):
+        self.stories += 1
+        for key, counter in self.counts.items():
+            if delta.get(key):
+                counter[delta[key]] += 1
+
+    def as_dict(self):
+        return {'stories': self.stories, **{key: dict(counter) for key, counter in self.counts.items()}}
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.streams = set()
+        self.sequence = 0
+        self._pending = _Pending()
+        self._lock = threading.Lock()
+        self._flush_scheduled = False
+        self._loop = None
+
+    def publish(self, delta):
+        """Send ``delta`` to the streams (callable from any thread)."""
+        self._receive(delta)
+
+    def _receive(self, delta):
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self.streams:
+            return
+        with self._lock:
+            self._pending.add(delta)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        loop.call_soon_threadsafe(loop.call_later, settings.EVENTS['FLUSH_INTERVAL'], self._flush)
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, _Pending()
+            self._flush_scheduled = False
+        if not pending.stories:
+            return
+        self.sequence += 1
+        data = json.dumps(pending.as_dict(), ensure_ascii=False, separators=(',', ':'))
+        self._broadcast(('id: %d\nevent: delta\ndata: %s\n\n' % (self.sequence, data)).encode())
+
+    def _broadcast(self, message):
+        for queue in self.streams:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # کلاینت کند است؛ به جای دلتاهای از دست رفته reset می‌گیرد، مگر اینکه قطع شده باشد
+                closed = False
+                while not queue.empty():
+                    closed = queue.get_nowait() is CLOSE or closed
+                queue.put_nowait(CLOSE if closed else RESET)
+
+    def _heartbeat(self):
+        if self.streams:
+            self._broadcast(PING)
+        self._loop.call_later(settings.EVENTS['HEARTBEAT'], self._heartbeat)
+
+    def _start(self, loop):
+        self._loop = loop
+        loop.call_later(settings.EVENTS['HEARTBEAT'], self._heartbeat)
+
+    def subscribe(self):
+        """A queue of encoded messages; call from the event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._start(loop)
+        queue = asyncio.Queue(maxsize=settings.EVENTS['QUEUE_SIZE'])
+        self.streams.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.streams.discard(queue)
+
+
+class UnixSocketBroker(InProcessBroker):
+    def __init__(self):
+        super().__init__()
+        self.directory = settings.EVENTS['SOCKET_DIR']
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._socket = None
+
+    def publish(self, delta):
+        data = json.dumps(delta).encode()
+        for path in glob.glob(os.path.join(self.directory, '*.sock')):
+            try:
+                self._sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # پروسه صاحب سوکت دیگر وجود ندارد
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                pass
+
+    def _start(self, loop):
+        super()._start(loop)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '%d.sock' % os.getpid())
+        if os.path.exists(path):
+            os.unlink(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(path)
+        self._socket.setblocking(False)
+        loop.add_reader(self._socket.fileno(), self._read)
+
+    def _read(self):
+        while True:
+            try:
+                data = self._socket.recv(65536)
+            except BlockingIOError:
+                return
+            try:
+                self._receive(json.loads(data))
+            except ValueError:
+                pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENTS['BROKER'])()
+    return _broker
+
+
+def publish(delta):
+    get_broker().publish(delta)
+
+
+async def stream(scope, receive, send):
+    """ASGI app of the event stream."""
+    broker = get_broker()
+    queue = broker.subscribe()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(CLOSE)
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'access-control-allow-origin', b'*'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while True:
+            message = await queue.get()
+            if message is CLOSE:
+                break
+            await send({'type': 'http.response.body', 'body': message, 'more_body': True})
+    finally:
+        broker.unsubscribe(queue)
+        watcher.cancel()
+
+
+def route_events(application):
+    """Serve GET EVENTS['PATH'] with ``stream`` and everything else with ``application``."""
+    path = settings.EVENTS['PATH']
+
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == path and scope['method'] == 'GET':
+            await stream(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+
+    return router
@@ -0,0 +1,188 @@
+"""
+Database-backed background jobs, no external broker.
+
+Register a function with ``@job`` (in a ``tasks.py`` module so the worker
+finds it), schedule it with ``enqueue()`` and run ``manage.py run_jobs``.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+_running = threading.local()
+
+
+def job(func=None, *, name=None, max_attempts=None):
+    """Register ``func`` as a job; it is called with the job kwargs."""
+    def decorator(func):
+        job_name = name or '%s.%s' % (func.__module__, func.__name__)
+        func.job_name = job_name
+        func.max_attempts = max_attempts
+        registry[job_name] = func
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def enqueue(func, *, dedup=True, priority=0, delay=None, max_attempts=None, **kwargs):
+    """
+    Schedule ``func`` (a registered job or its name) with ``kwargs``.
+
+    With ``dedup`` an identical job still waiting in the queue is reused
+    instead of queueing a second one.
+    """
+    name = func if isinstance(func, str) else func.job_name
+    if max_attempts is None:
+        max_attempts = getattr(registry.get(name), 'max_attempts', None) or settings.JOBS['MAX_ATTEMPTS']
+    dedup_key = ''
+    if dedup:
+        payload = json.dumps([name, kwargs], sort_keys=True, default=str)
+        dedup_key = hashlib.sha1(payload.encode()).hexdigest()
+
+    while True:
+        if dedup:
+            existing = Job.objects.filter(dedup_key=dedup_key, status=Job.PENDING).first()
+            if existing is not None:
+                return existing
+        try:
+            with transaction.atomic():
+                return Job.objects.create(
+                    name=name, kwargs=kwargs, dedup_key=dedup_key, priority=priority, max_attempts=max_attempts,
+                    run_at=timezone.now() + (delay or timedelta()),
+                )
+        except IntegrityError:
+            # یک ورکر/درخواست دیگر همزمان همین کار را در صف گذاشته (و شاید ورکری آن را برداشته باشد)
+            continue
+
+
+def set_progress(job_id, percent):
+    Job.objects.filter(id=job_id).update(progress=max(0, min(100, int(percent))))
+
+
+def current_job_id():
+    """Id of the job running in this thread, or None outside the worker."""
+    return getattr(_running, 'job_id', None)
+
+
+def report_progress(done, total):
+    """Progress callback for batched jobs: ``done`` of ``total`` items."""
+    job_id = current_job_id()
+    if job_id is not None and total:
+        set_progress(job_id, 100 * done / total)
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def requeue(rows, **fields):
+    """
+    Put the job in ``rows`` back in the queue. If an identical job was
+    queued while it ran (``job_pending_dedup``), that one will do the work:
+    this row is closed as done instead. Returns the number requeued.
+    """
+    try:
+        with transaction.atomic():
+            return rows.update(status=Job.PENDING, locked_at=None, locked_by='', **fields)
+    except IntegrityError:
+        note = 'superseded by an identical pending job'
+        if fields.get('last_error'):
+            note = '%s\n%s' % (fields['last_error'], note)
+        rows.update(status=Job.DONE, locked_at=None, finished_at=timezone.now(), last_error=note)
+        return 0
+
+
+def requeue_stale():
+    """Jobs left running by a dead worker go back to the queue."""
+    threshold = timezone.now() - timedelta(seconds=settings.JOBS['LOCK_TIMEOUT'])
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=threshold)
+    # یکی‌یکی: هر کدام ممکن است با یک کار منتظر یکسان برخورد کند
+    return sum(requeue(stale.filter(id=job_id)) for job_id in list(stale.values_list('id', flat=True)))
+
+
+def claim(limit):
+    """
+    Take up to ``limit`` due jobs. Each one is claimed with a conditional
+    UPDATE, so concurrent workers never run the same job (works on SQLite
+    as well as PostgreSQL).
+    """
+    now = timezone.now()
+    candidates = (Job.objects.filter(status=Job.PENDING, run_at__lte=now)
+                  .order_by('-priority', 'run_at')
+                  .values_list('id', flat=True)[:limit * 2])
+    claimed = []
+    for job_id in candidates:
+        updated = Job.objects.filter(id=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_at=now, locked_by=worker_name(), attempts=F('attempts') + 1)
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def autodiscover():
+    """Import ``tasks`` modules of installed apps so their jobs register."""
+    autodiscover_modules('tasks')
+
+
+def run_job(job_id):
+    """Execute one claimed job and record the outcome."""
+    if not registry:
+        # پروسه‌های spawn شده رجیستری را خودشان می‌سازند
+        autodiscover()
+    close_old_connections()
+    try:
+        return _execute(Job.objects.get(id=job_id))
+    finally:
+        close_old_connections()
+
+
+def _execute(job_row):
+    try:
+        func = registry[job_row.name]
+    except KeyError:
+        _finish(job_row, Job.FAILED, 'unknown job %r' % job_row.name)
+        return Job.FAILED
+
+    _running.job_id = job_row.id
+    try:
+        func(**job_row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('job %s #%d failed (attempt %d)', job_row.name, job_row.id, job_row.attempts)
+        if job_row.attempts < job_row.max_attempts:
+            # backoff نمایی: 1، 2، 4، ... برابر زمان پایه
+            backoff = settings.JOBS['RETRY_BACKOFF'] * 2 ** (job_row.attempts - 1)
+            if requeue(Job.objects.filter(id=job_row.id), last_error=error,
+                        run_at=timezone.now() + timedelta(seconds=backoff)):
+                return Job.PENDING
+            return Job.DONE
+        _finish(job_row, Job.FAILED, error)
+        return Job.FAILED
+    finally:
+        _running.job_id = None
+
+    _finish(job_row, Job.DONE)
+    return Job.DONE
+
+
+def _finish(job_row, status, error=''):
+    Job.objects.filter(id=job_row.id).update(
+        status=status, last_error=error, finished_at=timezone.now(), locked_at=None,
+        progress=100 if status == Job.DONE else F('progress'))
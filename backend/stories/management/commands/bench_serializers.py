@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from stories.models import StoryModel, InstagramPage, Feeling, Tone, Ironic, StoryType
+from stories.renderers import FastJSONRenderer
+from stories.serializers import StoryModelSerializer, InstagramPageSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the regular and the values() serializer paths (and JSON renderers).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=0,
+                            help='Seed this many synthetic stories inside a rolled back transaction.')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['rows']:
+                self.seed(options['rows'])
+            request = RequestFactory().get('/api/storymodel/')
+            context = {'request': request}
+
+            for serializer_class, queryset in (
+                (StoryModelSerializer, StoryModel.objects.select_related('page')),
+                (InstagramPageSerializer, InstagramPage.objects.all()),
+            ):
+                self.bench(serializer_class, queryset, context, options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        page, _ = InstagramPage.objects.get_or_create(username='bench_page', defaults={'page': 'bench', 'followers_count': 1000})
+        feelings, tones, ironics = Feeling.values, Tone.values, Ironic.values
+        StoryModel.objects.bulk_create(
+            StoryModel(
+                title='تگ %d، تگ %d' % (i % 50, i % 7),
+                page=page,
+                story='images/bench_%d.jpg' % i,
+                feeling=feelings[i % len(feelings)],
+                ironic=ironics[i % len(ironics)],
+                tone=tones[i % len(tones)],
+                story_text='متن استوری شماره %d' % i,
+                story_type=StoryType.Image,
+            )
+            for i in range(rows)
+        )
+
+    def bench(self, serializer_class, queryset, context, repeat):
+        rows = queryset.count()
+        if not rows:
+            self.stdout.write('%s: no rows, skipped (use --rows)' % serializer_class.__name__)
+            return
+
+        slow = fast = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            slow_data = serializer_class(queryset.all(), many=True, context=context).data
+            slow = min(slow, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            fast_data = serializer_class.values_data(queryset.all(), context)
+            fast = min(fast, time.perf_counter() - started)
+
+        slow_bytes = JSONRenderer().render(slow_data)
+        fast_bytes = FastJSONRenderer().render(fast_data)
+        if slow_bytes != fast_bytes:
+            raise CommandError('%s: fast path output differs from the serializer output' % serializer_class.__name__)
+
+        render_slow = render_fast = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            JSONRenderer().render(fast_data)
+            render_slow = min(render_slow, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            FastJSONRenderer().render(fast_data)
+            render_fast = min(render_fast, time.perf_counter() - started)
+
+        self.stdout.write(
+            '%s: %d rows | serialize %.0f -> %.0f rows/s (x%.1f) | render %.0f -> %.0f rows/s (x%.1f) | identical'
+            % (serializer_class.__name__, rows,
+               rows / slow, rows / fast, slow / fast,
+               rows / render_slow, rows / render_fast, render_slow / render_fast)
+        )
@@ -0,0 +1,45 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from stories.models import StoryModel
+from stories.tokenizer import tokenize_all
+
+SAMPLE = (
+    'امروز كتاب‌هاي جديدي در نمايشگاه معرفي شد و بازدیدکنندگان زیادی برای دیدن آن‌ها آمده بودند. '
+    'قیمت‌ها نسبت به سال ۱۴۰۲ بیشتر شده است، اما استقبال مردم همچنان خوب است! '
+)
+
+
+class Command(BaseCommand):
+    help = 'Tokens/sec of stories.tokenizer against a plain str.split() over story texts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=1_000_000,
+                            help='Approximate corpus size; story texts are repeated (or a sample is used).')
+        parser.add_argument('--stem', action='store_true')
+
+    def handle(self, *args, **options):
+        texts = [text for text in StoryModel.objects.exclude(story_text='')
+                 .exclude(story_text__isnull=True).values_list('story_text', flat=True)[:10000]]
+        source = 'story_text (%d rows)' % len(texts)
+        if not texts:
+            texts, source = [SAMPLE], 'built-in sample'
+        words = sum(len(text.split()) for text in texts) or 1
+        corpus = texts * max(1, options['tokens'] // words)
+
+        started = time.perf_counter()
+        split_count = sum(1 for text in corpus for _ in text.split(' '))
+        split_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        counter = Counter(tokenize_all(corpus, stem=options['stem']))
+        tokenize_time = time.perf_counter() - started
+
+        kept = sum(counter.values())
+        self.stdout.write('%s, %d words' % (source, sum(len(text.split()) for text in corpus)))
+        self.stdout.write('str.split:  %.2fM tokens/s' % (split_count / split_time / 1e6))
+        self.stdout.write('tokenizer:  %.2fM tokens/s (%d kept, %d distinct)' % (
+            sum(len(text.split()) for text in corpus) / tokenize_time / 1e6, kept, len(counter)))
+        self.stdout.write('top: %s' % ', '.join(word for word, _ in counter.most_common(10)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from stories import sketches
+from stories.models import DailySketch
+from stories.rollups import window_start
+
+
+class Command(BaseCommand):
+    help = 'Build the missing day/month sketches of the last --days days (all of them with --rebuild).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--rebuild', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            DailySketch.objects.filter(day__gte=window_start(options['days']).replace(day=1)).delete()
+        before = DailySketch.objects.count()
+        # window() هر خلاصه‌ای را که نیست می‌سازد و ذخیره می‌کند
+        sketches.window(options['days'])
+        self.stdout.write('%d sketches built' % (DailySketch.objects.count() - before))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from stories.compression import IDENTITY, available, report
+
+DEFAULT_PATHS = (
+    '/api/stats/stats/?days=30',
+    '/api/stats/aggregate/?group_by=date,feeling&days=30',
+    '/api/storymodel/?days=30',
+    '/api/instagram-pages/',
+    '/api/topics/',
+    '/api/category/',
+)
+
+
+class Command(BaseCommand):
+    help = 'Response size and latency per endpoint and content encoding.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        client = Client()
+        self.stdout.write('%-55s %-8s %10s %7s %9s %9s' % ('endpoint', 'encoding', 'bytes', 'ratio', 'first ms', 'warm ms'))
+        for path in options['paths']:
+            raw = None
+            for encoding in [IDENTITY] + available():
+                first, size = self.fetch(client, path, encoding)
+                warm = min(self.fetch(client, path, encoding)[0] for _ in range(options['repeat']))
+                raw = raw or size
+                self.stdout.write('%-55s %-8s %10d %6.1f%% %9.1f %9.1f' % (
+                    path[:55], encoding, size, 100.0 * size / raw if raw else 100, first * 1000, warm * 1000))
+
+        # زمان فشرده‌سازی ثبت شده در همین پروسه (میان‌افزار و ورودی‌های کش)
+        self.stdout.write('\n%-40s %-8s %8s %12s %12s %12s %6s' % (
+            'route', 'encoding', 'count', 'raw bytes', 'sent bytes', 'compress ms', 'hits'))
+        for endpoint, encoding, count, raw_bytes, sent, seconds, hits in report.rows():
+            self.stdout.write('%-40s %-8s %8d %12d %12d %12.1f %6d' % (
+                endpoint[:40], encoding, count, raw_bytes, sent, seconds * 1000, hits))
+
+    def fetch(self, client, path, encoding):
+        started = time.perf_counter()
+        response = client.get(path, HTTP_ACCEPT_ENCODING=encoding, HTTP_ACCEPT='application/json')
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            self.stderr.write('%s: HTTP %d' % (path, response.status_code))
+        return elapsed, len(response.content)
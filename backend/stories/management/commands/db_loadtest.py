@@ -0,0 +1,83 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Count
+from django.utils import timezone
+
+from stories.models import StoryModel, InstagramPage, TermTrend, Feeling, Tone, Ironic, StoryType
+
+LOADTEST_TITLE = '__db_loadtest__'
+
+
+class Command(BaseCommand):
+    help = 'Concurrent read/write throughput against the configured database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        self.stdout.write('%s (%s) CONN_MAX_AGE=%s' % (
+            connection.vendor, settings_dict['NAME'], settings_dict['CONN_MAX_AGE']))
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.stdout.write('journal_mode=%s' % cursor.fetchone()[0])
+
+        page, _ = InstagramPage.objects.get_or_create(username='loadtest_page', defaults={'page': 'loadtest'})
+        deadline = time.monotonic() + options['seconds']
+        results = {'write': [], 'read': [], 'errors': []}
+
+        def writer():
+            done = 0
+            try:
+                while time.monotonic() < deadline:
+                    StoryModel.objects.create(
+                        title=LOADTEST_TITLE, page=page, story='images/loadtest.jpg',
+                        feeling=Feeling.HAPPY, ironic=Ironic.YES, tone=Tone.FORMAL, story_type=StoryType.Text,
+                    )
+                    done += 1
+            except Exception as exc:
+                results['errors'].append(repr(exc))
+            finally:
+                connections.close_all()
+            results['write'].append(done)
+
+        def reader():
+            done = 0
+            threshold = timezone.now() - timedelta(days=30)
+            try:
+                while time.monotonic() < deadline:
+                    list(StoryModel.objects.filter(created_at__gte=threshold)
+                         .values('feeling').order_by().annotate(n=Count('id')))
+                    done += 1
+            except Exception as exc:
+                results['errors'].append(repr(exc))
+            finally:
+                connections.close_all()
+            results['read'].append(done)
+
+        threads = [threading.Thread(target=writer) for _ in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        StoryModel.objects.filter(title=LOADTEST_TITLE).delete()
+        # اگر آزمون از مرز یک بازه گذشته باشد، ردیف روند پایه دارد و خودش حذف نمی‌شود
+        TermTrend.objects.filter(kind=TermTrend.TAG, term=LOADTEST_TITLE).delete()
+        page.delete()
+
+        self.stdout.write('writes: %.0f/s (%d writers)' % (sum(results['write']) / elapsed, options['writers']))
+        self.stdout.write('reads:  %.0f/s (%d readers)' % (sum(results['read']) / elapsed, options['readers']))
+        for error in set(results['errors']):
+            self.stderr.write('error: %s' % error)
+
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from stories import media
+from stories.models import StoryModel
+
+
+class Command(BaseCommand):
+    help = 'Fill the media_* columns of stories uploaded before they existed (or --all).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true')
+
+    def handle(self, *args, **options):
+        queryset = StoryModel.objects.exclude(story='').order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(media_size__isnull=True)
+
+        filled = failed = 0
+        for story in queryset.only('id', 'story').iterator(chunk_size=500):
+            try:
+                info = media.fill(story)
+            except (media.UnsupportedMedia, OSError) as exc:
+                failed += 1
+                self.stderr.write('%d: %s' % (story.pk, exc))
+                continue
+            StoryModel.objects.filter(pk=story.pk).update(**media.columns(info))
+            filled += 1
+        self.stdout.write('%d stories filled, %d failed' % (filled, failed))
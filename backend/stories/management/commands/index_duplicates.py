@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from stories import dedup
+from stories.models import StoryModel
+
+
+class Command(BaseCommand):
+    help = 'Compute image/text hashes and duplicate links for stories that have none (or --all).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true')
+
+    def handle(self, *args, **options):
+        queryset = StoryModel.objects.order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(image_hash__isnull=True, text_hash__isnull=True)
+
+        indexed = duplicates = 0
+        for story in queryset.iterator(chunk_size=500):
+            dedup.index_story(story)
+            indexed += 1
+            duplicates += story.duplicate_of_id is not None
+        self.stdout.write('%d stories indexed, %d near-duplicates' % (indexed, duplicates))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from stories import uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads (and their stored chunks) idle for longer than UPLOADS["SESSION_TTL"].'
+
+    def handle(self, *args, **options):
+        purged = 0
+        for session in uploads.expired_sessions().iterator():
+            uploads.discard(session)
+            purged += 1
+        self.stdout.write('%d upload sessions purged' % purged)
@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from stories import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the StoryDailyCount rollup (optionally only --start/--end days, YYYY-MM-DD).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat)
+        parser.add_argument('--end', type=date.fromisoformat)
+
+    def handle(self, *args, **options):
+        rollups.rebuild(options['start'], options['end'])
+        self.stdout.write('rollup rebuilt')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from stories import trends
+
+
+class Command(BaseCommand):
+    help = 'Recompute the tag/topic burst state (TermTrend) by replaying all stories.'
+
+    def handle(self, *args, **options):
+        terms = trends.rebuild()
+        self.stdout.write('%d terms rebuilt' % terms)
@@ -0,0 +1,67 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, DatabaseError
+
+from stories import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOBS['WORKERS'])
+        parser.add_argument('--pool', choices=['thread', 'process'], default=settings.JOBS['POOL'])
+        parser.add_argument('--once', action='store_true', help='Drain the due jobs and exit.')
+
+    def handle(self, *args, **options):
+        jobs.autodiscover()
+        workers = options['workers']
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        if options['pool'] == 'process':
+            # پروسه‌ها با spawn ساخته می‌شوند تا اتصال دیتابیس والد را به ارث نبرند
+            connections.close_all()
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=django.setup)
+        else:
+            executor = ThreadPoolExecutor(workers)
+
+        self.stdout.write('%s: %d %s workers, jobs: %s' % (
+            jobs.worker_name(), workers, options['pool'], ', '.join(sorted(jobs.registry)) or '-'))
+        running = set()
+        last_requeue = 0
+        with executor:
+            while not self.stopping:
+                if time.monotonic() - last_requeue > 60:
+                    try:
+                        jobs.requeue_stale()
+                    except DatabaseError as error:
+                        self.stderr.write('requeue failed: %r' % error)
+                    last_requeue = time.monotonic()
+
+                free = workers - len(running)
+                claimed = jobs.claim(free) if free else []
+                running.update(executor.submit(jobs.run_job, job_id) for job_id in claimed)
+
+                if options['once'] and not claimed and not running:
+                    break
+                if running:
+                    done, running = wait(running, timeout=settings.JOBS['POLL_INTERVAL'],
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.exception() is not None:
+                            self.stderr.write('worker error: %r' % future.exception())
+                elif not claimed:
+                    time.sleep(settings.JOBS['POLL_INTERVAL'])
+
+    def stop(self, *args):
+        self.stdout.write('stopping after running jobs finish...')
+        self.stopping = True
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# در یک پروسه تازه اجرا می‌شود: زمان و حافظه تا آماده شدن worker
+PROBE = '''
+import json, os, resource, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Config.settings')
+if %(django)r:
+    import importlib
+    importlib.import_module(%(module)r)
+rss = None
+try:
+    with open('/proc/self/status') as status:
+        rss = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+except OSError:
+    # macOS: ru_maxrss بایت است، لینوکس کیلوبایت
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+print(json.dumps({'seconds': time.perf_counter() - start, 'rss_kb': rss, 'modules': len(sys.modules)}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Import-time report and RSS baseline of a freshly started worker.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=settings.WSGI_APPLICATION.rsplit('.', 1)[0],
+                            help='module a worker imports (default: the WSGI module)')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--no-preload', action='store_true', help='run with STARTUP_PRELOAD=0')
+
+    def probe(self, options, django=True, importtime=False):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'Config.settings'))
+        if options['no_preload']:
+            env['STARTUP_PRELOAD'] = '0'
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else [])
+        command += ['-c', PROBE % {'django': django, 'module': options['module']}]
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True)
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        bare, _ = self.probe(options, django=False)
+        worker, _ = self.probe(options)
+        _, report = self.probe(options, importtime=True)
+
+        # خروجی -X importtime: self | cumulative | name (میکروثانیه)
+        by_package = defaultdict(int)
+        first_party = []
+        for line in report.splitlines():
+            if not line.startswith('import time:') or '|' not in line or 'self [us]' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            by_package[name.strip().split('.')[0]] += int(own)
+            if name.strip().split('.')[0] in ('stories', 'Config'):
+                first_party.append((int(cumulative), name.strip()))
+
+        self.stdout.write('%s: %.0f ms, %d modules, RSS %.1f MB (interpreter alone %.1f MB)' % (
+            options['module'], worker['seconds'] * 1000, worker['modules'],
+            worker['rss_kb'] / 1024, bare['rss_kb'] / 1024))
+        self.stdout.write('\nimport time by package (self time):')
+        for package, micros in sorted(by_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write('  %8.1f ms  %s' % (micros / 1000, package))
+        self.stdout.write('\nproject modules (cumulative, includes what they import):')
+        for micros, name in sorted(first_party, reverse=True)[:options['top']]:
+            self.stdout.write('  %8.1f ms  %s' % (micros / 1000, name))
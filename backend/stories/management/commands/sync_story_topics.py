@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stories import denormalize, rollups
+from stories.conditional import bump_versions
+from stories.models import StoryModel
+
+
+class Command(BaseCommand):
+    help = 'Verify (and with --repair fix) StoryModel.topic/sub_topic against the page of each story.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true')
+        parser.add_argument('--all', action='store_true', help='Rewrite every story, not only drifted ones.')
+        parser.add_argument('--batch-size', type=int, default=denormalize.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        drifted = denormalize.drifted()
+        count = drifted.count()
+        self.stdout.write('%d stories out of sync with their page' % count)
+        if not options['repair']:
+            if count:
+                raise CommandError('topic drift found, run with --repair')
+            return
+
+        queryset = None if options['all'] else drifted
+        updated = denormalize.sync(queryset, options['batch_size'],
+                                   progress=lambda done, total: self.stdout.write('  %d/%d' % (done, total)))
+        if updated:
+            rollups.rebuild()
+            bump_versions(StoryModel)
+        self.stdout.write('%d stories updated' % updated)
@@ -0,0 +1,222 @@
+"""
+Story media inspection at upload time.
+
+Only file headers are read: the container is sniffed from its magic bytes,
+images are opened lazily with Pillow (no pixel decoding) and MP4/MOV
+durations and dimensions come from the ``moov`` box, seeking over ``mdat``.
+"""
+import struct
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import StoryType
+
+MediaInfo = namedtuple('MediaInfo', 'story_type mime width height duration size')
+
+
+class UnsupportedMedia(ValueError):
+    pass
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'حجم فایل بیش از حد مجاز است'
+    default_code = 'upload_too_large'
+
+
+def sniff(head):
+    """MIME type from the first bytes of a file, or None."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp':
+        return 'video/quicktime' if head[8:10] == b'qt' else 'video/mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video/webm'
+    return None
+
+
+def inspect(fileobj):
+    """
+    MediaInfo for an uploaded (or stored) file. Raises UnsupportedMedia for
+    unknown formats and for files over the MEDIA_LIMITS of their type.
+    """
+    limits = settings.MEDIA_LIMITS
+    size = getattr(fileobj, 'size', None)
+    if size is None:
+        fileobj.seek(0, 2)
+        size = fileobj.tell()
+
+    fileobj.seek(0)
+    mime = sniff(fileobj.read(16))
+    fileobj.seek(0)
+    if mime is None:
+        raise UnsupportedMedia('فرمت فایل پشتیبانی نمی‌شود')
+
+    try:
+        if mime.startswith('image/'):
+            if size > limits['IMAGE_MAX_SIZE']:
+                raise UnsupportedMedia('حجم تصویر بیش از حد مجاز است')
+            width, height = _image_size(fileobj)
+            if width * height > limits['IMAGE_MAX_PIXELS']:
+                raise UnsupportedMedia('ابعاد تصویر بیش از حد مجاز است')
+            return MediaInfo(StoryType.Image, mime, width, height, None, size)
+
+        if size > limits['VIDEO_MAX_SIZE']:
+            raise UnsupportedMedia('حجم ویدئو بیش از حد مجاز است')
+        width = height = duration = None
+        if mime in ('video/mp4', 'video/quicktime'):
+            width, height, duration = _mp4_info(fileobj, size)
+            if duration is not None and duration > limits['VIDEO_MAX_DURATION']:
+                raise UnsupportedMedia('مدت ویدئو بیش از حد مجاز است')
+        return MediaInfo(StoryType.Video, mime, width, height, duration, size)
+    finally:
+        fileobj.seek(0)
+
+
+def columns(info):
+    """The media_* column values of a MediaInfo."""
+    return {
+        'media_mime': info.mime,
+        'media_width': info.width,
+        'media_height': info.height,
+        'media_duration': info.duration,
+        'media_size': info.size,
+    }
+
+
+def apply(story, info):
+    for field, value in columns(info).items():
+        setattr(story, field, value)
+
+
+def fill(story):
+    """
+    Inspect ``story.story`` and fill its media_* columns. The serializer
+    leaves its MediaInfo on the uploaded file, so uploads are read only once.
+    """
+    info = None
+    if not story.story._committed:
+        info = getattr(story.story.file, 'media_info', None)
+    if info is None:
+        with story.story.open('rb') as fileobj:
+            info = inspect(fileobj)
+    apply(story, info)
+    return info
+
+
+def _image_size(fileobj):
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        # Image.open فقط هدر را می‌خواند؛ load() صدا زده نمی‌شود
+        with Image.open(fileobj) as image:
+            return image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        raise UnsupportedMedia('فایل تصویر معتبر نیست') from exc
+
+
+def _boxes(fileobj, start, end):
+    """(type, payload start, box end) of the ISO-BMFF boxes in [start, end)."""
+    position = start
+    while position + 8 <= end:
+        fileobj.seek(position)
+        header = fileobj.read(8)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack('>I4s', header)
+        payload = position + 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', fileobj.read(8))[0]
+            payload += 8
+        elif box_size == 0:
+            box_size = end - position
+        if box_size < payload - position:
+            return
+        yield box_type, payload, position + box_size
+        position += box_size
+
+
+def _mp4_info(fileobj, size):
+    width = height = duration = None
+    for box_type, payload, end in _boxes(fileobj, 0, size):
+        if box_type != b'moov':
+            continue
+        for child_type, child_payload, child_end in _boxes(fileobj, payload, end):
+            if child_type == b'mvhd':
+                fileobj.seek(child_payload)
+                version = fileobj.read(4)[0]
+                if version == 1:
+                    fileobj.seek(16, 1)
+                    timescale, length = struct.unpack('>IQ', fileobj.read(12))
+                else:
+                    fileobj.seek(8, 1)
+                    timescale, length = struct.unpack('>II', fileobj.read(8))
+                if timescale:
+                    duration = round(length / timescale, 3)
+            elif child_type == b'trak' and not width:
+                width, height = _track_size(fileobj, child_payload, child_end)
+        break
+    return width, height, duration
+
+
+def _track_size(fileobj, start, end):
+    for box_type, payload, _ in _boxes(fileobj, start, end):
+        if box_type == b'tkhd':
+            fileobj.seek(payload)
+            version = fileobj.read(4)[0]
+            # creation/modification/track id/reserved/duration, reserved, layer..matrix
+            fileobj.seek((32 if version == 1 else 20) + 8 + 8 + 36, 1)
+            width, height = struct.unpack('>II', fileobj.read(8))
+            return width >> 16, height >> 16
+    return None, None
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Aborts an upload as soon as a file grows past the size limit of its
+    type, before it is buffered in full. The type is sniffed from the first
+    chunk, falling back to the declared content type; a file that is
+    neither an image nor a video gets the largest limit.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limit = None
+        self.received = 0
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.limit = None
+        self.received = 0
+
+    def _limit(self, head):
+        limits = settings.MEDIA_LIMITS
+        kind = (sniff(head) or self.content_type or '').split('/')[0]
+        if kind == 'image':
+            return limits['IMAGE_MAX_SIZE']
+        if kind == 'video':
+            return limits['VIDEO_MAX_SIZE']
+        return max(limits['IMAGE_MAX_SIZE'], limits['VIDEO_MAX_SIZE'])
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.limit is None:
+            self.limit = self._limit(raw_data[:16])
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            if self.request is not None:
+                self.request.story_upload_rejected = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
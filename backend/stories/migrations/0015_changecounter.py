@@ -0,0 +1,26 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0014_instagrampage_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='مدل')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='نسخه')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخرین تغییر')),
+            ],
+            options={
+                'verbose_name': 'شمارنده تغییرات',
+                'verbose_name_plural': 'شمارنده\u200cهای تغییرات',
+            },
+        ),
+    ]
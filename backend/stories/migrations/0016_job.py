@@ -0,0 +1,44 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0015_changecounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='کار')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='پارامترها')),
+                ('dedup_key', models.CharField(blank=True, default='', max_length=64, verbose_name='کلید یکتا')),
+                ('status', models.CharField(choices=[('pending', 'در صف'), ('running', 'در حال اجرا'), ('done', 'انجام شده'), ('failed', 'ناموفق')], default='pending', max_length=10, verbose_name='وضعیت')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='اولویت')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='تلاش\u200cها')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='حداکثر تلاش')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='زمان اجرا')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان شروع')),
+                ('locked_by', models.CharField(blank=True, default='', max_length=100, verbose_name='ورکر')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='پیشرفت (درصد)')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='آخرین خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ پایان')),
+            ],
+            options={
+                'verbose_name': 'کار پس\u200cزمینه',
+                'verbose_name_plural': 'کارهای پس\u200cزمینه',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'priority', 'run_at'], name='job_queue_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending'), models.Q(('dedup_key', ''), _negated=True)), fields=('dedup_key',), name='job_pending_dedup'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:22
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_story_daily_count(apps, schema_editor):
+    StoryModel = apps.get_model('stories', 'StoryModel')
+    StoryDailyCount = apps.get_model('stories', 'StoryDailyCount')
+    rows = (StoryModel.objects
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'page__topic_id', 'page__sub_topic_id', 'category_id')
+            .annotate(story_count=Count('id'))
+            .order_by())
+    StoryDailyCount.objects.bulk_create(
+        StoryDailyCount(
+            day=row['day'],
+            topic_id=row['page__topic_id'] or 0,
+            sub_topic_id=row['page__sub_topic_id'] or 0,
+            category_id=row['category_id'] or 0,
+            story_count=row['story_count'],
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0016_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='روز')),
+                ('topic_id', models.PositiveBigIntegerField(default=0, verbose_name='موضوع')),
+                ('sub_topic_id', models.PositiveBigIntegerField(default=0, verbose_name='زیرموضوع')),
+                ('category_id', models.PositiveBigIntegerField(default=0, verbose_name='دسته')),
+                ('story_count', models.IntegerField(default=0, verbose_name='تعداد استوری')),
+            ],
+            options={
+                'verbose_name': 'آمار روزانه استوری',
+                'verbose_name_plural': 'آمار روزانه استوری',
+                'indexes': [models.Index(fields=['topic_id', 'day'], name='story_daily_topic_idx'), models.Index(fields=['category_id', 'day'], name='story_daily_category_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='storydailycount',
+            constraint=models.UniqueConstraint(fields=('day', 'topic_id', 'sub_topic_id', 'category_id'), name='story_daily_count_key'),
+        ),
+        migrations.RunPython(backfill_story_daily_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:23
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_story_topics(apps, schema_editor):
+    StoryModel = apps.get_model('stories', 'StoryModel')
+    InstagramPage = apps.get_model('stories', 'InstagramPage')
+    pages = InstagramPage.objects.filter(id=OuterRef('page_id'))
+    ids = list(StoryModel.objects.filter(page__isnull=False).order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), 5000):
+        StoryModel.objects.filter(id__in=ids[start:start + 5000]).update(
+            topic_id=Subquery(pages.values('topic_id')[:1]),
+            sub_topic_id=Subquery(pages.values('sub_topic_id')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0017_storydailycount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storymodel',
+            name='sub_topic',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='stories.subtopic', verbose_name='زیرموضوع'),
+        ),
+        migrations.AddField(
+            model_name='storymodel',
+            name='topic',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='stories.topic', verbose_name='موضوع'),
+        ),
+        migrations.AddIndex(
+            model_name='storymodel',
+            index=models.Index(fields=['topic', 'created_at'], name='story_topic_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storymodel',
+            index=models.Index(fields=['sub_topic', 'created_at'], name='story_sub_topic_created_idx'),
+        ),
+        migrations.RunPython(backfill_story_topics, migrations.RunPython.noop),
+    ]
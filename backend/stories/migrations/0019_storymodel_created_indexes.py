@@ -0,0 +1,21 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0018_storymodel_topic'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='storymodel',
+            index=models.Index(fields=['created_at'], name='story_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storymodel',
+            index=models.Index(fields=['category', 'created_at'], name='story_category_created_idx'),
+        ),
+    ]
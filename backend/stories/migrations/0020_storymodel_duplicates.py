@@ -0,0 +1,44 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0019_storymodel_created_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storymodel',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='stories.storymodel', verbose_name='تکرار استوری'),
+        ),
+        migrations.AddField(
+            model_name='storymodel',
+            name='image_hash',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='هش تصویر'),
+        ),
+        migrations.AddField(
+            model_name='storymodel',
+            name='text_hash',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='هش متن'),
+        ),
+        migrations.CreateModel(
+            name='StoryHashBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('i', 'تصویر'), ('t', 'متن')], max_length=1, verbose_name='نوع')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='باند')),
+                ('value', models.IntegerField(verbose_name='مقدار')),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hash_bands', to='stories.storymodel', verbose_name='استوری')),
+            ],
+            options={
+                'verbose_name': 'باند هش استوری',
+                'verbose_name_plural': 'باندهای هش استوری',
+                'indexes': [models.Index(fields=['kind', 'band', 'value'], name='story_hash_band_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0020_storymodel_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storymodel',
+            name='media_duration',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='مدت (ثانیه)'),
+        ),
+        migrations.AddField(
+            model_name='storymodel',
+            name='media_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='ارتفاع'),
+        ),
+        migrations.AddField(
+            model_name='storymodel',
+            name='media_mime',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50, verbose_name='نوع فایل'),
+        ),
+        migrations.AddField(
+            model_name='storymodel',
+            name='media_size',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='حجم (بایت)'),
+        ),
+        migrations.AddField(
+            model_name='storymodel',
+            name='media_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='عرض'),
+        ),
+    ]
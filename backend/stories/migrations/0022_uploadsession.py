@@ -0,0 +1,53 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0021_storymodel_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='نام فایل')),
+                ('size', models.PositiveBigIntegerField(verbose_name='حجم (بایت)')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='اندازه هر تکه')),
+                ('sha256', models.CharField(blank=True, default='', max_length=64, verbose_name='چکسام کل فایل')),
+                ('status', models.CharField(choices=[('open', 'در حال آپلود'), ('finalizing', 'در حال تکمیل'), ('done', 'تکمیل شده')], default='open', max_length=10, verbose_name='وضعیت')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='تاریخ ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخرین تغییر')),
+                ('story', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='stories.storymodel', verbose_name='استوری')),
+            ],
+            options={
+                'verbose_name': 'آپلود تکه\u200cای',
+                'verbose_name_plural': 'آپلودهای تکه\u200cای',
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='شماره تکه')),
+                ('size', models.PositiveIntegerField(verbose_name='حجم (بایت)')),
+                ('sha256', models.CharField(max_length=64, verbose_name='چکسام')),
+                ('name', models.CharField(max_length=255, verbose_name='فایل')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='stories.uploadsession', verbose_name='آپلود')),
+            ],
+            options={
+                'verbose_name': 'تکه آپلود',
+                'verbose_name_plural': 'تکه\u200cهای آپلود',
+                'ordering': ['index'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='uploadchunk',
+            constraint=models.UniqueConstraint(fields=('session', 'index'), name='upload_chunk_index'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0022_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('g', 'تگ'), ('t', 'موضوع')], max_length=1, verbose_name='نوع')),
+                ('term', models.CharField(max_length=100, verbose_name='عبارت')),
+                ('bucket', models.DateTimeField(verbose_name='بازه جاری')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='تعداد در بازه جاری')),
+                ('mean', models.FloatField(default=0, verbose_name='میانگین پایه')),
+                ('variance', models.FloatField(default=0, verbose_name='واریانس پایه')),
+                ('score', models.FloatField(default=0, verbose_name='امتیاز z')),
+            ],
+            options={
+                'verbose_name': 'روند',
+                'verbose_name_plural': 'روندها',
+                'indexes': [models.Index(fields=['kind', 'bucket', '-score'], name='term_trend_rank_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='termtrend',
+            constraint=models.UniqueConstraint(fields=('kind', 'term'), name='term_trend_key'),
+        ),
+    ]
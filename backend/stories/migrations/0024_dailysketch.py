@@ -0,0 +1,39 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0023_termtrend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('d', 'روز'), ('m', 'ماه')], default='d', max_length=1, verbose_name='بازه')),
+                ('day', models.DateField(verbose_name='روز شروع')),
+                ('story_count', models.PositiveIntegerField(default=0, verbose_name='تعداد استوری')),
+                ('tag_total', models.PositiveIntegerField(default=0, verbose_name='تعداد کل تگ\u200cها')),
+                ('tag_cms', models.BinaryField(verbose_name='Count-Min تگ\u200cها')),
+                ('tag_top', models.JSONField(default=list, verbose_name='تگ\u200cهای پرتکرار')),
+                ('tag_hll', models.BinaryField(verbose_name='HyperLogLog تگ\u200cها')),
+                ('word_total', models.PositiveIntegerField(default=0, verbose_name='تعداد کل واژه\u200cها')),
+                ('word_cms', models.BinaryField(verbose_name='Count-Min واژه\u200cها')),
+                ('word_top', models.JSONField(default=list, verbose_name='واژه\u200cهای پرتکرار')),
+                ('page_hll', models.BinaryField(verbose_name='HyperLogLog صفحه\u200cها')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='زمان ساخت')),
+            ],
+            options={
+                'verbose_name': 'خلاصه روزانه',
+                'verbose_name_plural': 'خلاصه\u200cهای روزانه',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysketch',
+            constraint=models.UniqueConstraint(fields=('period', 'day'), name='daily_sketch_key'),
+        ),
+    ]
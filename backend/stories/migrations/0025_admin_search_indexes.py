@@ -0,0 +1,29 @@
+# Generated by Django 4.2.21 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0024_dailysketch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='instagrampage',
+            index=models.Index(fields=['-followers_count', '-id'], name='page_followers_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instagrampage',
+            index=models.Index(fields=['page'], name='page_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='instagrampage',
+            index=models.Index(fields=['username'], name='page_username_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='storymodel',
+            index=models.Index(fields=['title'], name='story_title_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.21 on 2026-10-19 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stories', '0025_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(blank=True, db_index=True, default='', max_length=255, verbose_name='شناسه توکن')),
+                ('user_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='کاربر')),
+                ('revoked_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='زمان ابطال')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='زمان انقضا')),
+            ],
+            options={
+                'verbose_name': 'توکن باطل شده',
+                'verbose_name_plural': 'توکن\u200cهای باطل شده',
+            },
+        ),
+        migrations.CreateModel(
+            name='AccessProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('viewer', 'بیننده'), ('editor', 'ویرایشگر'), ('admin', 'مدیر')], default='viewer', max_length=10, verbose_name='نقش')),
+                ('categories', models.ManyToManyField(blank=True, to='stories.category', verbose_name='دسته\u200cهای مجاز')),
+                ('topics', models.ManyToManyField(blank=True, to='stories.topic', verbose_name='موضوع\u200cهای مجاز')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='access_profile', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'سطح دسترسی',
+                'verbose_name_plural': 'سطوح دسترسی',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# جستجوی زیررشته‌ای ادمین (icontains یعنی UPPER(col::text) LIKE UPPER('%x%') در PostgreSQL)؛
+# ایندکس trigram روی همان عبارت. SQLite ایندکس مناسبی ندارد و جدول را می‌پیماید.
+INDEXES = (
+    ('story_description_trgm_idx', 'stories_storymodel', 'description'),
+    ('page_bio_trgm_idx', 'stories_instagrampage', 'bio'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in INDEXES:
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS %s ON %s USING gin ((UPPER(%s::text)) gin_trgm_ops)'
+                              % (name, table, column))
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0026_access_profile'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
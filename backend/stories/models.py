@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.db import models
 from django_jalali.db import models as jmodels
 from collections import Counter
 from django.core.validators import MinLengthValidator
 import jdatetime
+import uuid
 from django.utils import timezone
 
+from .tokenizer import tokenize_all
+
 GENDER_CHOICES = [
     ('male', 'آقا'),
     ('female', 'خانم'),
@@ -163,6 +167,13 @@ class InstagramPage(models.Model):
         verbose_name = 'صفحه اینستاگرام'
         verbose_name_plural = 'صفحات اینستاگرام'
         ordering = ['-followers_count']
+        indexes = [
+            # ترتیب پیش‌فرض changelist ادمین (-followers_count و سپس -pk)؛ هر صفحه با یک index scan
+            models.Index(fields=['-followers_count', '-id'], name='page_followers_idx'),
+            # جستجوی پیشوندی ادمین (LIKE 'x%')؛ opclasses فقط روی PostgreSQL اثر دارد
+            models.Index(fields=['page'], name='page_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['username'], name='page_username_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"{self.page} (@{self.username})"
@@ -173,8 +184,12 @@ class StoryModel(models.Model):
     page = models.ForeignKey(InstagramPage, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='صفحه')
     # page = models.CharField(max_length=20, verbose_name='کاربر')
     story = models.FileField(upload_to='images/', verbose_name='استوری')
-    # topic = models.ForeignKey(Topic, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='موضوع', related_name='storymodel')
-    # sub_topic = models.ForeignKey(SubTopic, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='زیرموضوع')
+    # موضوع و زیرموضوع از صفحه کپی می‌شوند (denormalised) تا فیلترها بدون join روی صفحه اجرا شوند.
+    # stories.signals keeps them in sync, 'manage.py sync_story_topics' repairs drift.
+    topic = models.ForeignKey(Topic, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                              verbose_name='موضوع', related_name='+')
+    sub_topic = models.ForeignKey(SubTopic, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                  verbose_name='زیرموضوع', related_name='+')
     feeling = models.CharField(max_length=20, choices=Feeling.choices, verbose_name='احساس')
     ironic = models.CharField(max_length=10, choices=Ironic.choices, verbose_name='رویکرد')
     tone = models.CharField(max_length=20, choices=Tone.choices, verbose_name='لحن')
@@ -183,6 +198,28 @@ class StoryModel(models.Model):
     story_type = models.CharField(max_length=20, choices=StoryType.choices, verbose_name='جنس استوری')
     created_at = jmodels.jDateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='دسته')
+    # مشخصات فایل که هنگام آپلود فقط از هدر خوانده می‌شود؛ stories.media
+    media_mime = models.CharField(max_length=50, blank=True, default='', editable=False, verbose_name='نوع فایل')
+    media_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='عرض')
+    media_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='ارتفاع')
+    media_duration = models.FloatField(null=True, blank=True, editable=False, db_index=True,
+                                       verbose_name='مدت (ثانیه)')
+    media_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False, db_index=True,
+                                                verbose_name='حجم (بایت)')
+    # امضای تصویر (dHash) و متن (SimHash) برای تشخیص استوری‌های تکراری؛ stories.dedup
+    image_hash = models.BigIntegerField(null=True, blank=True, editable=False, db_index=True,
+                                        verbose_name='هش تصویر')
+    text_hash = models.BigIntegerField(null=True, blank=True, editable=False, db_index=True,
+                                       verbose_name='هش متن')
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                     related_name='duplicates', verbose_name='تکرار استوری')
+
+    @staticmethod
+    def get_tags(title):
+        # تگ‌های یک عنوان (جدا شده با ویرگول فارسی)
+        if not title:
+            return []
+        return [tag.strip() for tag in title.split('،') if tag.strip()]
 
     @classmethod
     def get_top_tags_from_queryset(cls, queryset, limit=20):
@@ -191,8 +228,7 @@ class StoryModel(models.Model):
 
         tags = []
         for title in titles:
-            if title:
-                tags.extend([tag.strip() for tag in title.split('،') if tag.strip()])
+            tags.extend(cls.get_tags(title))
 
         tag_counter = Counter(tags)
         top_tags = tag_counter.most_common(limit)
@@ -201,15 +237,9 @@ class StoryModel(models.Model):
 
     @classmethod
     def get_text_from_queryset(cls, queryset, limit=20):
-        # استخراج تگ‌ها از عنوان‌های کوئری‌ست فیلتر شده
+        # پرتکرارترین واژه‌های متن استوری‌ها (نرمال‌شده، بدون ایست‌واژه)
         texts = queryset.values_list('story_text', flat=True)
-
-        tags = []
-        for title in texts:
-            if title:
-                tags.extend([tag.strip() for tag in title.split(' ') if tag.strip()])
-
-        tag_counter = Counter(tags)
+        tag_counter = Counter(tokenize_all(texts.iterator()))
         top_tags = tag_counter.most_common(limit)
 
         return [{'name': tag, 'weight': count} for tag, count in top_tags]
@@ -217,11 +247,39 @@ class StoryModel(models.Model):
     class Meta:
         verbose_name = 'صفحه استوری'
         verbose_name_plural = 'صفحات استوری'
+        indexes = [
+            models.Index(fields=['created_at'], name='story_created_idx'),
+            models.Index(fields=['category', 'created_at'], name='story_category_created_idx'),
+            models.Index(fields=['topic', 'created_at'], name='story_topic_created_idx'),
+            models.Index(fields=['sub_topic', 'created_at'], name='story_sub_topic_created_idx'),
+            models.Index(fields=['title'], name='story_title_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class StoryHashBand(models.Model):
+    """
+    LSH bands of a story's image/text hash: the 64-bit hash is split into
+    16-bit bands, near-duplicates share at least one band.
+    """
+    IMAGE = 'i'
+    TEXT = 't'
+
+    story = models.ForeignKey(StoryModel, on_delete=models.CASCADE, related_name='hash_bands', verbose_name='استوری')
+    kind = models.CharField(max_length=1, choices=[(IMAGE, 'تصویر'), (TEXT, 'متن')], verbose_name='نوع')
+    band = models.PositiveSmallIntegerField(verbose_name='باند')
+    value = models.IntegerField(verbose_name='مقدار')
+
+    class Meta:
+        verbose_name = 'باند هش استوری'
+        verbose_name_plural = 'باندهای هش استوری'
+        indexes = [
+            models.Index(fields=['kind', 'band', 'value'], name='story_hash_band_idx'),
+        ]
+
+
 class DayAnalysis(models.Model):
     text = models.TextField(verbose_name="متن")
     jalali_date = models.DateField(verbose_name="تاریخ جلالی", default=timezone.now)
@@ -241,3 +299,264 @@ class DayAnalysis(models.Model):
     class Meta:
         verbose_name = "تحلیل"
         verbose_name_plural = "تحلیل"
+
+
+class ChangeCounter(models.Model):
+    """
+    Per-model change counter, bumped on every save/delete.
+    Used to build cheap HTTP validators (ETag) and cache keys; a model's
+    version is the sum of its shard rows (see conditional.bump_versions).
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name='مدل')
+    version = models.PositiveBigIntegerField(default=0, verbose_name='نسخه')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='آخرین تغییر')
+
+    class Meta:
+        verbose_name = 'شمارنده تغییرات'
+        verbose_name_plural = 'شمارنده‌های تغییرات'
+
+    def __str__(self):
+        return f"{self.name} ({self.version})"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, picked up by ``manage.py run_jobs``.
+    See stories.jobs for scheduling and the worker loop.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'در صف'),
+        (RUNNING, 'در حال اجرا'),
+        (DONE, 'انجام شده'),
+        (FAILED, 'ناموفق'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name='کار')
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name='پارامترها')
+    dedup_key = models.CharField(max_length=64, blank=True, default='', verbose_name='کلید یکتا')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name='وضعیت')
+    priority = models.SmallIntegerField(default=0, verbose_name='اولویت')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='تلاش‌ها')
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name='حداکثر تلاش')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='زمان اجرا')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='زمان شروع')
+    locked_by = models.CharField(max_length=100, blank=True, default='', verbose_name='ورکر')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='پیشرفت (درصد)')
+    last_error = models.TextField(blank=True, default='', verbose_name='آخرین خطا')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='تاریخ پایان')
+
+    class Meta:
+        verbose_name = 'کار پس‌زمینه'
+        verbose_name_plural = 'کارهای پس‌زمینه'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_at'], name='job_queue_idx'),
+        ]
+        constraints = [
+            # فقط یک کار در صف با پارامترهای یکسان
+            models.UniqueConstraint(fields=['dedup_key'], condition=models.Q(status='pending') & ~models.Q(dedup_key=''),
+                                    name='job_pending_dedup'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+class StoryDailyCount(models.Model):
+    """
+    Rollup of story counts per day, topic, sub-topic and category of the
+    page (0 = none). Maintained by stories.rollups.
+    """
+    day = models.DateField(verbose_name='روز')
+    topic_id = models.PositiveBigIntegerField(default=0, verbose_name='موضوع')
+    sub_topic_id = models.PositiveBigIntegerField(default=0, verbose_name='زیرموضوع')
+    category_id = models.PositiveBigIntegerField(default=0, verbose_name='دسته')
+    story_count = models.IntegerField(default=0, verbose_name='تعداد استوری')
+
+    class Meta:
+        verbose_name = 'آمار روزانه استوری'
+        verbose_name_plural = 'آمار روزانه استوری'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'topic_id', 'sub_topic_id', 'category_id'],
+                                    name='story_daily_count_key'),
+        ]
+        indexes = [
+            models.Index(fields=['topic_id', 'day'], name='story_daily_topic_idx'),
+            models.Index(fields=['category_id', 'day'], name='story_daily_category_idx'),
+        ]
+
+
+class UploadSession(models.Model):
+    """
+    A chunked, resumable upload of a story file. Chunks are written to the
+    storage as they arrive (UploadChunk) and joined into the story file on
+    finalize; see stories.uploads.
+    """
+    OPEN = 'open'
+    FINALIZING = 'finalizing'
+    DONE = 'done'
+    STATUS_CHOICES = [
+        (OPEN, 'در حال آپلود'),
+        (FINALIZING, 'در حال تکمیل'),
+        (DONE, 'تکمیل شده'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255, verbose_name='نام فایل')
+    size = models.PositiveBigIntegerField(verbose_name='حجم (بایت)')
+    chunk_size = models.PositiveIntegerField(verbose_name='اندازه هر تکه')
+    sha256 = models.CharField(max_length=64, blank=True, default='', verbose_name='چکسام کل فایل')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN, verbose_name='وضعیت')
+    story = models.ForeignKey(StoryModel, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                              verbose_name='استوری')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='تاریخ ایجاد')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='آخرین تغییر')
+
+    class Meta:
+        verbose_name = 'آپلود تکه‌ای'
+        verbose_name_plural = 'آپلودهای تکه‌ای'
+
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def expected_size(self, index):
+        if index < self.chunk_count - 1:
+            return self.chunk_size
+        return self.size - self.chunk_size * (self.chunk_count - 1)
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks',
+                                verbose_name='آپلود')
+    index = models.PositiveIntegerField(verbose_name='شماره تکه')
+    size = models.PositiveIntegerField(verbose_name='حجم (بایت)')
+    sha256 = models.CharField(max_length=64, verbose_name='چکسام')
+    # نام فایل تکه در storage
+    name = models.CharField(max_length=255, verbose_name='فایل')
+
+    class Meta:
+        verbose_name = 'تکه آپلود'
+        verbose_name_plural = 'تکه‌های آپلود'
+        ordering = ['index']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'index'], name='upload_chunk_index'),
+        ]
+
+
+class TermTrend(models.Model):
+    """
+    Burst state of a title tag or a topic: its count in the current time
+    bucket and an exponentially weighted mean/variance of earlier buckets.
+    Maintained incrementally by stories.trends.
+    """
+    TAG = 'g'
+    TOPIC = 't'
+    KIND_CHOICES = [(TAG, 'تگ'), (TOPIC, 'موضوع')]
+
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES, verbose_name='نوع')
+    term = models.CharField(max_length=100, verbose_name='عبارت')
+    bucket = models.DateTimeField(verbose_name='بازه جاری')
+    count = models.PositiveIntegerField(default=0, verbose_name='تعداد در بازه جاری')
+    mean = models.FloatField(default=0, verbose_name='میانگین پایه')
+    variance = models.FloatField(default=0, verbose_name='واریانس پایه')
+    score = models.FloatField(default=0, verbose_name='امتیاز z')
+
+    class Meta:
+        verbose_name = 'روند'
+        verbose_name_plural = 'روندها'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'term'], name='term_trend_key'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'bucket', '-score'], name='term_trend_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.score:.1f})"
+
+
+class DailySketch(models.Model):
+    """
+    Mergeable sketches of one finished day (or of a whole finished month,
+    merged from its days): Count-Min Sketches and the top candidates of
+    title tags and text words, HyperLogLogs of distinct tags and pages.
+    Built and merged by stories.sketches.
+    """
+    DAY = 'd'
+    MONTH = 'm'
+    PERIOD_CHOICES = [(DAY, 'روز'), (MONTH, 'ماه')]
+
+    period = models.CharField(max_length=1, choices=PERIOD_CHOICES, default=DAY, verbose_name='بازه')
+    day = models.DateField(verbose_name='روز شروع')
+    story_count = models.PositiveIntegerField(default=0, verbose_name='تعداد استوری')
+    tag_total = models.PositiveIntegerField(default=0, verbose_name='تعداد کل تگ‌ها')
+    tag_cms = models.BinaryField(verbose_name='Count-Min تگ‌ها')
+    tag_top = models.JSONField(default=list, verbose_name='تگ‌های پرتکرار')
+    tag_hll = models.BinaryField(verbose_name='HyperLogLog تگ‌ها')
+    word_total = models.PositiveIntegerField(default=0, verbose_name='تعداد کل واژه‌ها')
+    word_cms = models.BinaryField(verbose_name='Count-Min واژه‌ها')
+    word_top = models.JSONField(default=list, verbose_name='واژه‌های پرتکرار')
+    page_hll = models.BinaryField(verbose_name='HyperLogLog صفحه‌ها')
+    built_at = models.DateTimeField(auto_now=True, verbose_name='زمان ساخت')
+
+    class Meta:
+        verbose_name = 'خلاصه روزانه'
+        verbose_name_plural = 'خلاصه‌های روزانه'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'day'], name='daily_sketch_key'),
+        ]
+
+
+class AccessProfile(models.Model):
+    """
+    API role of a user and the topics/categories they may edit (none = all).
+    Copied into the JWT claims at login and refresh; see stories.auth.
+    """
+    VIEWER = 'viewer'
+    EDITOR = 'editor'
+    ADMIN = 'admin'
+    ROLE_CHOICES = [
+        (VIEWER, 'بیننده'),
+        (EDITOR, 'ویرایشگر'),
+        (ADMIN, 'مدیر'),
+    ]
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='access_profile',
+                                verbose_name='کاربر')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=VIEWER, verbose_name='نقش')
+    topics = models.ManyToManyField(Topic, blank=True, verbose_name='موضوع‌های مجاز')
+    categories = models.ManyToManyField(Category, blank=True, verbose_name='دسته‌های مجاز')
+
+    class Meta:
+        verbose_name = 'سطح دسترسی'
+        verbose_name_plural = 'سطوح دسترسی'
+
+    def __str__(self):
+        return f"{self.user} ({self.get_role_display()})"
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked JWT (by jti), or every token of a user issued before
+    ``revoked_at`` (empty jti). Kept until the tokens would have expired.
+    """
+    jti = models.CharField(max_length=255, blank=True, default='', db_index=True, verbose_name='شناسه توکن')
+    user_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='کاربر')
+    revoked_at = models.DateTimeField(default=timezone.now, verbose_name='زمان ابطال')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='زمان انقضا')
+
+    class Meta:
+        verbose_name = 'توکن باطل شده'
+        verbose_name_plural = 'توکن‌های باطل شده'
+
+    def __str__(self):
+        return self.jti or f"user {self.user_id}"
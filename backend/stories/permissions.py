@@ -0,0 +1,98 @@
+"""
+Role and scope checks from the JWT claims (stories.auth); no database reads.
+
+Reads are public. Writes need the editor role, limited to the topics and
+categories in the claims. Reference data (topics, categories, day
+analyses) needs the admin role.
+"""
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import BasePermission, SAFE_METHODS
+
+from .auth import claims_for
+from .models import AccessProfile, StoryModel, InstagramPage, UploadSession
+
+WRITE_ROLES = (AccessProfile.EDITOR, AccessProfile.ADMIN)
+
+
+def claims(request):
+    """Claims of the request user: from the token, or from the database for session logins."""
+    user = request.user
+    if not user or not user.is_authenticated:
+        return None
+    if hasattr(user, 'token'):
+        return {'role': user.role, 'topics': user.topics, 'categories': user.categories}
+    if not hasattr(request, '_access_claims'):
+        request._access_claims = claims_for(user)
+    return request._access_claims
+
+
+def scope(obj):
+    """(topic_id, category_id) an object belongs to, or None if it has no scope."""
+    if isinstance(obj, (StoryModel, InstagramPage)):
+        return obj.topic_id, obj.category_id
+    if isinstance(obj, UploadSession):
+        return scope(obj.story) if obj.story_id else None
+    return None
+
+
+def allows(user_claims, topic_id, category_id):
+    if user_claims['role'] == AccessProfile.ADMIN:
+        return True
+    topics, categories = user_claims['topics'], user_claims['categories']
+    return ((topics is None or topic_id in topics)
+            and (categories is None or category_id in categories))
+
+
+class EditorOrReadOnly(BasePermission):
+    message = 'دسترسی ویرایش ندارید'
+
+    def has_permission(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        user_claims = claims(request)
+        return user_claims is not None and user_claims['role'] in WRITE_ROLES
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in SAFE_METHODS:
+            return True
+        object_scope = scope(obj)
+        return object_scope is None or allows(claims(request), *object_scope)
+
+
+class AdminOrReadOnly(BasePermission):
+    message = 'فقط مدیر می‌تواند این داده را تغییر دهد'
+
+    def has_permission(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        user_claims = claims(request)
+        return user_claims is not None and user_claims['role'] == AccessProfile.ADMIN
+
+
+def check_write_scope(request, serializer):
+    """
+    Deny a create/update whose resulting object would be out of the user's
+    scope (a story takes its topic from its page).
+    """
+    data = serializer.validated_data
+    instance = serializer.instance
+    page = data.get('page', getattr(instance, 'page', None))
+    if 'topic' in data:
+        topic_id = data['topic'].pk if data['topic'] else None
+    elif isinstance(page, InstagramPage):
+        topic_id = page.topic_id
+    else:
+        topic_id = getattr(instance, 'topic_id', None)
+    category = data.get('category', getattr(instance, 'category', None))
+    if not allows(claims(request), topic_id, category.pk if category else None):
+        raise PermissionDenied('این موضوع یا دسته در محدوده دسترسی شما نیست')
+
+
+class ScopedWriteMixin:
+    def perform_create(self, serializer):
+        check_write_scope(self.request, serializer)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        check_write_scope(self.request, serializer)
+        super().perform_update(serializer)
@@ -0,0 +1,59 @@
+"""
+In-process cache of the reference tables: topics, sub-topics, categories.
+
+The three tables are small and change rarely, so each process loads them
+whole and resolves ids to names from memory; aggregations group by the id
+columns only and never join them. The cache is keyed on the change
+counters of the three models (bumped on every write by stories.signals),
+read on every call: one indexed query, so names are never older than the
+ETag computed from the same counters.
+"""
+import threading
+
+from .conditional import get_versions
+from .models import Topic, SubTopic, Category
+
+MODELS = (Topic, SubTopic, Category)
+
+
+class _Tables:
+    def __init__(self):
+        self.names = {
+            'topic': dict(Topic.objects.values_list('id', 'name')),
+            'sub_topic': dict(SubTopic.objects.values_list('id', 'name')),
+            'category': dict(Category.objects.values_list('id', 'name')),
+        }
+        self.topic_sub_topics = {}
+        links = Topic.sub_topics.through.objects.order_by('subtopic_id').values_list('topic_id', 'subtopic_id')
+        for topic_id, sub_topic_id in links:
+            self.topic_sub_topics.setdefault(topic_id, []).append(
+                {'id': sub_topic_id, 'name': self.names['sub_topic'][sub_topic_id]})
+
+
+class ReferenceData:
+    def __init__(self):
+        self.tables = None
+        self.versions = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        versions = get_versions(MODELS)
+        if self.tables is None or versions != self.versions:
+            with self.lock:
+                if self.tables is None or versions != self.versions:
+                    # نسخه‌ها قبل از جدول‌ها خوانده شده‌اند؛ جدول‌ها دست‌کم به همین تازگی‌اند
+                    self.tables, self.versions = _Tables(), versions
+        return self.tables
+
+
+reference = ReferenceData()
+
+
+def names(kind):
+    """{id: name} of 'topic', 'sub_topic' or 'category'."""
+    return reference.get().names[kind]
+
+
+def sub_topics_of(topic_id):
+    """[{'id', 'name'}] of the sub-topics of ``topic_id``."""
+    return reference.get().topic_sub_topics.get(topic_id, [])
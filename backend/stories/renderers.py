@@ -0,0 +1,49 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson اختیاری است
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer that encodes with orjson when
+    it is installed.
+
+    orjson is only used for the compact, non-ASCII output DRF produces by
+    default; datetimes and anything orjson can't encode natively go through
+    DRF's encoder. Indented output (browsable API, ``; indent=``) and
+    unsupported payloads fall back to the stdlib path.
+
+    The output is the same JSON, but not always the same bytes as
+    ``JSONRenderer``: floats (media_duration, trending baseline/score, the
+    approximate stats bounds) may be spelled differently, e.g. ``1e-7``
+    where ``json`` writes ``1e-07``, and orjson writes NaN/Infinity as
+    ``null`` where DRF would raise.
+    """
+    orjson_options = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if orjson is not None else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.orjson_options)
+        except TypeError:
+            # مثلا کلید غیر رشته‌ای در dict یا عدد خیلی بزرگ
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
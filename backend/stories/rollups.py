@@ -0,0 +1,132 @@
+"""
+Per-day story count rollup (StoryDailyCount).
+
+New and deleted stories adjust their day's counter in place, an edit
+moves its story from the old counter to the new one, and bulk updates and
+page topic changes move their stories between counters with ``shift``.
+``rebuild`` recounts days from StoryModel.
+"""
+from datetime import datetime, time, timedelta
+
+import jdatetime
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import StoryModel, StoryDailyCount
+
+
+def story_day(created_at):
+    """روز (به وقت سرور) یک created_at، همان چیزی که TruncDate برمی‌گرداند."""
+    if isinstance(created_at, jdatetime.datetime):
+        created_at = created_at.togregorian()
+    if timezone.is_aware(created_at):
+        created_at = timezone.localtime(created_at)
+    return created_at.date()
+
+
+def window_start(days):
+    """First day counted by a ``days=N`` window."""
+    return timezone.localdate() - timedelta(days=int(days))
+
+
+def day_bounds(start, end):
+    """Aware [lower, upper) datetimes covering the days start..end (either may be None)."""
+    tz = timezone.get_current_timezone()
+    lower = timezone.make_aware(datetime.combine(start, time.min), tz) if start else None
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz) if end else None
+    return lower, upper
+
+
+def counter_key(created_at, topic_id, sub_topic_id, category_id):
+    """Key of the counter a story with these values is counted in."""
+    return dict(day=story_day(created_at), topic_id=topic_id or 0,
+                sub_topic_id=sub_topic_id or 0, category_id=category_id or 0)
+
+
+def story_key(story):
+    return counter_key(story.created_at, story.topic_id, story.sub_topic_id, story.category_id)
+
+
+def apply_story_delta(story, delta):
+    """Add ``delta`` to the counter of ``story``'s day/topic/sub-topic/category."""
+    _add(story_key(story), delta)
+
+
+def move(old_key, new_key):
+    """Move one story from the counter ``old_key`` to ``new_key``."""
+    if old_key != new_key:
+        _add(old_key, -1)
+        _add(new_key, 1)
+
+
+def shift(queryset, delta):
+    """
+    Add ``delta`` per story of ``queryset`` to the counters of their
+    day/topic/sub-topic/category: one GROUP BY, one UPDATE per counter.
+    Bulk updates call it with -1 before and +1 after changing the stories.
+    """
+    rows = list(queryset
+                .annotate(day=TruncDate('created_at'))
+                .values('day', 'topic_id', 'sub_topic_id', 'category_id')
+                .annotate(story_count=Count('id'))
+                .order_by())
+    for row in rows:
+        _add(dict(day=row['day'], topic_id=row['topic_id'] or 0,
+                  sub_topic_id=row['sub_topic_id'] or 0, category_id=row['category_id'] or 0),
+             delta * row['story_count'])
+
+
+def _add(key, delta):
+    if StoryDailyCount.objects.filter(**key).update(story_count=F('story_count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            StoryDailyCount.objects.create(story_count=delta, **key)
+    except IntegrityError:
+        StoryDailyCount.objects.filter(**key).update(story_count=F('story_count') + delta)
+
+
+@transaction.atomic
+def rebuild(start=None, end=None):
+    """Recompute the rollup for days in [start, end] (both optional)."""
+    lower, upper = day_bounds(start, end)
+    stories = StoryModel.objects.all()
+    existing = StoryDailyCount.objects.all()
+    if lower is not None:
+        stories = stories.filter(created_at__gte=lower)
+        existing = existing.filter(day__gte=start)
+    if upper is not None:
+        stories = stories.filter(created_at__lt=upper)
+        existing = existing.filter(day__lte=end)
+
+    rows = (stories
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'topic_id', 'sub_topic_id', 'category_id')
+            .annotate(story_count=Count('id'))
+            .order_by())
+    existing.delete()
+    StoryDailyCount.objects.bulk_create(
+        StoryDailyCount(
+            day=row['day'],
+            topic_id=row['topic_id'] or 0,
+            sub_topic_id=row['sub_topic_id'] or 0,
+            category_id=row['category_id'] or 0,
+            story_count=row['story_count'],
+        )
+        for row in rows
+    )
+
+
+def story_counts(group_by, days=None, **filters):
+    """
+    {id: story count} grouped by ``topic_id``, ``sub_topic_id`` or
+    ``category_id`` over the last ``days`` days, in one query.
+    """
+    queryset = StoryDailyCount.objects.filter(**filters)
+    if days is not None:
+        queryset = queryset.filter(day__gte=window_start(days))
+    return dict(
+        queryset.values_list(group_by).annotate(total=Sum('story_count')).order_by()
+    )
@@ -0,0 +1,49 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# وضعیت مسیریابی درخواست جاری: None یعنی همه چیز روی primary
+_routing = contextvars.ContextVar('stories_db_routing', default=None)
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Route reads inside the block to one replica, picked on entry so every
+    query of the block sees the same snapshot, until the first write, after
+    which the rest of the block sticks to the primary.
+    """
+    replicas = getattr(settings, 'REPLICA_DATABASES', ())
+    token = _routing.set({'primary': False, 'replica': random.choice(replicas) if replicas else None})
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica of the enclosing ``read_from_replica()`` block
+    (one of ``REPLICA_DATABASES``); writes always go to ``default``.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state['primary'] or state['replica'] is None:
+            return 'default'
+        return state['replica']
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state['primary'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,87 @@
+"""
+Audience segment breakdowns: story volume and feeling/tone mix per page
+gender, political orientation, orientation and location.
+
+All four dimensions come out of one GROUP BY query whose result is cached
+under the change counters of stories and pages.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .conditional import version_key
+from .models import (StoryModel, InstagramPage, GENDER_CHOICES, POLITICAL_ORIENTATION_CHOICES,
+                     ORIENTATION_CHOICES, LOCATION)
+
+SEGMENTS = {
+    'gender': dict(GENDER_CHOICES),
+    'political_orientation': dict(POLITICAL_ORIENTATION_CHOICES),
+    'orientation': dict(ORIENTATION_CHOICES),
+    'location': dict(LOCATION),
+}
+
+UNKNOWN = 'نامشخص'
+
+
+def segment_stats(days=None, topic_id=None, category_id=None):
+    key = 'stories:segments:%s' % version_key((StoryModel, InstagramPage), days, topic_id, category_id,
+                                              window=days is not None)
+    data = cache.get(key)
+    if data is None:
+        data = _compute(days, topic_id, category_id)
+        cache.set(key, data, settings.SEGMENTS_CACHE_TIMEOUT)
+    return data
+
+
+def _compute(days, topic_id, category_id):
+    queryset = StoryModel.objects.all()
+    if days is not None:
+        queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    if topic_id is not None:
+        queryset = queryset.filter(topic_id=topic_id)
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+
+    lookups = ['page__%s' % segment for segment in SEGMENTS]
+    rows = (queryset
+            .values(*lookups, 'feeling', 'tone')
+            .annotate(story_count=Count('id'))
+            .order_by())
+
+    # segment -> value -> {'story_count', 'feeling', 'tone'}
+    def empty():
+        return {'story_count': 0, 'feeling': defaultdict(int), 'tone': defaultdict(int)}
+
+    totals = {segment: defaultdict(empty) for segment in SEGMENTS}
+    for row in rows:
+        count = row['story_count']
+        for segment, lookup in zip(SEGMENTS, lookups):
+            bucket = totals[segment][row[lookup]]
+            bucket['story_count'] += count
+            bucket['feeling'][row['feeling']] += count
+            bucket['tone'][row['tone']] += count
+
+    return {
+        segment: sorted(
+            (
+                {
+                    'segment': value,
+                    'name': SEGMENTS[segment].get(value, UNKNOWN),
+                    'story_count': bucket['story_count'],
+                    'feeling': _pie(bucket['feeling']),
+                    'tone': _pie(bucket['tone']),
+                }
+                for value, bucket in values.items()
+            ),
+            key=lambda item: -item['story_count'],
+        )
+        for segment, values in totals.items()
+    }
+
+
+def _pie(counts):
+    return [{'name': name, 'y': y} for name, y in sorted(counts.items(), key=lambda item: -item[1])]
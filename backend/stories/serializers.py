@@ -1,13 +1,142 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count
 from rest_framework import serializers
-from .models import StoryModel, Topic, SubTopic, InstagramPage, Category, DayAnalysis
+from rest_framework import ISO_8601
+from rest_framework.settings import api_settings
+from . import media, uploads, reference
+from .models import StoryModel, Topic, SubTopic, InstagramPage, Category, DayAnalysis, StoryType, UploadSession
 import jdatetime
 # from django_jalali.templatetags.jalali import jalali_format
 
 
+class FastReadSerializerMixin:
+    """
+    Read-only fast path for high-volume endpoints.
+
+    The field plan (output name, values() lookup, converter) is compiled once
+    per serializer class and rows are built straight from ``values_list()``
+    tuples, so no model instances or per-row field binding are involved.
+    The output is identical to ``Serializer(...).data``.
+
+    ``values_fields`` maps fields that can't be read from a model column
+    (SerializerMethodField, annotations) to ``(lookup, converter)``; the
+    lookup is a values() path or an aggregate expression.
+    """
+    values_fields = {}
+
+    @classmethod
+    def _get_read_plan(cls):
+        # پلن روی خود کلاس کش می‌شود (نه کلاس والد)
+        plan = cls.__dict__.get('_read_plan')
+        if plan is None:
+            plan = []
+            for name, field in cls().fields.items():
+                if field.write_only:
+                    continue
+                if name in cls.values_fields:
+                    lookup, convert = cls.values_fields[name]
+                    plan.append((name, lookup, convert, None))
+                elif isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+                    raise ImproperlyConfigured(
+                        '%s.%s needs an entry in values_fields for the fast read path.' % (cls.__name__, name)
+                    )
+                elif isinstance(field, serializers.RelatedField):
+                    # PrimaryKeyRelatedField: values() already returns the pk
+                    plan.append((name, field.source, None, None))
+                elif isinstance(field, serializers.FileField):
+                    model_field = cls.Meta.model._meta.get_field(field.source)
+                    plan.append((name, field.source, None, (model_field, getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL))))
+                elif isinstance(field, serializers.DateTimeField):
+                    plan.append((name, field.source, _datetime_converter(field), None))
+                else:
+                    plan.append((name, field.source, field.to_representation, None))
+            cls._read_plan = plan
+        return plan
+
+    @classmethod
+    def fast_data(cls, instance):
+        """Serialize a plain mapping (e.g. an aggregated stats dict)."""
+        ret = {}
+        for name, source, convert, _ in cls._get_read_plan():
+            value = instance[source]
+            ret[name] = None if value is None else convert(value)
+        return ret
+
+    @classmethod
+    def values_data(cls, queryset, context=None):
+        """Serialize a queryset with a single values_list() query."""
+        request = (context or {}).get('request')
+        lookups, annotations, rows_plan = [], {}, []
+        for name, lookup, convert, file_info in cls._get_read_plan():
+            if not isinstance(lookup, str):
+                alias = '_%s' % name
+                annotations[alias] = lookup
+                lookup = alias
+            if lookup not in lookups:
+                lookups.append(lookup)
+            if file_info is not None:
+                convert = _file_converter(*file_info, request)
+            rows_plan.append((name, lookups.index(lookup), convert))
+
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+
+        data = []
+        for row in queryset.values_list(*lookups):
+            item = {}
+            for name, index, convert in rows_plan:
+                value = row[index]
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
+
+
+def _file_converter(model_field, use_url, request):
+    # معادل FileField.to_representation بدون ساختن FieldFile برای هر ردیف
+    storage = model_field.storage
+
+    def convert(name):
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    def convert(value):
+        # astimezone() روی jdatetime یک رفت و برگشت کامل به میلادی است؛
+        # وقتی منطقه زمانی از قبل درست است از آن صرف نظر می‌کنیم.
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if isinstance(value, str) or value.tzinfo is not field_timezone:
+            return field.to_representation(value)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return convert
+
+
+def jalali_date_string(value):
+    return value.strftime('%Y-%m-%d')
+
+
 class CategorySerializer(serializers.ModelSerializer):
+    story_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Category
-        fields = ['id', 'name', 'category_image']
+        fields = ['id', 'name', 'category_image', 'story_count']
 
 
 class SubTopicSerializer(serializers.ModelSerializer):
@@ -17,7 +146,8 @@ class SubTopicSerializer(serializers.ModelSerializer):
 
 
 class TopicSerializer(serializers.ModelSerializer):
-    sub_topics = SubTopicSerializer(many=True, read_only=True)
+    # همان خروجی SubTopicSerializer، از کش داده‌های مرجع
+    sub_topics = serializers.SerializerMethodField()
     usage_count = serializers.SerializerMethodField()
     # story_count = serializers.SerializerMethodField()
     story_count = serializers.IntegerField(read_only=True)
@@ -27,7 +157,12 @@ class TopicSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'sub_topics', 'usage_count', 'story_count', 'icon']
 
 
+    def get_sub_topics(self, obj):
+        return reference.sub_topics_of(obj.pk)
+
     def get_usage_count(self, obj):
+        if hasattr(obj, 'page_count'):
+            return obj.page_count
         return obj.instagrampage.count()
 
 
@@ -36,7 +171,7 @@ class TopicSerializer(serializers.ModelSerializer):
 
 
 
-class StoryModelSerializer(serializers.ModelSerializer):
+class StoryModelSerializer(FastReadSerializerMixin, serializers.ModelSerializer):
     jalali_created_at = serializers.SerializerMethodField()
     page_name = serializers.SerializerMethodField()
     # topic = TopicSerializer(read_only=True)
@@ -75,16 +210,46 @@ class StoryModelSerializer(serializers.ModelSerializer):
             'story_text',
             'story_type',
             'page_name',
-            'category_id'
+            'category_id',
+            'media_mime',
+            'media_width',
+            'media_height',
+            'media_duration',
+            'media_size',
         ]
         read_only_fields = ['page']
+        # جنس استوری از خود فایل تشخیص داده می‌شود
+        extra_kwargs = {'story_type': {'required': False}}
+
+    values_fields = {
+        'jalali_created_at': ('created_at', jalali_date_string),
+        'page_name': ('page__username', None),
+    }
 
     def get_jalali_created_at(self, obj):
-        created_at = obj.created_at
-        return created_at.strftime('%Y-%m-%d')
+        return jalali_date_string(obj.created_at)
 
     def get_page_name(self, obj):
-        return obj.page.username
+        return obj.page.username if obj.page_id else None
+
+    def validate_story(self, value):
+        try:
+            # فقط هدر فایل خوانده می‌شود؛ نتیجه برای سیگنال pre_save روی فایل می‌ماند
+            value.media_info = media.inspect(value)
+        except media.UnsupportedMedia as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+    def validate(self, attrs):
+        info = getattr(attrs.get('story'), 'media_info', None)
+        if info is not None:
+            if not attrs.get('story_type'):
+                attrs['story_type'] = info.story_type
+            elif attrs['story_type'] in (StoryType.Image, StoryType.Video) and attrs['story_type'] != info.story_type:
+                raise serializers.ValidationError({'story_type': 'جنس استوری با فایل آپلود شده همخوانی ندارد'})
+        elif self.instance is None and not attrs.get('story_type'):
+            raise serializers.ValidationError({'story_type': 'این فیلد لازم است.'})
+        return attrs
 
     def get_story_url(self, obj):
         if obj.image:
@@ -96,7 +261,44 @@ class StoryModelSerializer(serializers.ModelSerializer):
     #     return super().create(validated_data)
 
 
-class StoryStatsSerializer(serializers.Serializer):
+class ChunkedStorySerializer(StoryModelSerializer):
+    """Story fields sent to finalize a chunked upload; the file is already stored."""
+    story = serializers.FileField(read_only=True)
+
+    def validate(self, attrs):
+        info = self.context['media_info']
+        story_type = attrs.get('story_type')
+        if not story_type:
+            attrs['story_type'] = info.story_type
+        elif story_type in (StoryType.Image, StoryType.Video) and story_type != info.story_type:
+            raise serializers.ValidationError({'story_type': 'جنس استوری با فایل آپلود شده همخوانی ندارد'})
+        return attrs
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+    chunk_count = serializers.IntegerField(read_only=True)
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'sha256', 'chunk_size', 'chunk_count', 'missing_chunks', 'status',
+                  'story', 'created_at']
+        read_only_fields = ['chunk_size', 'status', 'story', 'created_at']
+
+    def get_missing_chunks(self, obj):
+        if obj.status != UploadSession.OPEN:
+            return []
+        return uploads.missing_chunks(obj)
+
+    def create(self, validated_data):
+        try:
+            return uploads.open_session(**validated_data)
+        except uploads.UploadError as exc:
+            raise serializers.ValidationError({'size': str(exc)})
+
+
+class StoryStatsSerializer(FastReadSerializerMixin, serializers.Serializer):
     total_count = serializers.IntegerField()
     page_count = serializers.IntegerField()
     # published_count = serializers.IntegerField()
@@ -115,9 +317,11 @@ class StoryStatsSerializer(serializers.Serializer):
     by_page_bubble = serializers.ListField(child=serializers.DictField())
     by_feeling_tone = serializers.DictField()
     by_feeling_streamgraph = serializers.DictField()
+    # فقط در حالت approximate=true؛ شمارش‌های تقریبی و کران خطا
+    approximate = serializers.DictField(allow_null=True)
 
 
-class InstagramPageSerializer(serializers.ModelSerializer):
+class InstagramPageSerializer(FastReadSerializerMixin, serializers.ModelSerializer):
     # jalali_created_at = serializers.SerializerMethodField()
     # jalali_updated_at = serializers.SerializerMethodField()
     # profile_image_url = serializers.SerializerMethodField()
@@ -133,6 +337,10 @@ class InstagramPageSerializer(serializers.ModelSerializer):
             'is_active', 'created_at','usage_count','category_id'
         ]
 
+    values_fields = {
+        'usage_count': (Count('storymodel'), None),
+    }
+
     # def get_jalali_created_at(self, obj):
     #     return jalali_convert(obj.created_at)
     #
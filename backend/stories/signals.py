@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import rollups, denormalize, media, trends, sketches, events, auth
+from .conditional import bump_versions
+from .jobs import enqueue
+from .models import StoryModel, Topic, SubTopic, InstagramPage, Category, DayAnalysis, AccessProfile
+from .tasks import rebuild_rollups, sync_page_topics, index_story_duplicates
+
+TRACKED_MODELS = (StoryModel, Topic, SubTopic, InstagramPage, Category, DayAnalysis)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_change_counter(sender, **kwargs):
+    if sender in TRACKED_MODELS and not kwargs.get('raw'):
+        bump_versions(sender)
+
+
+@receiver(m2m_changed, sender=Topic.sub_topics.through)
+def bump_topic_sub_topics(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_versions(Topic)
+
+
+@receiver(pre_save, sender=StoryModel)
+def copy_page_topics(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.topic_id, instance.sub_topic_id = denormalize.page_topics(instance.page_id)
+
+
+@receiver(pre_save, sender=StoryModel)
+def extract_media_metadata(sender, instance, raw=False, **kwargs):
+    # فقط برای فایل تازه آپلود شده؛ فایل‌های قبلی با extract_media_metadata پر می‌شوند
+    if raw or not instance.story or instance.story._committed:
+        return
+    try:
+        media.fill(instance)
+    except (media.UnsupportedMedia, OSError):
+        pass
+
+
+@receiver(pre_save, sender=StoryModel)
+def remember_story(sender, instance, raw=False, **kwargs):
+    # مقادیر قبلی ردیف، برای سیگنال‌های post_save ویرایش
+    if raw or instance.pk is None:
+        return
+    instance._previous = (StoryModel.objects.filter(pk=instance.pk)
+                          .values('created_at', 'topic_id', 'sub_topic_id', 'category_id',
+                                  'story', 'story_text', 'story_type').first())
+
+
+@receiver(post_save, sender=StoryModel)
+def update_story_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        rollups.apply_story_delta(instance, 1)
+    else:
+        # صفحه یا دسته ممکن است عوض شده باشد؛ استوری از شمارنده قبلی به جدید می‌رود
+        rollups.move(rollups.counter_key(previous['created_at'], previous['topic_id'],
+                                         previous['sub_topic_id'], previous['category_id']),
+                     rollups.story_key(instance))
+
+
+@receiver(post_save, sender=StoryModel)
+def record_story_trends(sender, instance, created, raw=False, **kwargs):
+    # فقط ردیف‌های تگ‌ها و موضوع همین استوری به‌روز می‌شوند
+    if created and not raw:
+        trends.record_story(instance)
+
+
+@receiver(post_save, sender=StoryModel)
+def publish_story_event(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        delta = events.story_delta(instance)
+        transaction.on_commit(lambda: events.publish(delta))
+
+
+@receiver(post_save, sender=StoryModel)
+def schedule_duplicate_check(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # هش‌ها فقط از فایل، متن و نوع استوری ساخته می‌شوند
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None or (previous['story'], previous['story_text'], previous['story_type']) != (
+            instance.story.name, instance.story_text, instance.story_type):
+        enqueue(index_story_duplicates, story_id=instance.pk)
+
+
+@receiver(post_delete, sender=StoryModel)
+def remove_story_from_rollup(sender, instance, **kwargs):
+    rollups.apply_story_delta(instance, -1)
+
+
+@receiver(post_delete, sender=StoryModel)
+def remove_story_from_trends(sender, instance, **kwargs):
+    trends.forget_story(instance)
+
+
+@receiver(post_save, sender=StoryModel)
+@receiver(post_delete, sender=StoryModel)
+def invalidate_day_sketch(sender, instance, signal, raw=False, **kwargs):
+    # خلاصه امروز ذخیره نمی‌شود؛ فقط تغییر استوری روزهای قبل (روز قبلی و جدید آن) را باطل می‌کند
+    if raw:
+        return
+    days = {rollups.story_day(instance.created_at)}
+    previous = getattr(instance, '_previous', None)
+    if signal is post_save and previous is not None:
+        days.add(rollups.story_day(previous['created_at']))
+    for day in days:
+        if day < timezone.localdate():
+            sketches.invalidate(day)
+
+
+@receiver(pre_save, sender=InstagramPage)
+def remember_page_topics(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._previous_topics = (InstagramPage.objects.filter(pk=instance.pk)
+                                 .values_list('topic_id', 'sub_topic_id').first())
+
+
+@receiver(post_save, sender=InstagramPage)
+def page_topics_changed(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_topics', None)
+    if previous is not None and previous != (instance.topic_id, instance.sub_topic_id):
+        enqueue(sync_page_topics, page_id=instance.pk)
+
+
+@receiver(pre_delete, sender=InstagramPage)
+def clear_page_topics(sender, instance, **kwargs):
+    # update() سیگنال ندارد؛ شمارنده استوری‌ها اینجا
+    if StoryModel.objects.filter(page_id=instance.pk).update(topic=None, sub_topic=None):
+        bump_versions(StoryModel)
+
+
+@receiver(post_delete, sender=InstagramPage)
+@receiver(post_delete, sender=Topic)
+@receiver(post_delete, sender=SubTopic)
+@receiver(post_delete, sender=Category)
+def related_row_deleted(sender, **kwargs):
+    # SET_NULL روی استوری‌ها بدون سیگنال اجرا می‌شود
+    enqueue(rebuild_rollups)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute('PRAGMA %s = %s' % (pragma, value))
+
+
+# توکن‌های صادر شده claims قدیمی دارند؛ با تغییر نقش، محدوده یا حساب کاربر باطل می‌شوند
+@receiver(post_save, sender=AccessProfile)
+@receiver(post_delete, sender=AccessProfile)
+def revoke_profile_tokens(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        auth.revoke_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=AccessProfile.topics.through)
+@receiver(m2m_changed, sender=AccessProfile.categories.through)
+def revoke_scope_tokens(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        user_ids = AccessProfile.objects.filter(pk__in=kwargs['pk_set'] or ()).values_list('user_id', flat=True)
+    else:
+        user_ids = [instance.user_id]
+    for user_id in user_ids:
+        auth.revoke_user(user_id)
+
+
+@receiver(pre_save, sender=get_user_model())
+def revoke_changed_user_tokens(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or update_fields == frozenset(['last_login']):
+        return
+    old = sender.objects.filter(pk=instance.pk).values('is_active', 'is_superuser', 'password').first()
+    if old and (old['is_active'], old['is_superuser'], old['password']) != (
+            instance.is_active, instance.is_superuser, instance.password):
+        auth.revoke_user(instance.pk)
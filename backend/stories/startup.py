@@ -0,0 +1,41 @@
+"""
+Worker warm-up for forking servers.
+
+``preload()`` imports what the first request would otherwise import: the
+URLconf with every view and serializer, the DRF classes named in the
+settings, and NumPy when the columnar stats engine is on. Called from
+Config/wsgi.py and Config/asgi.py, so ``gunicorn --preload Config.wsgi``
+does this once in the master. ``gc.freeze()`` then moves everything loaded
+so far out of the collector's reach, so the workers don't dirty the
+shared pages and they stay shared copy-on-write. The WSGI/ASGI modules
+turn the collector off while importing (its full passes over the growing
+heap are pure overhead at startup); ``preload()`` turns it back on.
+
+No database connection is kept: a connection opened before the fork would
+be shared by every worker.
+"""
+import gc
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.settings import api_settings
+
+from . import columnar
+
+# کلاس‌هایی از تنظیمات DRF که در اولین درخواست import می‌شوند
+API_SETTINGS = ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_FILTER_BACKENDS',
+                'DEFAULT_CONTENT_NEGOTIATION_CLASS', 'DEFAULT_METADATA_CLASS')
+
+
+def preload():
+    """Warm up (when STARTUP['PRELOAD']), then freeze and re-enable the collector."""
+    if settings.STARTUP['PRELOAD']:
+        get_resolver().url_patterns
+        for name in API_SETTINGS:
+            getattr(api_settings, name)
+        columnar.enabled()
+        connections.close_all()
+    gc.freeze()
+    gc.enable()
@@ -0,0 +1,57 @@
+"""Background jobs of the stories app (run by ``manage.py run_jobs``)."""
+from datetime import date
+
+from django.db import transaction
+
+from . import rollups, denormalize, dedup, bulk, sketches
+from .conditional import bump_versions
+from .jobs import job, report_progress
+from .models import StoryModel, InstagramPage
+
+
+@job
+def rebuild_rollups(start=None, end=None):
+    rollups.rebuild(start and date.fromisoformat(start), end and date.fromisoformat(end))
+
+
+@job
+def sync_page_topics(page_id):
+    """Copy a page's new topic onto its stories and move them between rollup counters."""
+    stories = StoryModel.objects.filter(page_id=page_id)
+    with transaction.atomic():
+        rollups.shift(stories, -1)
+        denormalize.sync(stories)
+        rollups.shift(stories, 1)
+        bump_versions(StoryModel)
+
+
+@job
+def index_story_duplicates(story_id):
+    story = StoryModel.objects.filter(id=story_id).first()
+    if story is not None:
+        dedup.index_story(story)
+
+
+@job
+def build_sketches(days):
+    """Build and save the missing day/month sketches of the last ``days`` days."""
+    sketches.window(days)
+
+
+def _selection(model, ids, changelist, user_id):
+    # تیک‌های یک صفحه شناسه‌اند؛ «انتخاب همه» فیلترها و جستجوی changelist
+    if changelist is None:
+        return model.objects.filter(id__in=ids)
+    from .admin import changelist_queryset  # admin همین ماژول را import می‌کند
+    return changelist_queryset(model, changelist, user_id)
+
+
+@job
+def reclassify_stories(changes, ids=None, changelist=None, user_id=None):
+    bulk.reclassify_stories(_selection(StoryModel, ids, changelist, user_id), changes, progress=report_progress)
+
+
+@job
+def reassign_pages(topic_id, sub_topic_id=None, ids=None, changelist=None, user_id=None):
+    bulk.reassign_pages(_selection(InstagramPage, ids, changelist, user_id), topic_id, sub_topic_id,
+                        progress=report_progress)
@@ -1,3 +1,587 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadhandler import StopUpload
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from stories import jobs, rollups, tasks, dedup, trends, sketches, throttling, columnar, reference, events, media, auth, timeouts, compression
+from stories.conditional import bump_versions, get_versions
+from stories.admin import JobAdmin
+from stories.aggregate import aggregate, AggregateError
+from stories.models import (AccessProfile, Job, StoryModel, StoryDailyCount, TermTrend, DailySketch, Topic, SubTopic, Category,
+                            InstagramPage, Feeling, Tone, Ironic, StoryType)
+
+
+@jobs.job(name='stories.tests.always_fails', max_attempts=3)
+def always_fails(**kwargs):
+    raise RuntimeError('boom')
+
+
+class JobRetryTests(TestCase):
+    def claim_one(self):
+        job_id, = jobs.claim(1)
+        return Job.objects.get(id=job_id)
+
+    def test_retry_requeues_the_job(self):
+        jobs.enqueue(always_fails, story_id=1)
+        running = self.claim_one()
+
+        self.assertEqual(jobs._execute(running), Job.PENDING)
+        running.refresh_from_db()
+        self.assertEqual(running.status, Job.PENDING)
+        self.assertIn('boom', running.last_error)
+
+    def test_retry_with_identical_job_pending(self):
+        jobs.enqueue(always_fails, story_id=1)
+        running = self.claim_one()
+        # همان کار در حین اجرا دوباره در صف قرار می‌گیرد
+        pending = jobs.enqueue(always_fails, story_id=1)
+        self.assertNotEqual(pending.id, running.id)
+
+        self.assertEqual(jobs._execute(running), Job.DONE)
+        running.refresh_from_db()
+        self.assertEqual(running.status, Job.DONE)
+        self.assertIn('superseded', running.last_error)
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).get().id, pending.id)
+
+    def test_requeue_stale_with_identical_job_pending(self):
+        jobs.enqueue(always_fails, story_id=1)
+        stale = self.claim_one()
+        Job.objects.filter(id=stale.id).update(locked_at=timezone.now() - timedelta(days=1))
+        pending = jobs.enqueue(always_fails, story_id=1)
+        other = jobs.enqueue(always_fails, story_id=2)
+        Job.objects.filter(id=other.id).update(status=Job.RUNNING, locked_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(id=stale.id).status, Job.DONE)
+        self.assertEqual(set(Job.objects.filter(status=Job.PENDING).values_list('id', flat=True)),
+                         {pending.id, other.id})
+
+    def test_admin_retry_with_identical_jobs(self):
+        first = jobs.enqueue(always_fails, story_id=1)
+        Job.objects.filter(id=first.id).update(status=Job.FAILED)
+        second = jobs.enqueue(always_fails, story_id=1)
+        Job.objects.filter(id=second.id).update(status=Job.FAILED)
+        third = jobs.enqueue(always_fails, story_id=1)
+
+        JobAdmin(Job, admin.site).retry_jobs(None, Job.objects.all())
+        self.assertEqual(Job.objects.get(status=Job.PENDING).id, third.id)
+        self.assertEqual(set(Job.objects.filter(status=Job.DONE).values_list('id', flat=True)),
+                         {first.id, second.id})
+
+
+def make_story(page, category=None, **fields):
+    fields = dict(dict(title='story', story='images/x.jpg', feeling=Feeling.HAPPY, ironic=Ironic.YES,
+                       tone=Tone.FORMAL, story_type=StoryType.Image), **fields)
+    return StoryModel.objects.create(page=page, category=category, **fields)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.topics = [Topic.objects.create(name='topic %d' % i, icon='x.png') for i in range(2)]
+        self.sub_topic = SubTopic.objects.create(name='sub topic')
+        self.categories = [Category.objects.create(name='category %d' % i) for i in range(2)]
+        self.pages = [InstagramPage.objects.create(page='page %d' % i, username='page_%d' % i,
+                                                   topic=self.topics[i], sub_topic=self.sub_topic if i else None,
+                                                   followers_count=10)
+                      for i in range(2)]
+
+    def counters(self):
+        return set(StoryDailyCount.objects.exclude(story_count=0)
+                   .values_list('day', 'topic_id', 'sub_topic_id', 'category_id', 'story_count'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.counters()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.counters())
+
+    def test_create_edit_delete(self):
+        stories = [make_story(self.pages[i % 2], self.categories[i % 2]) for i in range(6)]
+        stories[0].category = self.categories[1]
+        stories[0].save()
+        stories[1].page = self.pages[0]
+        stories[1].save()
+        stories[2].created_at = stories[2].created_at - timedelta(days=3)
+        stories[2].save()
+        stories[3].title = 'same counter'
+        stories[3].save()
+        stories[4].delete()
+        self.assertMatchesRebuild()
+
+    def test_shift(self):
+        for i in range(4):
+            make_story(self.pages[i % 2], self.categories[0])
+        stories = StoryModel.objects.filter(page=self.pages[0])
+        rollups.shift(stories, -1)
+        stories.update(category=self.categories[1])
+        rollups.shift(stories, 1)
+        self.assertMatchesRebuild()
+
+    def test_page_topic_change(self):
+        for i in range(4):
+            make_story(self.pages[i % 2], self.categories[i % 2])
+        self.pages[0].topic = self.topics[1]
+        self.pages[0].sub_topic = self.sub_topic
+        self.pages[0].save()
+        tasks.sync_page_topics(self.pages[0].id)
+        self.assertEqual(StoryModel.objects.filter(topic=self.topics[1]).count(), 4)
+        self.assertMatchesRebuild()
+
+    def test_topic_updates_without_signals_bump_the_stories(self):
+        story = make_story(self.pages[0])
+        before = get_versions([StoryModel])
+        StoryModel.objects.filter(id=story.id).update(topic=self.topics[1])
+        call_command('sync_story_topics', '--repair', stdout=StringIO())
+        self.assertNotEqual(get_versions([StoryModel]), before)
+
+        before = get_versions([StoryModel])
+        self.pages[0].delete()
+        self.assertNotEqual(get_versions([StoryModel]), before)
+
+
+class BulkActionTests(TestCase):
+    def test_select_all_passes_the_changelist_filter(self):
+        user = get_user_model().objects.create_superuser('admin', password='x')
+        self.client.force_login(user)
+        page = InstagramPage.objects.create(page='page', username='page', followers_count=10)
+        happy = [make_story(page), make_story(page)]
+        sad = make_story(page, feeling=Feeling.SAD)
+
+        response = self.client.post('/admin/stories/storymodel/?feeling__exact=%s' % Feeling.HAPPY, {
+            'action': 'reclassify', 'select_across': '1', '_selected_action': [happy[0].id], 'apply': '1',
+            'tone': Tone.INFORMAL, 'feeling': '', 'category': ''})
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get(name__endswith='reclassify_stories')
+        self.assertNotIn('ids', job.kwargs)
+
+        self.assertEqual(jobs._execute(job), Job.DONE)
+        self.assertEqual(set(StoryModel.objects.filter(tone=Tone.INFORMAL).values_list('id', flat=True)),
+                         {story.id for story in happy})
+        self.assertEqual(StoryModel.objects.get(id=sad.id).tone, Tone.FORMAL)
+
+
+class AdminSearchTests(TestCase):
+    def test_substring_search_on_description_and_bio(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='x'))
+        page = InstagramPage.objects.create(page='page', username='page', bio='خبرگزاری مستقل', followers_count=10)
+        story = make_story(page, description='گزارش بازار ارز امروز')
+        response = self.client.get('/admin/stories/storymodel/', {'q': 'بازار'})
+        self.assertEqual([row.pk for row in response.context['cl'].result_list], [story.pk])
+        response = self.client.get('/admin/stories/instagrampage/', {'q': 'مستقل'})
+        self.assertEqual([row.pk for row in response.context['cl'].result_list], [page.pk])
+
+
+class ConditionalTests(TestCase):
+    def test_change_within_the_same_second_is_not_304(self):
+        topic = Topic.objects.create(name='topic', icon='x.png')
+        response = self.client.get('/api/topics/')
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get('/api/topics/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        topic.name = 'renamed'
+        topic.save()
+        self.assertEqual(self.client.get('/api/topics/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_version_adds_up_the_shards(self):
+        for _ in range(20):
+            bump_versions(Category)
+        self.assertEqual(get_versions([Category]), [('stories.category', 20)])
+
+
+class AggregateTests(TestCase):
+    def test_rejects_invalid_params(self):
+        for params in ({'group_by': 'topic', 'topic': 'abc'}, {'page': '1,x'}, {'group_by': 'colour'},
+                       {'group_by': 'topic,topic'}, {'metrics': 'sum'}, {'days': '-1'}, {'limit': 'all'}):
+            with self.subTest(params=params), self.assertRaises(AggregateError):
+                aggregate(params)
+
+    def test_id_filter(self):
+        topic = Topic.objects.create(name='topic', icon='x.png')
+        page = InstagramPage.objects.create(page='page', username='page', topic=topic, followers_count=10)
+        make_story(page)
+        make_story(page)
+        result = aggregate({'group_by': 'topic', 'topic': '%d, ' % topic.id})
+        self.assertEqual(result['rows'], [{'topic': topic.id, 'topic_name': 'topic', 'count': 2}])
+
+
+class ReferenceTests(TestCase):
+    def test_rename_is_seen_on_the_next_read(self):
+        data = reference.ReferenceData()
+        topic = Topic.objects.create(name='topic', icon='x.png')
+        with mock.patch.object(reference, 'reference', data):
+            self.assertEqual(reference.names('topic'), {topic.id: 'topic'})
+            topic.name = 'renamed'
+            topic.save()
+            self.assertEqual(reference.names('topic'), {topic.id: 'renamed'})
+
+
+class DuplicateTests(TestCase):
+    def setUp(self):
+        topic = Topic.objects.create(name='topic', icon='x.png')
+        self.page = InstagramPage.objects.create(page='page', username='page', topic=topic, followers_count=10)
+
+    def pending_checks(self):
+        return Job.objects.filter(name=tasks.index_story_duplicates.job_name, status=Job.PENDING).count()
+
+    def test_check_scheduled_only_when_content_changes(self):
+        story = make_story(self.page, story_text='متن اول')
+        Job.objects.all().delete()
+        story.title = 'new title'
+        story.save()
+        self.assertEqual(self.pending_checks(), 0)
+        story.story_text = 'متن دوم'
+        story.save()
+        self.assertEqual(self.pending_checks(), 1)
+
+    def test_linking_a_duplicate_bumps_the_version(self):
+        text = 'یک متن نسبتا بلند برای پیدا کردن استوری تکراری در میان استوری‌ها'
+        original = make_story(self.page, story_type=StoryType.Text, story_text=text)
+        copy = make_story(self.page, story_type=StoryType.Text, story_text=text)
+        dedup.index_story(original)
+        before = get_versions([StoryModel])
+        dedup.index_story(StoryModel.objects.get(id=copy.id))
+        self.assertEqual(StoryModel.objects.get(id=copy.id).duplicate_of_id, original.id)
+        self.assertNotEqual(get_versions([StoryModel]), before)
+
+
+class TrendTests(TestCase):
+    def setUp(self):
+        self.topic = Topic.objects.create(name='topic', icon='x.png')
+        self.page = InstagramPage.objects.create(page='page', username='page', topic=self.topic, followers_count=10)
+
+    def states(self):
+        return set(TermTrend.objects.values_list('kind', 'term', 'bucket', 'count', 'mean', 'variance'))
+
+    def test_record_and_forget(self):
+        stories = [make_story(self.page, title='انتخابات، اقتصاد') for _ in range(3)]
+        make_story(self.page, title='انتخابات')
+        tag = TermTrend.objects.get(kind=TermTrend.TAG, term='انتخابات')
+        self.assertEqual(tag.count, 4)
+        self.assertAlmostEqual(tag.score, 4.0)
+
+        for story in stories:
+            story.delete()
+        self.assertEqual(TermTrend.objects.get(kind=TermTrend.TAG, term='انتخابات').count, 1)
+        self.assertFalse(TermTrend.objects.filter(kind=TermTrend.TAG, term='اقتصاد').exists())
+
+    def test_rollover_matches_rebuild(self):
+        for hours in (50, 49, 49, 3, 0, 0, 0):
+            story = make_story(self.page, title='انتخابات')
+            StoryModel.objects.filter(id=story.id).update(created_at=story.created_at - timedelta(hours=hours))
+        TermTrend.objects.all().delete()
+        for story in StoryModel.objects.order_by('created_at', 'id'):
+            trends.record_story(story)
+        incremental = self.states()
+        trends.rebuild()
+        self.assertEqual(incremental, self.states())
+
+
+class SketchTests(TestCase):
+    def setUp(self):
+        topic = Topic.objects.create(name='topic', icon='x.png')
+        self.page = InstagramPage.objects.create(page='page', username='page', topic=topic, followers_count=10)
+
+    def test_build_day_replaces_the_sketch(self):
+        day = timezone.localdate() - timedelta(days=2)
+        sketches.build_day(day)
+        story = make_story(self.page)
+        StoryModel.objects.filter(id=story.id).update(created_at=story.created_at - timedelta(days=2))
+        sketches.build_day(day)
+        self.assertEqual(DailySketch.objects.get(period=DailySketch.DAY, day=day).story_count, 1)
+
+    def test_moving_a_story_invalidates_both_days(self):
+        old_day, new_day = (timezone.localdate() - timedelta(days=days) for days in (3, 5))
+        story = make_story(self.page)
+        StoryModel.objects.filter(id=story.id).update(created_at=story.created_at - timedelta(days=3))
+        story.refresh_from_db()
+        sketches.build_day(old_day)
+        sketches.build_day(new_day)
+        story.created_at = story.created_at - timedelta(days=2)
+        story.save()
+        self.assertFalse(DailySketch.objects.filter(day__in=[old_day, new_day]).exists())
+
+    def test_stats_serve_stored_sketches_and_queue_the_rest(self):
+        story = make_story(self.page)
+        StoryModel.objects.filter(id=story.id).update(created_at=story.created_at - timedelta(days=3))
+        sketches.build_day(timezone.localdate() - timedelta(days=2))
+
+        response = self.client.get('/api/stats/stats/?approximate=true&days=7')
+        self.assertEqual(response.status_code, 200)
+        approximate = response.json()['approximate']
+        self.assertEqual((approximate['partial'], approximate['missing_days']), (True, 6))
+        self.assertEqual(approximate['story_count'], 0)
+        self.assertEqual(DailySketch.objects.count(), 1)
+        job = Job.objects.get(name='stories.tasks.build_sketches', status=Job.PENDING)
+
+        self.assertEqual(jobs._execute(job), Job.DONE)
+        cache.clear()
+        approximate = self.client.get('/api/stats/stats/?approximate=true&days=7').json()['approximate']
+        self.assertEqual((approximate['partial'], approximate['story_count']), (False, 1))
+
+
+@override_settings(THROTTLE=dict(settings.THROTTLE, STORE='local', RATE=0.001, BURST=100))
+class ThrottleTests(TestCase):
+    url = '/api/stats/aggregate/?group_by=feeling&days=300'
+
+    def setUp(self):
+        throttling._stores.clear()
+
+    def tokens(self):
+        tokens, _ = next(iter(throttling.get_store().buckets.values()))
+        return round(tokens)
+
+    def test_conditional_answer_pays_the_base_cost(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.tokens(), 100 - 15)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.tokens(), 100 - 15 - 5)
+
+    def test_missing_days_costs_30_days(self):
+        self.client.get('/api/stats/aggregate/?group_by=feeling')
+        self.assertEqual(self.tokens(), 100 - 6)
+
+
+@skipUnless(columnar._load_numpy(), 'NumPy is not installed')
+@override_settings(STATS_ENGINE=dict(settings.STATS_ENGINE, BACKEND='columnar'))
+class ColumnarTests(TestCase):
+    def setUp(self):
+        # شمارنده‌ها با rollback هر تست به عقب برمی‌گردند؛ کش مرجع تازه
+        patcher = mock.patch.object(reference, 'reference', reference.ReferenceData())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        topic = Topic.objects.create(name='topic', icon='x.png')
+        self.page = InstagramPage.objects.create(page='page', username='page', topic=topic, followers_count=10)
+
+    def stats(self, query, engine):
+        cache.clear()
+        with self.settings(STATS_ENGINE=dict(settings.STATS_ENGINE, BACKEND=engine)):
+            response = self.client.get('/api/stats/stats/' + query)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        # مسیر SQL سری‌های احساس را از روی یک set می‌سازد؛ ترتیبشان در هر پروسه فرق دارد
+        for name in ('by_feeling_streamgraph', 'by_feeling_tone'):
+            data[name]['series'].sort(key=lambda series: series['name'])
+        return data
+
+    def test_same_answer_as_sql(self):
+        other_topic = Topic.objects.create(name='other', icon='x.png')
+        other_page = InstagramPage.objects.create(page='other', username='other', topic=other_topic,
+                                                  followers_count=25)
+        titles = ['انتخابات، اقتصاد', 'اقتصاد', 'ورزش، انتخابات، اقتصاد', '']
+        texts = ['بازار ارز امروز آرام بود', None, 'تیم ملی امروز بازی کرد و بازار شلوغ بود', 'ارز ارز']
+        # بدون تساوی در هیچ تفکیکی: ترتیب گروه‌های هم‌تعداد در SQL مشخص نیست
+        pages, feelings, tones, types = ('112202020022000', '202101022010011', '210110122121121', '011101101001111')
+        for i in range(15):
+            make_story([self.page, other_page, None][int(pages[i])], title=titles[i % 4], story_text=texts[i % 4],
+                       feeling=[Feeling.HAPPY, Feeling.SAD, Feeling.CALM][int(feelings[i])],
+                       tone=[Tone.FORMAL, Tone.FRIENDLY, Tone.INFORMAL][int(tones[i])],
+                       story_type=[StoryType.Image, StoryType.Text][int(types[i])])
+        StoryModel.objects.filter(id__in=list(StoryModel.objects.order_by('id').values_list('id', flat=True)[:4])).update(
+            created_at=timezone.now() - timedelta(days=40))
+        first = StoryModel.objects.order_by('id').first()
+        StoryModel.objects.filter(id=StoryModel.objects.order_by('-id').first().id).update(duplicate_of=first)
+
+        with mock.patch.object(columnar, 'snapshot', columnar.Snapshot(background=False)):
+            for query in ('', '?days=90', '?dedup=true', '?topic_id=%d' % other_topic.id,
+                          '?page_id=%d&days=90' % self.page.id):
+                with self.subTest(query=query):
+                    self.assertEqual(self.stats(query, 'columnar'), self.stats(query, 'sql'))
+            data = self.stats('', 'columnar')
+            self.assertEqual(data['top_tag'][0], {'name': 'اقتصاد', 'weight': 9})
+            self.assertEqual([group['name'] for group in data['by_page_bubble']], ['other', 'topic', 'بدون موضوع'])
+
+    def test_duplicate_marks_do_not_reload(self):
+        text = 'یک متن نسبتا بلند برای پیدا کردن استوری تکراری در میان استوری‌ها'
+        snapshot = columnar.Snapshot(background=False)
+        make_story(self.page)
+        snapshot.get()
+        with mock.patch.object(snapshot, 'reload', wraps=snapshot.reload) as reload:
+            original = make_story(self.page, story_type=StoryType.Text, story_text=text)
+            copy = make_story(self.page, story_type=StoryType.Text, story_text=text)
+            dedup.index_story(original)
+            snapshot.get()
+            dedup.index_story(StoryModel.objects.get(id=copy.id))
+            columns = snapshot.get()
+            self.assertEqual(list(columns.duplicate_of), [0, 0, original.id])
+            make_story(self.page, story_type=StoryType.Text, story_text=text)
+            dedup.index_story(StoryModel.objects.order_by('-id').first())
+            self.assertEqual(list(snapshot.get().duplicate_of), [0, 0, original.id, original.id])
+            reload.assert_not_called()
+
+            story = StoryModel.objects.get(id=original.id)
+            story.feeling = Feeling.SAD
+            story.save()
+            snapshot.get()
+            reload.assert_called_once()
+
+    def test_sql_answers_while_loading(self):
+        make_story(self.page)
+        snapshot = columnar.Snapshot()
+        with mock.patch.object(columnar, 'snapshot', snapshot), \
+                mock.patch.object(columnar.threading, 'Thread') as thread:
+            self.assertEqual(self.stats('', 'columnar'), self.stats('', 'sql'))
+            self.stats('', 'columnar')
+        thread.assert_called_once_with(target=snapshot.reload, name='columnar-reload', daemon=True)
+        self.assertIsNone(snapshot.columns)
+
+    def test_changes_show_up_on_the_next_request(self):
+        snapshot = columnar.Snapshot(background=False)
+        make_story(self.page)
+        with mock.patch.object(columnar, 'snapshot', snapshot):
+            self.assertEqual(self.stats('', 'columnar')['total_count'], 1)
+            make_story(self.page)
+            self.assertEqual(self.stats('', 'columnar')['total_count'], 2)
+
+
+class EventTests(TestCase):
+    def test_full_queue_keeps_the_close(self):
+        broker = events.InProcessBroker()
+        queue = asyncio.Queue(maxsize=2)
+        broker.streams.add(queue)
+        queue.put_nowait(b'delta')
+        queue.put_nowait(events.CLOSE)
+        broker._broadcast(events.PING)
+        self.assertIs(queue.get_nowait(), events.CLOSE)
+
+    @override_settings(EVENTS=dict(settings.EVENTS, FLUSH_INTERVAL=0))
+    def test_deltas_are_merged_and_shared_by_every_stream(self):
+        broker = events.InProcessBroker()
+
+        async def run():
+            queues = [broker.subscribe(), broker.subscribe()]
+            broker.publish({'day': '2026-01-01', 'feeling': 'happy', 'tone': 'formal', 'topic': '1'})
+            broker.publish({'day': '2026-01-01', 'feeling': 'sad', 'tone': 'formal'})
+            await asyncio.sleep(0.01)
+            return [queue.get_nowait() for queue in queues], [queue.empty() for queue in queues]
+
+        (first, second), empty = asyncio.run(run())
+        self.assertIs(first, second)
+        self.assertEqual(empty, [True, True])
+        event, data = first.decode().split('\n')[1:3]
+        self.assertEqual(event, 'event: delta')
+        self.assertEqual(json.loads(data[len('data: '):]), {
+            'stories': 2, 'day': {'2026-01-01': 2}, 'feeling': {'happy': 1, 'sad': 1}, 'tone': {'formal': 2},
+            'topic': {'1': 1}})
+
+
+@override_settings(MEDIA_LIMITS=dict(settings.MEDIA_LIMITS, IMAGE_MAX_SIZE=100, VIDEO_MAX_SIZE=1000))
+class UploadLimitTests(TestCase):
+    def receive(self, head, size, content_type):
+        handler = media.MaxSizeUploadHandler()
+        handler.new_file('story', 'story.bin', content_type, size)
+        handler.receive_data_chunk(head + b'\0' * (size - len(head)), 0)
+
+    def test_limit_follows_the_file_type(self):
+        png = b'\x89PNG\r\n\x1a\n'
+        self.receive(b'\0\0\0\x18ftypmp42', 500, 'video/mp4')
+        # نوع اعلام شده مهم نیست، محتوای فایل مهم است
+        with self.assertRaises(StopUpload):
+            self.receive(png, 500, 'video/mp4')
+        self.receive(png, 100, 'image/png')
+
+
+@override_settings(AUTH=dict(settings.AUTH, REVOCATION_REFRESH=0))
+class AuthTests(TestCase):
+    def setUp(self):
+        # شمارنده‌ها با rollback هر تست به عقب برمی‌گردند؛ لیست ابطال تازه
+        patcher = mock.patch.object(auth, 'revocations', auth.RevocationList())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.topics = [Topic.objects.create(name='topic %d' % i, icon='x.png') for i in range(2)]
+        self.pages = [InstagramPage.objects.create(page='page %d' % i, username='page_%d' % i, topic=self.topics[i],
+                                                   followers_count=10) for i in range(2)]
+        self.user = get_user_model().objects.create_user('editor', password='secret')
+        profile = AccessProfile.objects.create(user=self.user, role=AccessProfile.EDITOR)
+        profile.topics.add(self.topics[0])
+
+    def login(self):
+        response = self.client.post('/api/token/', {'username': 'editor', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def patch(self, tokens, story, data):
+        return self.client.patch('/api/storymodel/%d/' % story.id, data, content_type='application/json',
+                                 HTTP_AUTHORIZATION='Bearer %s' % tokens['access'])
+
+    def test_editor_writes_only_inside_their_topics(self):
+        tokens = self.login()
+        inside, outside = make_story(self.pages[0]), make_story(self.pages[1])
+        self.assertEqual(self.patch(tokens, inside, {'feeling': Feeling.SAD}).status_code, 200)
+        self.assertEqual(self.patch(tokens, outside, {'feeling': Feeling.SAD}).status_code, 403)
+        self.assertEqual(StoryModel.objects.get(id=outside.id).feeling, Feeling.HAPPY)
+
+    def test_revoked_token_is_rejected(self):
+        tokens = self.login()
+        story = make_story(self.pages[0])
+        response = self.client.post('/api/token/revoke/', {'refresh': tokens['refresh']},
+                                    HTTP_AUTHORIZATION='Bearer %s' % tokens['access'])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.patch(tokens, story, {'feeling': Feeling.SAD}).status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}).status_code, 401)
+
+    def test_revoke_user_cuts_off_older_tokens(self):
+        old = self.login()
+        auth.revoke_user(self.user.id)
+        new = self.login()
+        story = make_story(self.pages[0])
+        self.assertEqual(self.patch(old, story, {'feeling': Feeling.SAD}).status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': old['refresh']}).status_code, 401)
+        self.assertEqual(self.patch(new, story, {'feeling': Feeling.SAD}).status_code, 200)
+
+    def test_refresh_reads_the_current_claims(self):
+        tokens = self.login()
+        story = make_story(self.pages[1])
+        self.assertEqual(self.patch(tokens, story, {'feeling': Feeling.SAD}).status_code, 403)
+        # تغییر کاربر بدون سیگنال ابطال؛ claims تازه فقط از refresh می‌آیند
+        get_user_model().objects.filter(id=self.user.id).update(is_superuser=True)
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.patch(response.json(), story, {'feeling': Feeling.SAD}).status_code, 200)
+
+
+class TimeoutTests(TestCase):
+    def test_query_over_budget_is_a_400(self):
+        with self.settings(QUERY_TIMEOUTS=dict(settings.QUERY_TIMEOUTS, search=0)):
+            response = self.client.get('/api/storymodel/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': timeouts.TOO_EXPENSIVE})
+        # اتصال بعد از قطع دوباره قابل استفاده است
+        self.assertEqual(self.client.get('/api/storymodel/').status_code, 200)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(compression, 'report', compression.Report())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        page = InstagramPage.objects.create(page='page', username='page', followers_count=10)
+        for i in range(10):
+            make_story(page, title='عنوان %d' % i)
+
+    def test_precompressed_stats_are_served_from_the_cache(self):
+        url = '/api/stats/stats/'
+        first = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertTrue(first['ETag'].startswith('W/'))
+        identity = self.client.get(url)
+        self.assertNotIn('Content-Encoding', identity)
+        self.assertEqual(gzip.decompress(first.content), identity.content)
+
+        with mock.patch.object(StoryModel, 'get_top_tags_from_queryset', side_effect=AssertionError) as view:
+            second = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(second.content, first.content)
+        view.assert_not_called()
+        hits = {row[1]: row[-1] for row in compression.report.rows()}
+        self.assertEqual(hits['gzip'], 1)
@@ -0,0 +1,189 @@
+"""
+Per-client rate limiting weighted by the estimated cost of each request.
+
+Every client (user id for authenticated requests, IP otherwise) has a
+token bucket of THROTTLE['BURST'] tokens that refills at THROTTLE['RATE']
+tokens per second. A request takes as many tokens as its view's
+``throttle_costs`` entry for the action says (1 by default); when the
+bucket is short the answer is ``429`` with ``Retry-After`` set to the time
+the missing tokens take to refill. For ``window_cost`` endpoints only the
+base cost is taken up front; the rest is taken by ``@admission`` when the
+aggregation really runs, so ``304`` and cached (precompressed) answers
+cost the base only.
+
+Heavy aggregations also pass an admission gate (``@admission``): at most
+THROTTLE['HEAVY_CONCURRENCY'] run at once per process, up to
+THROTTLE['QUEUE_SIZE'] more wait THROTTLE['QUEUE_TIMEOUT'] seconds for a
+slot, and the rest get ``429`` straight away.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+
+def window_cost(base):
+    """
+    Cost of a ``days``/``search`` endpoint: ``base`` plus one token per
+    month scanned (no ``days`` = the views' 30-day default), times 4 with
+    a text search.
+    """
+    def cost(request):
+        days = request.query_params.get('days', '30')
+        days = int(days) if days.isdigit() else 30
+        total = base + min(days, settings.THROTTLE['MAX_DAYS']) // 30
+        if request.query_params.get('search'):
+            total *= 4
+        return total
+
+    cost.base = base
+    return cost
+
+
+def request_cost(view, request):
+    cost = getattr(view, 'throttle_costs', {}).get(getattr(view, 'action', None), 1)
+    return cost(request) if callable(cost) else cost
+
+
+def upfront_cost(view, request):
+    """Tokens taken before the view runs: the base of a ``window_cost``."""
+    cost = getattr(view, 'throttle_costs', {}).get(getattr(view, 'action', None), 1)
+    return getattr(cost, 'base', cost) if callable(cost) else cost
+
+
+class LocalBuckets:
+    """Buckets in the memory of this process (exact, but per process)."""
+    # بالاتر از این تعداد، سطل‌های پر (بی‌اثر) دور ریخته می‌شوند
+    MAX_CLIENTS = 10000
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst):
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            if tokens < cost:
+                self.buckets[key] = (tokens, now)
+                return (cost - tokens) / rate
+            self.buckets[key] = (tokens - cost, now)
+            if len(self.buckets) > self.MAX_CLIENTS:
+                self._prune(now, rate, burst)
+            return 0
+
+    def _prune(self, now, rate, burst):
+        for key, (tokens, stamp) in list(self.buckets.items()):
+            if tokens + (now - stamp) * rate >= burst:
+                del self.buckets[key]
+
+
+class CacheBuckets:
+    """
+    Buckets in the Django cache, shared by the processes using it. The
+    read-modify-write is not atomic, so concurrent requests of one client
+    may occasionally both pass.
+    """
+
+    def take(self, key, cost, rate, burst):
+        now = time.time()
+        key = 'throttle:%s' % key
+        tokens, stamp = cache.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - stamp) * rate)
+        wait = 0
+        if tokens < cost:
+            wait = (cost - tokens) / rate
+        else:
+            tokens -= cost
+        cache.set(key, (tokens, now), timeout=math.ceil(burst / rate) + 1)
+        return wait
+
+
+STORES = {'local': LocalBuckets, 'cache': CacheBuckets}
+_stores = {}
+
+
+def get_store():
+    name = settings.THROTTLE['STORE']
+    if name not in _stores:
+        _stores[name] = STORES[name]()
+    return _stores[name]
+
+
+class CostThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        user = request.user
+        client = 'user:%s' % user.pk if user and user.is_authenticated else 'ip:%s' % self.get_ident(request)
+        rate, burst = settings.THROTTLE['RATE'], settings.THROTTLE['BURST']
+        # درخواستی گران‌تر از ظرفیت سطل هیچ وقت مجاز نمی‌شد
+        cost = min(request_cost(view, request), burst)
+        upfront = min(upfront_cost(view, request), cost)
+        self._wait = get_store().take(client, upfront, rate, burst)
+        # باقی هزینه را @admission می‌گیرد، اگر محاسبه واقعا اجرا شود
+        request._deferred_cost = (client, cost - upfront)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class AdmissionQueue:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.running = 0
+        self.waiting = 0
+
+    def acquire(self, limit, queue_size, timeout):
+        """True once a slot is taken; False if the queue is full or ``timeout`` passes."""
+        with self.condition:
+            if self.running < limit:
+                self.running += 1
+                return True
+            if self.waiting >= queue_size:
+                return False
+            self.waiting += 1
+            try:
+                if not self.condition.wait_for(lambda: self.running < limit, timeout):
+                    return False
+                self.running += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify()
+
+
+heavy_queries = AdmissionQueue()
+
+
+def admission(view_method):
+    """
+    View method decorator for heavy aggregations; put it under
+    ``@conditional`` and ``@precompressed`` so ``304`` and cached answers
+    neither wait for a slot nor pay the deferred part of their cost.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        limits = settings.THROTTLE
+        client, cost = getattr(request, '_deferred_cost', (None, 0))
+        if cost:
+            wait = get_store().take(client, cost, limits['RATE'], limits['BURST'])
+            if wait:
+                raise Throttled(wait=wait)
+        if not heavy_queries.acquire(limits['HEAVY_CONCURRENCY'], limits['QUEUE_SIZE'], limits['QUEUE_TIMEOUT']):
+            raise Throttled(wait=limits['QUEUE_TIMEOUT'], detail='سرور مشغول محاسبات سنگین است؛ کمی بعد دوباره تلاش کنید')
+        try:
+            return view_method(self, request, *args, **kwargs)
+        finally:
+            heavy_queries.release()
+
+    return wrapper
@@ -0,0 +1,183 @@
+"""
+Time budgets for analytics queries, and cancellation when the client leaves.
+
+``@time_limited(name)`` gives a view method QUERY_TIMEOUTS[name] seconds of
+database time. The first query on each connection arms it: PostgreSQL
+gets ``SET statement_timeout`` for the rest of the budget, SQLite gets a
+progress handler that interrupts the running statement once the deadline
+passes. The connections are disarmed when the view returns.
+
+``cancel_on_disconnect`` wraps the ASGI application: once Django has read
+the request body it keeps listening for ``http.disconnect``. A disconnect
+cancels the queries of that request, with ``cancel()`` on PostgreSQL and
+the progress handler on SQLite.
+
+An interrupted query becomes a 400 asking the client to narrow the filters.
+"""
+import asyncio
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections, OperationalError
+from rest_framework.response import Response
+
+# هر چند دستور ماشین مجازی SQLite یک بار مهلت بررسی می‌شود
+SQLITE_PROGRESS_STEPS = 1000
+
+TOO_EXPENSIVE = 'این درخواست بیش از حد سنگین است؛ بازه زمانی یا فیلترها را محدودتر کنید'
+
+
+class Cancellation:
+    """Set when the client of a request disconnects; callable from any thread."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class QueryBudget:
+    def __init__(self, seconds, cancellation=None):
+        self.deadline = time.monotonic() + seconds
+        self.cancellation = cancellation or Cancellation()
+        self.armed = {}
+
+    @property
+    def exceeded(self):
+        return self.cancellation.cancelled or time.monotonic() >= self.deadline
+
+    def _interrupt(self):
+        return self.exceeded
+
+    def wrapper(self, alias):
+        """execute_wrapper for ``alias`` that arms the connection on its first query."""
+        def execute(execute, sql, params, many, context):
+            if alias not in self.armed:
+                self.arm(alias, context['connection'])
+            if self.exceeded:
+                raise OperationalError('interrupted')
+            return execute(sql, params, many, context)
+
+        return execute
+
+    def arm(self, alias, connection):
+        raw = connection.connection
+        if connection.vendor == 'postgresql':
+            remaining = max(int((self.deadline - time.monotonic()) * 1000), 1)
+            with raw.cursor() as cursor:
+                cursor.execute('SET statement_timeout = %d' % remaining)
+            cancel = raw.cancel
+            self.cancellation.add_callback(cancel)
+        elif connection.vendor == 'sqlite':
+            raw.set_progress_handler(self._interrupt, SQLITE_PROGRESS_STEPS)
+            cancel = None
+        else:
+            cancel = None
+        self.armed[alias] = (connection, cancel)
+
+    def disarm(self):
+        for connection, cancel in self.armed.values():
+            if cancel is not None:
+                self.cancellation.remove_callback(cancel)
+            raw = connection.connection
+            if raw is None:
+                continue
+            if connection.vendor == 'postgresql':
+                try:
+                    with raw.cursor() as cursor:
+                        cursor.execute('RESET statement_timeout')
+                except Exception:
+                    # اتصال خراب است؛ جنگو آن را کنار می‌گذارد
+                    connection.close_if_unusable_or_obsolete()
+            elif connection.vendor == 'sqlite':
+                raw.set_progress_handler(None, 0)
+        self.armed = {}
+
+
+def request_cancellation(request):
+    """Cancellation of an ASGI request (None under WSGI)."""
+    return getattr(request, 'scope', {}).get('cancellation')
+
+
+def time_limited(name):
+    """View method decorator: at most QUERY_TIMEOUTS[name] seconds of queries."""
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            budget = QueryBudget(settings.QUERY_TIMEOUTS[name], request_cancellation(request))
+            aliases = ['default'] + list(getattr(settings, 'REPLICA_DATABASES', ()))
+            try:
+                with ExitStack() as stack:
+                    for alias in aliases:
+                        stack.enter_context(connections[alias].execute_wrapper(budget.wrapper(alias)))
+                    return view_method(self, request, *args, **kwargs)
+            except OperationalError:
+                if not budget.exceeded:
+                    raise
+                return Response({'error': TOO_EXPENSIVE}, status=400)
+            finally:
+                budget.disarm()
+
+        return wrapper
+
+    return decorator
+
+
+def cancel_on_disconnect(application):
+    """ASGI middleware giving every HTTP request a Cancellation in ``scope['cancellation']``."""
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return await application(scope, receive, send)
+
+        cancellation = Cancellation()
+        scope = dict(scope, cancellation=cancellation)
+        body_read = asyncio.Event()
+
+        async def receive_body():
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                cancellation.cancel()
+            elif not message.get('more_body'):
+                body_read.set()
+            return message
+
+        async def watch_disconnect():
+            # جنگو بعد از خواندن بدنه دیگر receive را صدا نمی‌زند
+            await body_read.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            await asyncio.get_running_loop().run_in_executor(None, cancellation.cancel)
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await application(scope, receive_body, send)
+        finally:
+            watcher.cancel()
+
+    return app
@@ -0,0 +1,175 @@
+"""
+Burst detection for title tags and topics.
+
+Every term keeps one TermTrend row: its count in the current time bucket and
+an exponentially weighted mean/variance of the buckets before it (the
+rolling baseline). A new story only touches the rows of its own tags and
+topic; when a term's bucket rolls over, the finished bucket (and any empty
+ones since) is folded into the baseline. The score is the z-score of the
+current count against that baseline, so ``trending()`` is an index scan.
+
+No row is locked: a story in a term's current bucket is counted with one
+``UPDATE`` that recomputes the score in SQL, and only the first story of a
+bucket reads the row, rolls it forward in Python and writes it back with
+an ``UPDATE`` conditional on the values it read (retrying if another
+writer got there first). A deleted story is taken out of its bucket while
+that bucket is still current; terms left with no count and no baseline
+are removed.
+"""
+import math
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import jdatetime
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Sqrt
+from django.utils import timezone
+
+from .models import StoryModel, TermTrend
+
+
+def bucket_start(moment):
+    """Start of the TRENDS['BUCKET'] that contains ``moment``."""
+    if isinstance(moment, jdatetime.datetime):
+        moment = moment.togregorian()
+    if settings.TRENDS['BUCKET'] == 'day':
+        return timezone.make_aware(datetime.combine(timezone.localtime(moment).date(), time.min))
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def bucket_length():
+    return timedelta(days=1) if settings.TRENDS['BUCKET'] == 'day' else timedelta(hours=1)
+
+
+def _alpha():
+    return 1 - 0.5 ** (1 / settings.TRENDS['HALF_LIFE'])
+
+
+def _fold(trend, value, alpha):
+    # میانگین و واریانس وزن‌دار نمایی (به‌روزرسانی افزایشی)
+    diff = value - trend.mean
+    increment = alpha * diff
+    trend.mean += increment
+    trend.variance = (1 - alpha) * (trend.variance + diff * increment)
+
+
+def advance(trend, bucket, amount=1):
+    """Add ``amount`` to ``trend`` at ``bucket``, rolling its window forward first."""
+    if trend.bucket is None or bucket > trend.bucket:
+        if trend.bucket is not None:
+            alpha = _alpha()
+            _fold(trend, trend.count, alpha)
+            # بازه‌های خالی در میان، صفر حساب می‌شوند؛ بعد از چند نیمه‌عمر اثرشان ناچیز است
+            gap = int((bucket - trend.bucket) / bucket_length()) - 1
+            for _ in range(min(gap, settings.TRENDS['HALF_LIFE'] * 10)):
+                _fold(trend, 0, alpha)
+        trend.bucket = bucket
+        trend.count = 0
+    if bucket == trend.bucket:
+        trend.count += amount
+    # داده دیرتر از بازه جاری در پایه اثر داده نمی‌شود
+    trend.score = score(trend.count, trend.mean, trend.variance)
+
+
+def score(count, mean, variance):
+    return (count - mean) / max(math.sqrt(max(variance, 0)), settings.TRENDS['MIN_STD'])
+
+
+def story_terms(title, topic_id):
+    terms = [(TermTrend.TAG, tag[:100]) for tag in set(StoryModel.get_tags(title))]
+    if topic_id:
+        terms.append((TermTrend.TOPIC, str(topic_id)))
+    return terms
+
+
+def record_story(story):
+    """Count a new story in the trends of its tags and topic."""
+    bucket = bucket_start(story.created_at)
+    for kind, term in story_terms(story.title, story.topic_id):
+        _record(kind, term, bucket)
+
+
+def forget_story(story):
+    """Take a deleted story out of the current bucket of its tags and topic."""
+    bucket = bucket_start(story.created_at)
+    for kind, term in story_terms(story.title, story.topic_id):
+        if _add(kind, term, bucket, -1):
+            # عبارتی که فقط همین استوری‌ها را داشت (مثلا استوری‌های db_loadtest)
+            TermTrend.objects.filter(kind=kind, term=term, count=0, mean=0, variance=0).delete()
+
+
+def _add(kind, term, bucket, amount):
+    """Add ``amount`` to the row if ``bucket`` is its current bucket: one UPDATE."""
+    std = Greatest(Sqrt(Greatest(F('variance'), Value(0.0))), Value(float(settings.TRENDS['MIN_STD'])))
+    return TermTrend.objects.filter(kind=kind, term=term, bucket=bucket, count__gte=max(-amount, 0)).update(
+        count=F('count') + amount, score=(F('count') + amount - F('mean')) / std)
+
+
+def _record(kind, term, bucket):
+    while not _add(kind, term, bucket, 1):
+        trend = TermTrend.objects.filter(kind=kind, term=term).first()
+        if trend is None:
+            trend = TermTrend(kind=kind, term=term, bucket=None)
+            advance(trend, bucket)
+            try:
+                with transaction.atomic():
+                    trend.save()
+                return
+            except IntegrityError:
+                # هم‌زمان ساخته شد
+                continue
+        if trend.bucket > bucket:
+            # داده دیرتر از بازه جاری در پایه اثر داده نمی‌شود
+            return
+        if trend.bucket == bucket:
+            continue
+        previous_bucket, previous_count = trend.bucket, trend.count
+        advance(trend, bucket)
+        if TermTrend.objects.filter(id=trend.id, bucket=previous_bucket, count=previous_count).update(
+                bucket=trend.bucket, count=trend.count, mean=trend.mean, variance=trend.variance,
+                score=trend.score):
+            return
+
+
+def trending(kind, limit=20, now=None):
+    """
+    Top terms by burst score in the current bucket (and the one before it,
+    so the list isn't empty right after a bucket boundary).
+    """
+    current = bucket_start(now or timezone.now())
+    rows = (TermTrend.objects
+            .filter(kind=kind, bucket__gte=current - bucket_length(), count__gte=settings.TRENDS['MIN_COUNT'],
+                    score__gt=0)
+            .order_by('-score')
+            .values('term', 'bucket', 'count', 'mean', 'score')[:limit])
+    return list(rows)
+
+
+def rebuild(batch_size=2000):
+    """
+    Replay every story in time order into TermTrend. The rows are upserted
+    in batches, each in its own short transaction, then the terms no story
+    has any more are deleted.
+    """
+    states = {}
+    stories = StoryModel.objects.order_by('created_at', 'id').values_list('created_at', 'title', 'topic_id')
+    for created_at, title, topic_id in stories.iterator(chunk_size=batch_size):
+        bucket = bucket_start(created_at)
+        for key in story_terms(title, topic_id):
+            trend = states.get(key)
+            if trend is None:
+                trend = states[key] = TermTrend(kind=key[0], term=key[1], bucket=None)
+            advance(trend, bucket)
+
+    rows = list(states.values())
+    for start in range(0, len(rows), batch_size):
+        with transaction.atomic():
+            TermTrend.objects.bulk_create(
+                rows[start:start + batch_size], update_conflicts=True, unique_fields=['kind', 'term'],
+                update_fields=['bucket', 'count', 'mean', 'variance', 'score'])
+    stale = [trend_id for trend_id, kind, term in TermTrend.objects.values_list('id', 'kind', 'term').iterator()
+             if (kind, term) not in states]
+    for start in range(0, len(stale), batch_size):
+        TermTrend.objects.filter(id__in=stale[start:start + batch_size]).delete()
+    return len(states)
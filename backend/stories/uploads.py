@@ -0,0 +1,194 @@
+"""
+Chunked, resumable story uploads.
+
+A client opens an UploadSession with the file name and size, PUTs the
+numbered chunks (in any order, retrying freely) with their SHA-256, and
+finalizes. Every chunk is streamed from the request into the storage as its
+own object, so neither a chunk nor the whole file is ever held in memory;
+finalize streams the chunks in order into the story file.
+"""
+import hashlib
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import media
+from .models import StoryModel, UploadSession, UploadChunk
+
+CHUNKS_DIR = 'uploads'
+READ_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    pass
+
+
+class _HashingReader:
+    """Reads at most ``limit`` bytes from ``stream`` and hashes them on the way."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.remaining = limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size) if self.stream is not None else b''
+        self.remaining -= len(data)
+        self.size += len(data)
+        self.sha256.update(data)
+        if not data:
+            self.remaining = 0
+        return data
+
+
+class _ChunksReader:
+    """The stored chunks of a session read back to back as one stream."""
+
+    def __init__(self, names):
+        self.names = iter(names)
+        self.current = None
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        while True:
+            if self.current is None:
+                name = next(self.names, None)
+                if name is None:
+                    return b''
+                self.current = default_storage.open(name, 'rb')
+            data = self.current.read(size if size and size > 0 else READ_SIZE)
+            if data:
+                self.sha256.update(data)
+                return data
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+
+def open_session(filename, size, sha256=''):
+    if size <= 0:
+        raise UploadError('حجم فایل نامعتبر است')
+    if size > settings.MEDIA_LIMITS['VIDEO_MAX_SIZE']:
+        raise UploadError('حجم فایل بیش از حد مجاز است')
+    return UploadSession.objects.create(
+        filename=posixpath.basename(filename)[:255] or 'story',
+        size=size,
+        chunk_size=settings.UPLOADS['CHUNK_SIZE'],
+        sha256=sha256.lower(),
+    )
+
+
+def store_chunk(session, index, stream, sha256):
+    """
+    Stream chunk ``index`` from ``stream`` into the storage. A chunk that is
+    sent again replaces the stored one, so clients can simply retry.
+    """
+    if session.status != UploadSession.OPEN:
+        raise UploadError('این آپلود بسته شده است')
+    if not 0 <= index < session.chunk_count:
+        raise UploadError('شماره تکه نامعتبر است')
+
+    expected = session.expected_size(index)
+    # یک بایت بیشتر خوانده می‌شود تا تکه بزرگ‌تر از حد تشخیص داده شود
+    reader = _HashingReader(stream, expected + 1)
+    content = File(reader, name='%06d' % index)
+    content.size = expected
+    name = default_storage.save(posixpath.join(CHUNKS_DIR, str(session.pk), content.name), content)
+
+    digest = reader.sha256.hexdigest()
+    if reader.size != expected or (sha256 and sha256.lower() != digest):
+        default_storage.delete(name)
+        if reader.size != expected:
+            raise UploadError('حجم تکه باید %d بایت باشد' % expected)
+        raise UploadError('چکسام تکه همخوانی ندارد')
+
+    previous = (UploadChunk.objects.filter(session=session, index=index)
+                .values_list('name', flat=True).first())
+    UploadChunk.objects.update_or_create(
+        session=session, index=index, defaults={'size': reader.size, 'sha256': digest, 'name': name})
+    if previous and previous != name:
+        default_storage.delete(previous)
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+    return digest
+
+
+def missing_chunks(session):
+    received = set(session.chunks.values_list('index', flat=True))
+    return [index for index in range(session.chunk_count) if index not in received]
+
+
+def finalize(session, save):
+    """
+    Join the chunks into the story file and call ``save(name, info)``, which
+    creates and returns the story. The chunks are removed afterwards.
+    """
+    # فقط یک درخواست می‌تواند آپلود را تکمیل کند
+    if not UploadSession.objects.filter(pk=session.pk, status=UploadSession.OPEN).update(
+            status=UploadSession.FINALIZING):
+        raise UploadError('این آپلود بسته شده است')
+
+    name = None
+    try:
+        if missing_chunks(session):
+            raise UploadError('همه تکه‌ها آپلود نشده‌اند')
+        chunks = list(session.chunks.order_by('index').values_list('name', flat=True))
+
+        reader = _ChunksReader(chunks)
+        content = File(reader, name=session.filename)
+        content.size = session.size
+        field = StoryModel._meta.get_field('story')
+        try:
+            name = default_storage.save(field.generate_filename(None, session.filename), content)
+        finally:
+            reader.close()
+        if session.sha256 and session.sha256 != reader.sha256.hexdigest():
+            raise UploadError('چکسام فایل همخوانی ندارد')
+
+        with default_storage.open(name, 'rb') as fileobj:
+            try:
+                info = media.inspect(fileobj)
+            except media.UnsupportedMedia as exc:
+                raise UploadError(str(exc))
+
+        with transaction.atomic():
+            story = save(name, info)
+            UploadSession.objects.filter(pk=session.pk).update(
+                status=UploadSession.DONE, story=story, updated_at=timezone.now())
+    except Exception:
+        if name is not None:
+            default_storage.delete(name)
+        UploadSession.objects.filter(pk=session.pk).update(status=UploadSession.OPEN)
+        raise
+
+    discard_chunks(session)
+    return story
+
+
+def discard_chunks(session):
+    for name in session.chunks.values_list('name', flat=True):
+        default_storage.delete(name)
+    session.chunks.all().delete()
+
+
+def discard(session):
+    discard_chunks(session)
+    session.delete()
+
+
+def expired_sessions():
+    threshold = timezone.now() - timedelta(seconds=settings.UPLOADS['SESSION_TTL'])
+    return UploadSession.objects.filter(updated_at__lt=threshold)
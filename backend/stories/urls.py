@@ -5,8 +5,10 @@ from django.urls import path, include
 #     TopicListAPIView
 # )
 from .views import StoryModelViewSet, TopicViewSet, StateStoryModelViewSet, InstagramPageViewSet, CategoryViewSet, \
-    DayAnalysisViewSet
+    DayAnalysisViewSet, UploadSessionViewSet, RevokeTokenView
+from .auth import ClaimsTokenObtainPairSerializer, ClaimsTokenRefreshSerializer
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
 router.register(r'storymodel', StoryModelViewSet, basename='storymodel')
@@ -15,10 +17,15 @@ router.register(r'stats', StateStoryModelViewSet, basename='stats')
 router.register(r'instagram-pages', InstagramPageViewSet, basename='instagram-page')
 router.register(r'category', CategoryViewSet, basename='category')
 router.register(r'dayanalysis', DayAnalysisViewSet, basename='dayanalysis')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
 
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('token/', TokenObtainPairView.as_view(serializer_class=ClaimsTokenObtainPairSerializer), name='token'),
+    path('token/refresh/', TokenRefreshView.as_view(serializer_class=ClaimsTokenRefreshSerializer),
+         name='token-refresh'),
+    path('token/revoke/', RevokeTokenView.as_view(), name='token-revoke'),
 ]
 
 # urlpatterns = [
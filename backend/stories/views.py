@@ -1,51 +1,100 @@
 from datetime import timedelta
 import jdatetime
-from django.db.models import Count, Q
+from django.db.models import Count, DateField, Q, Sum, OuterRef, Subquery, Exists
+from django.db.models.functions import Coalesce
 from django.db.models.functions import TruncDate, TruncMonth
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
-from .models import StoryModel, Topic, InstagramPage, Category, DayAnalysis
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+from .compression import precompressed
+from .conditional import conditional
+from .jobs import enqueue
+from .permissions import AdminOrReadOnly, ScopedWriteMixin, check_write_scope
+from .throttling import admission, window_cost
+from .timeouts import time_limited
+from . import rollups, dedup, media, uploads, trends, sketches, columnar, auth, reference
+from .aggregate import aggregate, AggregateError
+from .segments import segment_stats
+from .models import StoryModel, Topic, SubTopic, InstagramPage, Category, DayAnalysis, StoryDailyCount, UploadSession, \
+    TermTrend
+from .routers import read_from_replica
+from .tasks import build_sketches
 from .serializers import StoryModelSerializer, TopicSerializer, StoryStatsSerializer, InstagramPageSerializer, \
-    CategorySerializer, DayAnalysisSerializer
+    CategorySerializer, DayAnalysisSerializer, ChunkedStorySerializer, UploadSessionSerializer
 from rest_framework import filters
 from collections import defaultdict
 
 
-class TopicViewSet(viewsets.ModelViewSet):
+def rollup_sum(rollup, key):
+    """Correlated SUM(story_count) over a filtered StoryDailyCount queryset."""
+    total = rollup.values(key).annotate(total=Sum('story_count')).values('total')
+    return Coalesce(Subquery(total), 0)
+
+
+class ReplicaReadMixin:
+    """
+    درخواست‌های فقط خواندنی (GET/HEAD/OPTIONS) از replica خوانده می‌شوند.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with read_from_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ValuesListMixin:
+    """
+    list() built on the serializer's values_list() fast path.
+    Paginated responses keep the regular serializer path.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.get_serializer_class().values_data(queryset, self.get_serializer_context()))
+
+
+class TopicViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Topic.objects.all()
     serializer_class = TopicSerializer
 
     def get_queryset(self):
         days = self.request.query_params.get('days','30')
         category_id = self.request.query_params.get('category_id')
-        queryset = Topic.objects.all()
+        # زیرموضوع‌ها در سریالایزر از کش داده‌های مرجع خوانده می‌شوند
+        queryset = Topic.objects.annotate(page_count=Count('instagrampage'))
+
+        # تعداد استوری‌ها از جدول StoryDailyCount خوانده می‌شود (بدون join روی استوری‌ها)
+        rollup = StoryDailyCount.objects.filter(topic_id=OuterRef('pk'))
 
         if category_id and category_id.isdigit():
-            queryset = queryset.filter(
-                instagrampage__storymodel__category_id=int(category_id)
-            ).distinct()
+            rollup = rollup.filter(category_id=int(category_id))
+            queryset = queryset.filter(Exists(rollup))
 
         if days is not None and days.isdigit():
-            date_threshold = timezone.now() - timedelta(days=int(days))
-            queryset = queryset.annotate(
-                story_count=Count(
-                    'instagrampage__storymodel',
-                    filter=Q(instagrampage__storymodel__created_at__gte=date_threshold)
-                )
-            )
-            # queryset = queryset.filter(instagrampage__storymodel__created_at__gte=date_threshold).distinct()
+            rollup = rollup.filter(day__gte=rollups.window_start(days))
+            queryset = queryset.annotate(story_count=rollup_sum(rollup, 'topic_id'))
 
         return queryset
 
+    @conditional(Topic, SubTopic, InstagramPage, StoryModel, window=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     # filter_backends = [DjangoFilterBackend]
     # filterset_fields = ['topic', 'page']
-    # permission_classes = [IsAuthenticatedOrReadOnly]
+    permission_classes = [AdminOrReadOnly]
 
 
-class StoryModelViewSet(viewsets.ModelViewSet):
+class StoryModelViewSet(ReplicaReadMixin, ValuesListMixin, ScopedWriteMixin, viewsets.ModelViewSet):
     queryset = StoryModel.objects.all()
     serializer_class = StoryModelSerializer
     filter_backends = [filters.SearchFilter]
@@ -66,7 +115,7 @@ class StoryModelViewSet(viewsets.ModelViewSet):
         # 2. topic_id
         topic_id = self.request.query_params.get('topic_id')
         if topic_id and topic_id.isdigit():
-            queryset = queryset.filter(page__topic_id=int(topic_id))
+            queryset = queryset.filter(topic_id=int(topic_id))
 
         # category_id = self.request.query_params.get('category_id')
         # if category_id and category_id.isdigit():
@@ -87,24 +136,183 @@ class StoryModelViewSet(viewsets.ModelViewSet):
             date_threshold = timezone.now() - timedelta(days=int(days))
             queryset = queryset.filter(created_at__gte=date_threshold)
 
+        # 5. مشخصات فایل (ستون‌های media_* که هنگام آپلود پر می‌شوند)
+        for param, lookup in self.media_filters.items():
+            value = self.request.query_params.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{lookup: float(value)})
+                except ValueError:
+                    pass
+
+        ordering = self.request.query_params.get('ordering')
+        if ordering in self.media_orderings:
+            queryset = queryset.order_by(ordering, '-id')
+
         return queryset
 
+    media_filters = {
+        'min_duration': 'media_duration__gte',
+        'max_duration': 'media_duration__lte',
+        'min_width': 'media_width__gte',
+        'min_height': 'media_height__gte',
+        'max_size': 'media_size__lte',
+    }
+    media_orderings = {'media_duration', '-media_duration', 'media_size', '-media_size'}
+
+    @time_limited('search')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            # بدنه همینجا پارس می‌شود تا رد شدن آپلود در MaxSizeUploadHandler با 413 گزارش شود
+            request.data
+            if getattr(request._request, 'story_upload_rejected', False):
+                raise media.UploadTooLarge()
+
+    @action(detail=True, methods=['GET'])
+    def duplicates(self, request, pk=None):
+        # استوری‌های تکراری: هم‌خوشه (duplicate_of) و هش‌های نزدیک
+        story = self.get_object()
+        root = story.duplicate_of_id or story.pk
+        ids = dedup.near_duplicates(story)
+        ids.update(StoryModel.objects.filter(Q(id=root) | Q(duplicate_of_id=root)).values_list('id', flat=True))
+        ids.discard(story.pk)
+        queryset = StoryModel.objects.filter(id__in=ids).order_by('id')
+        return Response(StoryModelSerializer.values_data(queryset, self.get_serializer_context()))
+
     # permission_classes = [IsAccountAdminOrReadOnly]
 
 
-class StateStoryModelViewSet(viewsets.ModelViewSet):
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Chunked, resumable story uploads (stories.uploads):
+    POST /uploads/ -> PUT /uploads/<id>/chunks/<n>/ (X-Chunk-SHA256) -> POST /uploads/<id>/finalize/.
+    GET /uploads/<id>/ lists the chunks still missing, to resume.
+    """
+    # بدون ReplicaReadMixin: وضعیت آپلود باید بلافاصله بعد از نوشتن خوانده شود
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    @action(detail=True, methods=['PUT'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        session = self.get_object()
+        checksum = request.headers.get('X-Chunk-SHA256', '')
+        if not checksum:
+            return Response({'error': 'هدر X-Chunk-SHA256 لازم است'}, status=400)
+        try:
+            # بدنه مستقیما از request.stream در storage نوشته می‌شود
+            digest = uploads.store_chunk(session, int(index), request.stream, checksum)
+        except uploads.UploadError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return Response({'index': int(index), 'sha256': digest, 'missing_chunks': uploads.missing_chunks(session)})
+
+    @action(detail=True, methods=['POST'])
+    def finalize(self, request, pk=None):
+        session = self.get_object()
+        context = self.get_serializer_context()
+
+        def save(name, info):
+            serializer = ChunkedStorySerializer(data=request.data, context={**context, 'media_info': info})
+            serializer.is_valid(raise_exception=True)
+            check_write_scope(request, serializer)
+            return serializer.save(story=name, **media.columns(info))
+
+        try:
+            story = uploads.finalize(session, save)
+        except uploads.UploadError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return Response(StoryModelSerializer(story, context=context).data, status=status.HTTP_201_CREATED)
+
+
+class StateStoryModelViewSet(ReplicaReadMixin, ValuesListMixin, ScopedWriteMixin, viewsets.ModelViewSet):
     queryset = StoryModel.objects.all()
     serializer_class = StoryModelSerializer
 
     filter_backends = [filters.SearchFilter]
     search_fields = ['title', 'story_text']
 
+    # هزینه هر action در محدودیت نرخ (stories.throttling)؛ بقیه یک واحد
+    throttle_costs = {
+        'stats': window_cost(10),
+        'aggregate': window_cost(5),
+        'segments': 5,
+        'trending': 2,
+    }
+
     # permission_classes = [IsAuthenticatedOrReadOnly]
 
     # def perform_create(self, serializer):
     #     serializer.save(author=self.request.user)
 
+    def _page_bubble(self):
+        # صفحه‌ها گروه‌بندی شده بر اساس موضوع، با تعداد دنبال‌کننده نرمال‌شده (مستقل از فیلترها)
+        # نام موضوع‌ها از کش داده‌های مرجع (بدون join روی جدول موضوع)
+        topic_names = reference.names('topic')
+        by_page_queryset = (
+            StoryModel.objects
+                .values('page__topic_id', 'page__page', 'page__followers_count')
+                # .distinct('page__page')
+                .order_by()
+        )
+
+        # گروه‌بندی داده‌ها بر اساس موضوع
+        grouped_data = defaultdict(list)
+
+        # یک لیست از تمام مقادیر value برای محاسبه max_value
+        all_values = []
+
+        for item in by_page_queryset:
+            topic_name = topic_names.get(item['page__topic_id']) or 'بدون موضوع'
+            raw_value = item['page__followers_count'] or 0
+            all_values.append(raw_value)
+            grouped_data[topic_name].append({
+                'page': item['page__page'],
+                'value': raw_value
+            })
+
+        # پیدا کردن max_value
+        max_value = max(all_values) if all_values else 1  # جلوگیری از تقسیم بر صفر
+
+        # نرمالایز کردن همه مقادیر بر اساس max_value
+        normalized_grouped_data = []
+
+        for topic, pages in sorted(grouped_data.items()):
+            normalized_pages = []
+            for page_info in pages:
+                normalized_value = int((page_info['value'] / max_value) * 1000)
+                normalized_pages.append({
+                    'name': page_info['page'],
+                    'value': normalized_value
+                })
+            normalized_grouped_data.append({
+                'name': topic,
+                'data': normalized_pages
+            })
+
+        return normalized_grouped_data
+
+    def _tags(self, queryset, approximate, days):
+        # حالت تقریبی از خلاصه‌های روزانه، در غیر این صورت از عنوان و متن استوری‌ها
+        if approximate:
+            sketch_stats = sketches.approximate_stats(days or 0)
+            if sketch_stats['approximate']['partial']:
+                # خلاصه‌های نبود در پس‌زمینه ساخته می‌شوند؛ تا آن موقع پاسخ ناقص علامت خورده
+                enqueue(build_sketches, days=days or 0)
+            return sketch_stats['top_tag'], sketch_stats['text_tag'], sketch_stats['approximate']
+        return StoryModel.get_top_tags_from_queryset(queryset), StoryModel.get_text_from_queryset(queryset), None
+
     @action(detail=False, methods=['GET'])
+    @conditional(StoryModel, InstagramPage, Topic, SubTopic, window=True)
+    @precompressed(StoryModel, InstagramPage, Topic, SubTopic, window=True)
+    @admission
+    @time_limited('stats')
     def stats(self, request):
         queryset = StoryModel.objects.all()
 
@@ -117,9 +325,19 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
                 Q(story_text__icontains=search_term)
             )
 
+        # حالت تقریبی: تگ‌ها و شمارش‌های یکتا از خلاصه‌های روزانه (stories.sketches)
+        approximate = request.query_params.get('approximate') in ('1', 'true')
+        if approximate and any(request.query_params.get(name) for name in ('search', 'dedup', 'topic_id', 'page_id')):
+            return Response({'error': 'حالت تقریبی فقط با پارامتر days قابل استفاده است'}, status=400)
+
+        # فقط استوری‌های اصلی (بدون تکراری‌ها)
+        dedup_only = request.query_params.get('dedup') in ('1', 'true')
+        if dedup_only:
+            queryset = queryset.filter(duplicate_of__isnull=True)
+
         topic_id = request.query_params.get('topic_id')
         if topic_id:
-            queryset = queryset.filter(page__topic=topic_id)
+            queryset = queryset.filter(topic_id=topic_id)
 
         # فیلتر page
         page_id = self.request.query_params.get('page_id')
@@ -139,6 +357,18 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
                     status=400
                 )
 
+        # موتور ستونی: همه تفکیک‌ها از آرایه‌های NumPy در حافظه (stories.columnar)؛ جستجوی متنی فقط با SQL
+        if columnar.enabled() and not search_term:
+            data = columnar.stats(days=days if days != '' else None, topic_id=topic_id, page_id=page_id,
+                                  dedup=dedup_only, tags=not approximate)
+            # None یعنی snapshot در حال بارگذاری است؛ تا آن موقع SQL
+            if data is not None:
+                data['approximate'] = None
+                if approximate:
+                    data['top_tag'], data['text_tag'], data['approximate'] = self._tags(queryset, approximate, days)
+                data['page_count'] = InstagramPage.objects.count()
+                return Response(StoryStatsSerializer.fast_data(data))
+
         # آمار کلی
         total_count = queryset.count()
 
@@ -168,7 +398,7 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
         # # روند ماهانه (آخرین 6 ماه)
         monthly_trend = (
             queryset
-                .annotate(month=TruncMonth('created_at'))
+                .annotate(month=TruncMonth('created_at', output_field=DateField()))
                 .values('month')
                 .annotate(count=Count('id'))
                 .order_by('-month')[:6]
@@ -184,13 +414,14 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
 
         by_topic = (
             queryset
-                .values('page__topic__id', 'page__topic__name')  # گروه‌بندی بر اساس موضوع
+                .values('topic_id')  # گروه‌بندی بر اساس موضوع؛ نام‌ها از کش داده‌های مرجع
                 .annotate(story_count=Count('id'))  # شمارش داستان‌ها
                 .order_by('-story_count')  # مرتب سازی
-                .filter(page__topic__isnull=False)  # حذف موارد بدون موضوع
+                .filter(topic__isnull=False)  # حذف موارد بدون موضوع
         )
 
-        categories_by_topic = [item['page__topic__name'] for item in by_topic]
+        topic_names = reference.names('topic')
+        categories_by_topic = [topic_names.get(item['topic_id']) for item in by_topic]
         story_counts_by_topic = [item['story_count'] for item in by_topic]
 
         by_topic = [
@@ -202,13 +433,14 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
 
         by_sub_topic = (
             queryset
-                .values('page__sub_topic__id', 'page__sub_topic__name')  # گروه‌بندی بر اساس موضوع
+                .values('sub_topic_id')  # گروه‌بندی بر اساس موضوع
                 .annotate(story_count=Count('id'))  # شمارش داستان‌ها
                 .order_by('-story_count')  # مرتب سازی
-                .filter(page__sub_topic__isnull=False)  # حذف موارد بدون موضوع
+                .filter(sub_topic__isnull=False)  # حذف موارد بدون موضوع
         )
 
-        categories_by_sub_topic = [item['page__sub_topic__name'] for item in by_sub_topic]
+        sub_topic_names = reference.names('sub_topic')
+        categories_by_sub_topic = [sub_topic_names.get(item['sub_topic_id']) for item in by_sub_topic]
         story_counts_by_sub_topic = [item['story_count'] for item in by_sub_topic]
 
         by_sub_topic = [
@@ -229,49 +461,7 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
         )
         # print(by_page)
         ###################################
-        by_page_queryset = (
-            StoryModel.objects
-                .select_related('page', 'page__topic')
-                .values('page__topic__name', 'page__page', 'page__followers_count')
-                # .distinct('page__page')
-                .order_by('page__topic__name')
-        )
-
-        # گروه‌بندی داده‌ها بر اساس موضوع
-        grouped_data = defaultdict(list)
-
-        # یک لیست از تمام مقادیر value برای محاسبه max_value
-        all_values = []
-
-        for item in by_page_queryset:
-            topic_name = item['page__topic__name'] or 'بدون موضوع'
-            raw_value = item['page__followers_count'] or 0
-            all_values.append(raw_value)
-            grouped_data[topic_name].append({
-                'page': item['page__page'],
-                'value': raw_value
-            })
-
-        # پیدا کردن max_value
-        max_value = max(all_values) if all_values else 1  # جلوگیری از تقسیم بر صفر
-
-        # نرمالایز کردن همه مقادیر بر اساس max_value
-        normalized_grouped_data = []
-
-        for topic, pages in grouped_data.items():
-            normalized_pages = []
-            for page_info in pages:
-                normalized_value = int((page_info['value'] / max_value) * 1000)
-                normalized_pages.append({
-                    'name': page_info['page'],
-                    'value': normalized_value
-                })
-            normalized_grouped_data.append({
-                'name': topic,
-                'data': normalized_pages
-            })
-
-        by_page_bubble = normalized_grouped_data
+        by_page_bubble = self._page_bubble()
 
         ###############
         # by_page_queryset = (
@@ -430,8 +620,7 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
 
         by_ironic = formatted_by_ironic
 
-        top_tag = StoryModel.get_top_tags_from_queryset(queryset)
-        text_tag = StoryModel.get_text_from_queryset(queryset)
+        top_tag, text_tag, approximate_stats = self._tags(queryset, approximate, days)
 
         #########################
         # categories based on tone
@@ -520,14 +709,68 @@ class StateStoryModelViewSet(viewsets.ModelViewSet):
             'by_sub_topic': list(by_sub_topic),
             'by_page_bubble': by_page_bubble,
             'by_feeling_tone': by_feeling_tone,
-            'by_feeling_streamgraph' : by_feeling_streamgraph
+            'by_feeling_streamgraph' : by_feeling_streamgraph,
+            'approximate': approximate_stats,
         }
 
-        serializer = StoryStatsSerializer(data)
-        return Response(serializer.data)
+        return Response(StoryStatsSerializer.fast_data(data))
+
+
+    @action(detail=False, methods=['GET'])
+    @conditional(StoryModel, InstagramPage, Topic, SubTopic, Category, window=True)
+    @precompressed(StoryModel, InstagramPage, Topic, SubTopic, Category, window=True)
+    @admission
+    @time_limited('aggregate')
+    def aggregate(self, request):
+        # group_by=week,feeling&metrics=count,distinct_pages&tone=رسمی&days=90
+        try:
+            return Response(aggregate(request.query_params))
+        except AggregateError as exc:
+            return Response({'error': str(exc)}, status=400)
+
+    @action(detail=False, methods=['GET'])
+    @conditional(StoryModel, InstagramPage, window=True)
+    @time_limited('segments')
+    def segments(self, request):
+        params = {}
+        for name in ('days', 'topic_id', 'category_id'):
+            value = request.query_params.get(name, '30' if name == 'days' else None)
+            if value:
+                if not value.isdigit():
+                    return Response({'error': 'پارامتر %s باید یک عدد صحیح باشد' % name}, status=400)
+                params[name] = int(value)
+        return Response(segment_stats(**params))
+
+    @action(detail=False, methods=['GET'])
+    @conditional(StoryModel, Topic, window=True)
+    def trending(self, request):
+        # از جدول TermTrend که هنگام ثبت هر استوری به‌روز می‌شود خوانده می‌شود
+        kinds = {'tag': TermTrend.TAG, 'topic': TermTrend.TOPIC}
+        kind = request.query_params.get('kind', 'tag')
+        if kind not in kinds:
+            return Response({'error': 'پارامتر kind باید tag یا topic باشد'}, status=400)
+        limit = request.query_params.get('limit', '20')
+        if not limit.isdigit():
+            return Response({'error': 'پارامتر limit باید یک عدد صحیح باشد'}, status=400)
+
+        rows = trends.trending(kinds[kind], min(int(limit), 100))
+        names = {}
+        if kind == 'topic':
+            names = {str(pk): name for pk, name in reference.names('topic').items()}
+        return Response([
+            {
+                'name': names.get(row['term'], row['term']),
+                'id': int(row['term']) if kind == 'topic' else None,
+                'count': row['count'],
+                'baseline': round(row['mean'], 2),
+                'score': round(row['score'], 2),
+                'bucket': row['bucket'],
+            }
+            for row in rows
+        ])
 
 
-class InstagramPageViewSet(viewsets.ModelViewSet):
+class InstagramPageViewSet(ReplicaReadMixin, ValuesListMixin, ScopedWriteMixin, viewsets.ModelViewSet):
     queryset = InstagramPage.objects.all()
     serializer_class = InstagramPageSerializer
 
@@ -535,17 +778,34 @@ class InstagramPageViewSet(viewsets.ModelViewSet):
     filterset_fields = ['topic_id', 'category_id', 'id']
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    permission_classes = [AdminOrReadOnly]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        days = self.request.query_params.get('days', '30')
+
+        if days is not None and days.isdigit():
+            rollup = StoryDailyCount.objects.filter(category_id=OuterRef('pk'),
+                                                    day__gte=rollups.window_start(days))
+            queryset = queryset.annotate(story_count=rollup_sum(rollup, 'category_id'))
+
+        return queryset
+
+    @conditional(Category, StoryModel, window=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     # filter_backends = [DjangoFilterBackend]
     # filterset_fields = ['topic_id','category_id']
 
 
-class DayAnalysisViewSet(viewsets.ModelViewSet):
+class DayAnalysisViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = DayAnalysis.objects.all()
     serializer_class = DayAnalysisSerializer
+    permission_classes = [AdminOrReadOnly]
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -556,3 +816,22 @@ class DayAnalysisViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(created_at__gte=date_threshold)
 
         return queryset
+
+
+class RevokeTokenView(APIView):
+    """Logout: revoke the access token of the request and the given refresh token."""
+    authentication_classes = [auth.ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                refresh = RefreshToken(refresh)
+            except TokenError:
+                return Response({'error': 'توکن refresh نامعتبر است'}, status=400)
+            if refresh['user_id'] != request.auth['user_id']:
+                return Response({'error': 'توکن refresh متعلق به این کاربر نیست'}, status=400)
+            auth.revoke(refresh)
+        auth.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)